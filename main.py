@@ -1,20 +1,29 @@
+from __future__ import annotations
 import os
+import re
 import sys
-import yaml
+import atexit
 import logging
 from datetime import datetime
 import glob
-import difflib
 import getpass
-from typing import Any, Optional
+import tempfile
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import TYPE_CHECKING, Any, Iterator, Optional
 from rich.console import Console
 from rich.theme import Theme
-from nornir.core import Nornir
-from nornir.core.task import Result, Task
-from nornir_rich.functions import print_result
-from nornir_utils.plugins.tasks.files import write_file
-from nornir_netmiko.tasks import netmiko_send_command
-import nornir_inv
+
+# Nornir, netmiko, yaml and the nornir_* modules are slow to import so are only imported by the run types that use them
+if TYPE_CHECKING:
+    from nornir.core import Nornir
+    from nornir.core.task import Result, Task
+    import nornir_catalog
+    import nornir_journal
+    import nornir_store
+    import nornir_timing
 
 
 # ----------------------------------------------------------------------------
@@ -26,6 +35,17 @@ device_user: str = "test_user"  # Default device username
 output_folder: str = "output"  # Folder that stores reports and output saved to file
 input_cmd_file: str = "input_cmd.yml"  # Commands to be run, is in project folder
 # input_val_file: str = "input_val.yml"      # TBD: For future use with nornir_validate
+batch_timeout: float = 60  # Max secs to wait for each command in a batch run
+# Secs to start up (up to connecting to devices), checked by the -stt flag
+startup_budget: float = 0.5
+# Command types (from input_cmd.yml) that each run type runs, commands shared between types are only run once
+run_type_cmds: dict[str, list] = dict(
+    print=["print"],
+    vital=["vital"],
+    detail=["detail"],
+    pre_test=["print", "vital", "detail"],
+    post_test=["print", "vital"],
+)
 
 
 # ----------------------------------------------------------------------------
@@ -93,6 +113,20 @@ class InputValidate:
                 f":x: {input_file} must have at least one [i]hosts, groups[/i] or [i]all[/i] dictionary"
             )
             sys.exit(1)
+        elif input_data.get("parse") != None and not isinstance(
+            input_data["parse"], dict
+        ):
+            self.rc.print(
+                f":x: {input_file} [i]parse[/i] must be a dictionary of commands"
+            )
+            sys.exit(1)
+        elif input_data.get("incremental") != None and not isinstance(
+            input_data["incremental"], dict
+        ):
+            self.rc.print(
+                f":x: {input_file} [i]incremental[/i] must be a dictionary of [i]static[/i] and/or [i]fingerprint[/i] commands"
+            )
+            sys.exit(1)
 
     # ----------------------------------------------------------------------------
     # 1a. Adds additional arguments to the Nornir Inventory parser arguments
@@ -131,6 +165,16 @@ class InputValidate:
             nargs=3,
             help="Name of directory that holds compare files (where compare output is saved) as well the name of the files to compare",
         )
+        args.add_argument(
+            "-rst",
+            "--restore",
+            help="Name of change directory, recreates the text files of all outputs saved in its snapshot store",
+        )
+        args.add_argument(
+            "-lst",
+            "--list_runs",
+            help="Name of change directory, lists the run IDs of all the saved files in its catalog",
+        )
         args.add_argument(
             "-pre",
             "--pre_test",
@@ -141,6 +185,114 @@ class InputValidate:
             "--post_test",
             help="Name of change directory, runs print, vital_save_file and compare (of vital)",
         )
+        args.add_argument(
+            "-b",
+            "--batch",
+            action="store_true",
+            help="Sends all of a hosts commands in one batch over the SSH session rather than one at a time",
+        )
+        args.add_argument(
+            "-bkr",
+            "--broker",
+            help="Unix socket of a running connection broker (nornir_broker.py) to run the commands over its open sessions",
+        )
+        args.add_argument(
+            "-eng",
+            "--engine",
+            choices=["threaded", "async"],
+            help="Engine used to connect to devices, threaded (default) uses the Nornir runner and async uses asyncio",
+        )
+        args.add_argument(
+            "-sto",
+            "--store",
+            action="store_true",
+            help="Saves command outputs to a compressed snapshot store (deduplicated by content) rather than text files",
+        )
+        args.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            help="Number of Nornir worker threads (hosts run at the same time), overrides environment variable",
+        )
+        args.add_argument(
+            "-gs",
+            "--group_sessions",
+            nargs="+",
+            help="Max sessions open at the same time per group in the format group=num (for example wlc=2 asa=5)",
+        )
+        args.add_argument(
+            "-cr",
+            "--conn_rate",
+            type=float,
+            help="Max new device connections opened per second across all hosts, overrides environment variable",
+        )
+        args.add_argument(
+            "-dw",
+            "--diff_workers",
+            type=int,
+            help="Number of processes used to create the diffs (0 creates them in the nornir workers), overrides environment variable",
+        )
+        args.add_argument(
+            "-cpt",
+            "--compact",
+            nargs="?",
+            type=int,
+            const=...,  # Is the diffs default context lines (got in get_run_opts so nornir_diff is only imported when needed)
+            help="Compact HTML diffs of only the changes with this many lines of context (default 3) either side",
+        )
+        args.add_argument(
+            "-stc",
+            "--structured",
+            action="store_true",
+            help="Compares command outputs that have a TextFSM template by their parsed records rather than the text",
+        )
+        args.add_argument(
+            "-rid",
+            "--run_ids",
+            nargs="+",
+            help="Post-test compares the files of these run IDs (or a run ID and the latest) rather than the latest 2",
+        )
+        args.add_argument(
+            "-inc",
+            "--incremental",
+            action="store_true",
+            help="Post-test reuses the saved output of stable vital commands if the fingerprint commands are unchanged",
+        )
+        args.add_argument(
+            "-stt",
+            "--startup_time",
+            action="store_true",
+            help="Prints the time taken by each startup stage (imports, inventory, filters, etc) against the startup budget",
+        )
+        args.add_argument(
+            "-rpt",
+            "--report",
+            choices=["json", "csv"],
+            help="Saves a run report of the time, bytes received and retries of each host, command and phase in the output folder",
+        )
+        args.add_argument(
+            "-spn",
+            "--spans",
+            help="Saves the run timings to this file as OpenTelemetry spans (OTLP JSON)",
+        )
+        args.add_argument(
+            "-res",
+            "--resume",
+            action="store_true",
+            help="Resumes the latest unfinished run of the run type, only runs the hosts and commands it didn't save",
+        )
+        args.add_argument(
+            "-lm",
+            "--low_memory",
+            action="store_true",
+            help="Results of saved commands only keep the file paths, bytes and hash of the output rather than the output",
+        )
+        args.add_argument(
+            "-wch",
+            "--watch",
+            type=float,
+            help="Post-test polls the vital commands every this many secs over open sessions, showing the delta of any command that changed from the baseline",
+        )
         return args
 
     # ----------------------------------------------------------------------------
@@ -174,6 +326,8 @@ class InputValidate:
             "vital_save",
             "detail_save",
             "compare",
+            "restore",
+            "list_runs",
             # "validate",
             "pre_test",
             "post_test",
@@ -214,6 +368,8 @@ class InputValidate:
             self.err_missing_files(run_type, [input_file])
         elif os.path.exists(input_file):
             with open(input_file, "r") as file_content:
+                import yaml
+
                 input_data = yaml.load(file_content, Loader=yaml.FullLoader)
             # ERR/RTR: Errors or returns file paths based on whether input file correctly formatted
             self.val_input_file(run_type, input_file, input_data)
@@ -221,140 +377,818 @@ class InputValidate:
             output_fldr=output_fldr, input_file=input_file, input_data=input_data
         )
 
+    # ----------------------------------------------------------------------------
+    # NUM_OPT: Gets a numeric run option in this order: args, env var, errors if it isn't a number more than 0 (or 0 if allowed)
+    # ----------------------------------------------------------------------------
+    def num_opt(
+        self,
+        args: dict[str, Any],
+        opt: str,
+        env_var: str,
+        num_type: type,
+        zero: bool = False,
+    ) -> Optional[int | float]:
+        value = args.get(opt)
+        if value == None:
+            value = os.environ.get(env_var)
+        if value == None:
+            return None
+        try:
+            value = num_type(value)
+        except ValueError:
+            value = None
+        if value == None or not (value > 0 or (value == 0 and zero == True)):
+            num = "a whole number" if num_type == int else "a number"
+            minimum = "0 or more" if zero == True else "more than 0"
+            self.rc.print(f":x: [i]{opt}[/i] (or {env_var}) must be {num} {minimum}")
+            sys.exit(1)
+        return value
+
+    # ----------------------------------------------------------------------------
+    # 1f. Gets the run options (flags that change how commands are run) to be passed to the nornir tasks
+    # ----------------------------------------------------------------------------
+    def get_run_opts(self, args: dict[str, Any]) -> dict[str, Any]:
+        # BROKER: Check the socket of the connection broker exists
+        if args.get("broker") != None and not os.path.exists(args["broker"]):
+            self.err_missing_files("broker", [args["broker"]])
+        # LIMITS: Check for workers, group sessions and connection rate in this order: args, env var
+        workers = self.num_opt(args, "workers", "NUM_WORKERS", int)
+        conn_rate = self.num_opt(args, "conn_rate", "CONN_RATE", float)
+        group_sessions = {}
+        grp_args = args.get("group_sessions") or os.environ.get("GROUP_SESSIONS", "")
+        for each_grp in grp_args if isinstance(grp_args, list) else grp_args.split():
+            grp, num = each_grp.partition("=")[::2]
+            if not num.isdigit() or int(num) == 0:
+                self.rc.print(
+                    f":x: Group sessions '{each_grp}' must be in the format [i]group=num[/i]"
+                )
+                sys.exit(1)
+            group_sessions[grp] = int(num)
+        # RUN_ID: Can compare 2 runs or 1 run against the latest
+        if len(args.get("run_ids") or []) > 2:
+            self.rc.print(
+                f":x: Only 1 or 2 run IDs can be compared, not {len(args['run_ids'])}"
+            )
+            sys.exit(1)
+        # INCREMENTAL: Needs the fingerprint run before deciding the commands, the async engine runs all commands up front
+        if args.get("incremental", False) == True and args.get("engine") == "async":
+            self.rc.print(
+                ":x: [i]incremental[/i] can't be used with the [i]async[/i] engine"
+            )
+            sys.exit(1)
+        # WATCH: Only polls the vital commands of a post-test and runs them itself so can't be resumed or use the async engine
+        if args.get("watch") != None:
+            if args["watch"] <= 0 or args.get("post_test") == None:
+                self.rc.print(
+                    ":x: [i]watch[/i] must be a post-test ([i]-pos[/i]) polled every more than 0 secs"
+                )
+                sys.exit(1)
+            if args.get("engine") == "async" or args.get("resume", False) == True:
+                self.rc.print(
+                    ":x: [i]watch[/i] can't be used with the [i]async[/i] engine or [i]resume[/i]"
+                )
+                sys.exit(1)
+        # SPANS: Check the folder the spans file is saved in exists
+        if args.get("spans") != None:
+            span_fldr = os.path.dirname(os.path.abspath(args["spans"]))
+            if not os.path.exists(span_fldr):
+                self.err_missing_files("spans", [span_fldr])
+        # DIFF: Check for diff workers in this order: args, env var (if neither set is the number of CPUs, 0 diffs in the nornir workers)
+        diff_workers = self.num_opt(args, "diff_workers", "DIFF_WORKERS", int, True)
+        # COMPACT: If no lines of context are given is the diffs default
+        compact = args.get("compact")
+        if compact == ...:
+            import nornir_diff
+
+            compact = nornir_diff.context_lines
+        return dict(
+            batch=args.get("batch", False),
+            broker=args.get("broker"),
+            engine=args.get("engine"),
+            store=args.get("store", False),
+            workers=workers,
+            group_sessions=group_sessions,
+            conn_rate=conn_rate,
+            diff_workers=diff_workers,
+            compact=compact,
+            structured=args.get("structured", False),
+            run_ids=args.get("run_ids"),
+            incremental=args.get("incremental", False),
+            report=args.get("report"),
+            spans=args.get("spans"),
+            resume=args.get("resume", False),
+            low_memory=args.get("low_memory", False),
+            watch=args.get("watch"),
+        )
+
+    # ----------------------------------------------------------------------------
+    # 1g. Gets the journal the run records its saved files and commands in, if resuming is the journal of the latest unfinished run
+    # ----------------------------------------------------------------------------
+    def get_journal(
+        self, run_type: str, output_fldr: Optional[str], run_id: str, resume: bool
+    ) -> Optional[nornir_journal.RunJournal]:
+        import nornir_journal
+
+        run_type = run_type.replace("_save", "")
+        resume_types = nornir_journal.resume_types
+        if run_type not in resume_types or output_fldr == None:
+            if resume == True:
+                self.rc.print(
+                    f":x: Only the [i]{', '.join(resume_types)}[/i] run types can be resumed"
+                )
+                sys.exit(1)
+            return None
+        if resume == False:
+            nornir_journal.prune_journals(output_fldr, nornir_journal.max_journals - 1)
+            return nornir_journal.RunJournal(output_fldr, run_type, run_id)
+        # RESUME: Only the latest run of the run type can be resumed and only if it didn't complete all hosts
+        path = nornir_journal.latest_journal(output_fldr, run_type)
+        if path == None:
+            self.rc.print(
+                f":x: There is no {run_type} run in [i]{output_fldr}[/i] to resume"
+            )
+            sys.exit(1)
+        journal = nornir_journal.RunJournal.load(path)
+        if journal.complete == True:
+            self.rc.print(
+                f":white_check_mark: The latest {run_type} run [b]{journal.run_id}[/b] completed all hosts, there is nothing to resume"
+            )
+            sys.exit(0)
+        return journal
+
 
 # ----------------------------------------------------------------------------
 # 2. Uses nornir to run commands
 # ----------------------------------------------------------------------------
 class NornirCommands:
-    def __init__(self, task: Task) -> None:
+    def __init__(
+        self,
+        task: Task,
+        host_plans: Optional[dict[str, Any]] = None,
+        gathered: Optional[dict[str, Any]] = None,
+    ) -> None:
         self.task = task
+        # Plans of all hosts and outputs of the hosts chunk already run by the async engine, kept out of the task kwargs as nornir logs them
+        self.host_plans = host_plans or {}
+        self.gathered = gathered
+
+    # ----------------------------------------------------------------------------
+    # TIMED: Times a phase of the host (connect, write, diff, etc) if the run is timed, the record can be updated with the bytes and retries
+    # ----------------------------------------------------------------------------
+    def timed(self, data: dict[str, Any], phase: str, cmd: Optional[str] = None) -> Any:
+        if data.get("timer") == None:
+            return nullcontext(dict())
+        return data["timer"].phase(str(self.task.host), phase, cmd)
 
     # ----------------------------------------------------------------------------
     # CMDS: Creates a dictionary of the commands
     # ----------------------------------------------------------------------------
     def get_cmds(self, cmds, input_data: dict[str, Any]) -> None:
-        cmds["run_cfg"] = cmds["run_cfg"] + input_data.get("run_cfg", False)
-        cmds["print"].extend(input_data.get("cmd_print", []))
-        cmds["vital"].extend(input_data.get("cmd_vital", []))
-        cmds["detail"].extend(input_data.get("cmd_detail", []))
+        import nornir_plan
+
+        nornir_plan.add_cmds(cmds, input_data)
         self.cmds = cmds  # Needed so can unittest this method as no return
 
     # ----------------------------------------------------------------------------
     # ORG_CMD: Filters the commands based on the host got from nornir task
     # ----------------------------------------------------------------------------
     def organise_cmds(self, input_data: dict[str, Any]) -> dict[str, Any]:
-        cmds = dict(print=[], vital=[], detail=[], run_cfg=False)
-        # If run_cfg is set gathers and saves that first before getting the rest of commands
-        if input_data.get("all") != None:
-            self.get_cmds(cmds, input_data["all"])
-        if input_data.get("groups") != None:
-            for each_grp in input_data["groups"]:
-                if each_grp in self.task.host.groups:
-                    self.get_cmds(cmds, input_data["groups"][each_grp])
-        if input_data.get("hosts") != None:
-            for each_hst in input_data["hosts"]:
-                if (
-                    each_hst.lower() == str(self.task.host).lower()
-                    or each_hst.lower() == str(self.task.host.hostname).lower()
-                ):
-                    self.get_cmds(cmds, input_data["hosts"][each_hst])
-        if cmds["run_cfg"] == True:
-            cmds["run_cfg"] = ["show running-config"]
+        import nornir_plan
+
+        groups = [grp.name for grp in self.task.host.groups]
+        return nornir_plan.PlanIndex(input_data).host_cmds(
+            str(self.task.host), self.task.host.hostname, groups
+        )
+
+    # ----------------------------------------------------------------------------
+    # HOST_CMD: Gets the hosts commands from the plans compiled at the start of the run, else organises them from the input file
+    # ----------------------------------------------------------------------------
+    def host_cmds(self, data: dict[str, Any]) -> dict[str, Any]:
+        if self.host_plans.get(str(self.task.host)) != None:
+            return self.host_plans[str(self.task.host)]
+        return self.organise_cmds(data.get("input_data", {}))
+
+    # ----------------------------------------------------------------------------
+    # PLAN_CMD: Gets the commands needed by each output type (config, print, vital, detail) of the run type
+    # ----------------------------------------------------------------------------
+    def plan_cmds(
+        self, run_type: str, data: dict[str, Any], cmds: dict[str, Any]
+    ) -> dict[str, list]:
+        plan = {}
+        if cmds["run_cfg"] != False and data.get("output_fldr") != None:
+            plan["config"] = cmds["run_cfg"]
+        for each_type in run_type_cmds.get(run_type, []):
+            plan[each_type] = cmds[each_type]
+        return plan
+
+    # ----------------------------------------------------------------------------
+    # UNIQUE_CMD: Gets each unique command in the plan and its severity, only print commands are displayed on screen
+    # ----------------------------------------------------------------------------
+    def unique_cmds(self, plan: dict[str, list]) -> dict[str, int]:
+        cmds = {}
+        for each_type, type_cmds in plan.items():
+            for each_cmd in type_cmds:
+                if each_cmd in plan.get("print", []):
+                    cmds[each_cmd] = logging.INFO
+                else:
+                    cmds.setdefault(each_cmd, logging.DEBUG)
         return cmds
 
     # ----------------------------------------------------------------------------
-    # RUN_CMD: Runs a nornir task that executes a list of commands on a device
+    # RESUME: Removes the commands the run being resumed already saved from the plan and gets their saved output (print commands are always run so are displayed)
     # ----------------------------------------------------------------------------
-    def run_cmds(self, cmd: list, sev_level: int) -> str:
-        all_output = ""
-        for each_cmd in cmd:
-            output = "==== " + each_cmd + " " + "=" * (79 - len(each_cmd)) + "\n"
-            cmd_output = self.task.run(
-                name=each_cmd,
-                task=netmiko_send_command,
-                command_string=each_cmd,
-                severity_level=sev_level,
-            ).result
-            all_output = all_output + output + cmd_output + "\n\n\n"
-        return all_output
+    def resume_cmds(
+        self, plan: dict[str, list], data: dict[str, Any]
+    ) -> tuple[dict[str, list], dict[str, str]]:
+        if data.get("journal") == None:
+            return plan, {}
+        reused = data["journal"].saved_outputs(str(self.task.host))
+        reused = {k: v for k, v in reused.items() if k not in plan.get("print", [])}
+        return {k: [x for x in v if x not in reused] for k, v in plan.items()}, reused
 
     # ----------------------------------------------------------------------------
-    # SAVE_CMD: Runs a nornir task to save cmd output (gathered by diff method) to file
+    # TIMEOUT: Gets each commands read timeout learnt from the run history of the hosts platform, is the default if never run before
     # ----------------------------------------------------------------------------
-    def save_cmds(self, run_type: str, data: dict[str, Any], output: str) -> str:
-        date = datetime.now().strftime("%Y%m%d-%H%M")
-        file_name = str(self.task.host) + "_" + run_type + "_" + date + ".txt"
-        output_file = os.path.join(data["output_fldr"], file_name)
-        self.task.run(
-            task=write_file,
-            filename=output_file,
-            content=output,
-            severity_level=logging.DEBUG,
-        )
-        return output_file
+    def cmd_timeouts(
+        self, cmds: list, data: dict[str, Any], default: float
+    ) -> dict[str, float]:
+        if data.get("history") == None:
+            return {x: default for x in cmds}
+        platform = self.task.host.get_connection_parameters("netmiko").platform
+        return {x: data["history"].read_timeout(platform, x, default) for x in cmds}
 
     # ----------------------------------------------------------------------------
-    # PRINT_CMD: Runs and prints the command outputs to screen
+    # HISTORY: Adds the time a command took and the size of its output to the run history
     # ----------------------------------------------------------------------------
-    def run_print_cmd(self, cmds: list) -> None:
-        if len(cmds) != 0:
-            self.run_cmds(cmds, logging.INFO)
+    def record_cmd(
+        self,
+        data: dict[str, Any],
+        each_cmd: str,
+        secs: float,
+        output: Any,
+        timed_out: bool = False,
+    ) -> None:
+        if data.get("history") == None:
+            return
+        platform = self.task.host.get_connection_parameters("netmiko").platform
+        num_bytes = len(output.encode()) if isinstance(output, str) else 0
+        data["history"].record(platform, each_cmd, secs, num_bytes, timed_out)
 
     # ----------------------------------------------------------------------------
-    # SAVE_CMD: Uses separate methods to runs and save the command outputs to file
+    # CONNECT: Opens the hosts netmiko session (is reused by the commands) so the time to connect isn't counted as part of the first command
     # ----------------------------------------------------------------------------
-    def run_save_cmd(self, run_type: str, data: dict[str, Any], cmds: list) -> str:
-        if len(cmds) != 0:
-            output = self.run_cmds(cmds, logging.DEBUG)
-            output_file = self.save_cmds(run_type, data, output)
-            return f"✅ Created command output file '{output_file}'"
-        return "empty"
+    def connect(self, data: dict[str, Any]) -> None:
+        with self.timed(data, "connect"):
+            self.task.host.get_connection("netmiko", self.task.nornir.config)
+
+    # ----------------------------------------------------------------------------
+    # BATCH_CMD: Sends all commands in one write to the netmiko channel and splits the output on each returned prompt
+    # ----------------------------------------------------------------------------
+    def send_batch(self, cmds: list, data: dict[str, Any] = {}) -> dict[str, str]:
+        conn = self.task.host.get_connection("netmiko", self.task.nornir.config)
+        timeouts = self.cmd_timeouts(cmds, data, batch_timeout)
+        prompt = conn.find_prompt()
+        conn.write_channel(conn.RETURN.join(cmds) + conn.RETURN)
+        cmd_output = {}
+        # The device echos each command, its output is everything after the echo up to the next prompt
+        for each_cmd in cmds:
+            begin = time.perf_counter()
+            try:
+                conn.read_until_pattern(
+                    pattern=re.escape(each_cmd), read_timeout=timeouts[each_cmd]
+                )
+                output = conn.read_until_pattern(
+                    pattern=rf"(?:^|\n){re.escape(prompt)}",
+                    read_timeout=timeouts[each_cmd],
+                )
+            except Exception as err:
+                if type(err).__name__ == "ReadTimeout":
+                    self.record_cmd(data, each_cmd, timeouts[each_cmd], "", True)
+                raise
+            output = conn.strip_ansi_escape_codes(conn.normalize_linefeeds(output))
+            cmd_output[each_cmd] = conn.strip_prompt(output).lstrip("\n")
+            secs = time.perf_counter() - begin
+            self.record_cmd(data, each_cmd, secs, cmd_output[each_cmd])
+        return cmd_output
+
+    # ----------------------------------------------------------------------------
+    # GATHERED_RESULT: Nornir task that returns already gathered (batch or broker) command output as a per-command result
+    # ----------------------------------------------------------------------------
+    def gathered_result(self, task: Task, output: str) -> Result:
+        from nornir.core.task import Result
+
+        return Result(host=task.host, result=output)
+
+    # ----------------------------------------------------------------------------
+    # RUN_CMD: Runs a nornir task for each unique command in the plan (so is only run once) and streams its output to file
+    # ----------------------------------------------------------------------------
+    def run_cmds(
+        self,
+        plan: dict[str, list],
+        data: dict[str, Any],
+        save_files: Optional["OutputFiles"] = None,
+    ) -> dict[str, str]:
+        cmds = self.unique_cmds(plan)
+        gathered, outputs = ({}, {})
+        # ASYNC: Commands already run for all hosts by the asyncio engine, errors are raised to fail the host
+        if self.gathered != None and len(cmds) != 0:
+            # The host is popped so its outputs are released once saved
+            gathered = self.gathered.pop(str(self.task.host))
+            if isinstance(gathered, Exception):
+                raise gathered
+        # BROKER: Commands run by the connection broker over its already open session
+        elif data.get("broker") != None and len(cmds) != 0:
+            import nornir_broker
+
+            broker = nornir_broker.BrokerClient(data["broker"])
+            with self.timed(data, "broker") as timing:
+                gathered = broker.run_cmds(self.task, list(cmds.keys()))
+                timing["num_bytes"] = sum(len(x.encode()) for x in gathered.values())
+                timing["retries"] = broker.retries
+        # BATCH: All commands sent in one go over the hosts session
+        elif data.get("batch", False) == True and len(cmds) != 0:
+            self.connect(data)
+            with self.timed(data, "batch") as timing:
+                gathered = self.send_batch(list(cmds.keys()), data)
+                timing["num_bytes"] = sum(len(x.encode()) for x in gathered.values())
+        # GATHERED: Results of broker or batch are added to nornir as a subtask per command
+        if len(gathered) != 0:
+            for each_cmd, sev_level in cmds.items():
+                cmd_result = self.task.run(
+                    name=each_cmd,
+                    task=self.gathered_result,
+                    output=gathered.pop(each_cmd),
+                    severity_level=sev_level,
+                )
+                self.save_output(cmd_result, each_cmd, data, save_files, outputs)
+        # SERIAL: Each command is sent and its output saved to file before the next command
+        else:
+            from nornir.core.exceptions import NornirSubTaskError
+            from nornir_netmiko.tasks import netmiko_send_command
+            import nornir_timeout
+
+            timeouts = self.cmd_timeouts(list(cmds), data, nornir_timeout.min_timeout)
+            expect = None
+            if len(cmds) != 0:
+                self.connect(data)
+                # PROMPT: Found once so netmiko doesn't find it again (a round trip to the device) before every command
+                conn = self.task.host.get_connection("netmiko", self.task.nornir.config)
+                expect = re.escape(conn.find_prompt())
+            for each_cmd, sev_level in cmds.items():
+                begin = time.perf_counter()
+                try:
+                    cmd_result = self.task.run(
+                        name=each_cmd,
+                        task=netmiko_send_command,
+                        command_string=each_cmd,
+                        read_timeout=timeouts[each_cmd],
+                        expect_string=expect,
+                        severity_level=sev_level,
+                    )
+                except NornirSubTaskError as err:
+                    exception = err.result[0].exception
+                    if type(exception).__name__ == "ReadTimeout":
+                        self.record_cmd(data, each_cmd, timeouts[each_cmd], "", True)
+                    raise
+                output = cmd_result.result
+                self.record_cmd(data, each_cmd, time.perf_counter() - begin, output)
+                self.save_output(cmd_result, each_cmd, data, save_files, outputs)
+        return outputs
+
+    # ----------------------------------------------------------------------------
+    # SAVE_OUTPUT: Saves the commands output to file, the output is kept in the nornir result unless low memory mode where a saved command (not displayed) only keeps the files, bytes and hash
+    # ----------------------------------------------------------------------------
+    def save_output(
+        self,
+        cmd_result: Any,
+        each_cmd: str,
+        data: dict[str, Any],
+        save_files: Optional["OutputFiles"],
+        outputs: dict[str, str],
+    ) -> None:
+        output = cmd_result.result
+        if save_files == None:
+            outputs[each_cmd] = output
+            return
+        save_files.write(each_cmd, output)
+        saved = save_files.saved_meta(each_cmd, output)
+        if data.get("low_memory", False) == False:
+            outputs[each_cmd] = output
+        elif cmd_result[0].severity_level < logging.INFO and saved != None:
+            cmd_result[0].result = saved
+
+    # ----------------------------------------------------------------------------
+    # INCREMENTAL: Runs the fingerprint cmds, if unchanged since the latest vital file the stable vital cmds are not run and their saved output is reused
+    # ----------------------------------------------------------------------------
+    def incremental_cmds(
+        self,
+        run_type: str,
+        plan: dict[str, list],
+        data: dict[str, Any],
+        save_files: "OutputFiles",
+    ) -> tuple[dict[str, list], Optional[str]]:
+        import nornir_incremental
+
+        if data.get("incremental", False) == False or save_files.catalog == None:
+            return plan, None
+        if len(plan.get("vital", [])) == 0:
+            return plan, None
+        platform = self.task.host.get_connection_parameters("netmiko").platform
+        inc_cmds = nornir_incremental.IncrementalCmds(
+            save_files.catalog,
+            str(self.task.host),
+            platform,
+            data["input_data"].get("incremental"),
+        )
+        fp_cmds = inc_cmds.fingerprint_cmds()
+        if len(fp_cmds) == 0:
+            return (
+                plan,
+                f"⚠️  No fingerprint commands for platform '{platform}' so all vital commands were run",
+            )
+        # FINGERPRINT: Saved with the vital file (pre-test only saves it) so the next post-test can check if anything moved
+        fp_outputs = self.run_cmds(dict(fingerprint=fp_cmds), data)
+        save_files.add_fingerprint(fp_outputs)
+        if run_type != "post_test":
+            msg, reused = (None, {})
+        elif not inc_cmds.unchanged(save_files.fingerprint):
+            msg = "🔁 Fingerprint changed (or not in the latest vital file) so all vital commands were run"
+            reused = {}
+        else:
+            # Print and config commands are always run so what is displayed and the config diff are current
+            skip = [x for x in plan["vital"] if x not in plan.get("print", [])]
+            skip = [x for x in skip if x not in plan.get("config", [])]
+            reused = inc_cmds.reuse_outputs(inc_cmds.stable_cmds(skip))
+            msg = f"⏩ Fingerprint unchanged so reused the saved output of {len(reused)} stable vital commands"
+        # Fingerprint commands that are also vital commands don't need to be run again
+        for each_cmd, output in fp_outputs.items():
+            if each_cmd in plan["vital"] and each_cmd not in plan.get("print", []):
+                reused.setdefault(each_cmd, output)
+        for each_cmd, output in reused.items():
+            save_files.write(each_cmd, output)
+        return dict(plan, vital=[x for x in plan["vital"] if x not in reused]), msg
+
+    # ----------------------------------------------------------------------------
+    # SAVE_FILE: Creates the object that streams the command outputs to the config, vital and detail files
+    # ----------------------------------------------------------------------------
+    def open_save_files(
+        self, plan: dict[str, list], data: dict[str, Any]
+    ) -> "OutputFiles":
+        import nornir_catalog
+        import nornir_store
+
+        store, catalog = (None, None)
+        if data.get("store", False) == True:
+            store = nornir_store.SnapshotStore(data["output_fldr"])
+        if data.get("output_fldr") != None:
+            catalog = nornir_catalog.SnapshotCatalog(
+                data["output_fldr"], data.get("run_id")
+            )
+        return OutputFiles(
+            str(self.task.host),
+            data.get("output_fldr"),
+            plan,
+            store,
+            catalog,
+            data.get("timer"),
+            data.get("journal"),
+        )
 
     # ----------------------------------------------------------------------------
     # DIFF: Create HTML diff file from 2 input files
     # ----------------------------------------------------------------------------
     def create_diff(self, data: dict[str, Any]) -> str:
-        # Create file names and load compare files
-        pre_file_name = data["cmp_file1"].split("/")[-1]
-        post_file_name = data["cmp_file2"].split("/")[-1]
-        output_file = os.path.join(
+        import nornir_diff
+        import nornir_parse
+
+        # STRUCTURED: Command outputs with a TextFSM template for the platform are compared by parsed record
+        parser = None
+        if data.get("structured") == True:
+            params = self.task.host.get_connection_parameters("netmiko")
+            parser = nornir_parse.SectionParser(
+                params.platform, data["output_fldr"], data.get("parse")
+            )
+        return nornir_diff.create_diff_file(
+            data["cmp_file1"],
+            data["cmp_file2"],
             data["output_fldr"],
-            pre_file_name.split("_")[0]
-            + "_diff_"
-            + pre_file_name.split("_")[1].replace(".txt", "")
-            + ".html",
+            parser,
+            data.get("compact"),
+            data.get("changes"),
         )
-        pre = open(data["cmp_file1"]).readlines()
-        post = open(data["cmp_file2"]).readlines()
-        # Create diff html page with a reduced font size in the html table
-        diff = difflib.HtmlDiff().make_file(pre, post, pre_file_name, post_file_name)
-        diff_font = diff.replace("   <tbody>", '   <tbody style="font-size:12px">')
-        with open(output_file, "w") as f:
-            f.write(diff_font)
-        return f"✅ Created compare HTML file '{output_file}'"
 
     # ----------------------------------------------------------------------------
     # POST_DIFF: Gets last 2 files and compares them
     # ----------------------------------------------------------------------------
-    def pos_create_diff(self, file_type: str, output_fldr: str) -> str:
+    def pos_create_diff(
+        self, file_type: str, output_fldr: str, diff_opts: dict[str, Any] = {}
+    ) -> str:
+        import nornir_catalog
+        import nornir_store
+
         hostname = str(self.task.host)
         file_filter = os.path.join(output_fldr, hostname + "_" + file_type + "*")
-        # Uses glob to match file names using a filter, then selects last 2 (most recent) to compare
-        files = glob.glob(file_filter)
-        files.sort(reverse=True)
+        store = nornir_store.SnapshotStore(output_fldr)
+        # CATALOG: Gets the latest 2 files (or those of the run IDs) from the catalog the files are added to when saved
+        catalog = nornir_catalog.SnapshotCatalog(output_fldr)
+        run_ids = diff_opts.get("run_ids")
+        files = catalog.cmp_files(hostname, file_type, run_ids)
+        # GLOB: Files saved before there was a catalog are matched by file name, then selects last 2 (most recent) to compare
+        if len(files) < 2 and not run_ids:
+            files = glob.glob(file_filter)
+            # STORE: Files only in the snapshot store (not already restored) are also matched, are restored to a temp folder to compare
+            txt_files = [os.path.basename(x) for x in files]
+            for each_file in store.list_files():
+                if each_file.startswith(hostname + "_" + file_type):
+                    if each_file not in txt_files:
+                        files.append(os.path.join(store.manifest_dir, each_file))
+            files.sort(key=os.path.basename, reverse=True)
         if len(files) >= 2:
-            data = dict(output_fldr=output_fldr, cmp_file1=files[1], cmp_file2=files[0])
-            return self.create_diff(data)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cmp_files = []
+                for each_file in files[:2]:
+                    if os.path.dirname(each_file) == store.manifest_dir:
+                        each_file = store.restore(os.path.basename(each_file), tmp_dir)
+                    cmp_files.append(each_file)
+                data = dict(
+                    output_fldr=output_fldr,
+                    cmp_file1=cmp_files[1],
+                    cmp_file2=cmp_files[0],
+                    **{k: v for k, v in diff_opts.items() if k != "run_ids"},
+                )
+                return self.create_diff(data)
+        elif run_ids:
+            return f"❌ Only {len(files)} file found for run IDs {', '.join(run_ids)} to be compared"
         else:
             return f"❌ Only {len(files)} file matched the filter '{file_filter}' for files to be compared"
 
 
+# ----------------------------------------------------------------------------
+# SAVE_FILES: Writes each commands output to the files of the types (config, vital, detail) it is in as soon as it is run
+# ----------------------------------------------------------------------------
+class OutputFiles:
+    def __init__(
+        self,
+        host: str,
+        output_fldr: str,
+        plan: dict[str, list],
+        store: Optional[nornir_store.SnapshotStore] = None,
+        catalog: Optional[nornir_catalog.SnapshotCatalog] = None,
+        timer: Optional[nornir_timing.RunTimer] = None,
+        journal: Optional[nornir_journal.RunJournal] = None,
+    ) -> None:
+        now = datetime.now()
+        self.host = host
+        self.store = store
+        self.catalog = catalog
+        self.timer = timer
+        self.journal = journal
+        saved_files = journal.files.get(host, {}) if journal != None else {}
+        self.files: dict[str, dict[str, Any]] = {}
+        self.pending: dict[str, str] = {}
+        for each_type in ["config", "vital", "detail"]:
+            if len(plan.get(each_type, [])) != 0:
+                # The file of an earlier run in the same minute isn't overwritten, the seconds are added to the name
+                for date in [
+                    now.strftime("%Y%m%d-%H%M"),
+                    now.strftime("%Y%m%d-%H%M%S"),
+                ]:
+                    file_name = host + "_" + each_type + "_" + date + ".txt"
+                    # RESUME: The file of the run being resumed is saved again with the outputs it has and those missing
+                    if saved_files.get(each_type) != None:
+                        file_name = saved_files[each_type]["name"]
+                    if store != None:
+                        path = store.manifest_path(file_name)
+                    else:
+                        path = os.path.join(output_fldr, file_name)
+                    if saved_files.get(each_type) != None or not os.path.exists(path):
+                        break
+                self.files[each_type] = dict(
+                    type=each_type,
+                    name=file_name,
+                    path=path,
+                    cmds=plan[each_type],
+                    next=0,
+                    file=None,
+                    id=None,
+                    hashes={},
+                )
+        self.fingerprint: dict[str, str] = {}
+
+    # ----------------------------------------------------------------------------
+    # OPEN: Opens the text file or if using the snapshot store a store file (manifest) that saves the outputs to the store, and adds it to the catalog and journal
+    # ----------------------------------------------------------------------------
+    def open_file(self, each_file: dict[str, Any]) -> Any:
+        import nornir_store
+
+        if self.catalog != None:
+            each_file["id"] = self.catalog.add(
+                self.host, each_file["type"], each_file["name"], each_file["path"]
+            )
+        if self.journal != None:
+            self.journal.add_file(
+                self.host, each_file["type"], each_file["name"], each_file["path"]
+            )
+        if self.store != None:
+            return nornir_store.StoreFile(self.store, each_file["name"])
+        return open(each_file["path"], "w")
+
+    # ----------------------------------------------------------------------------
+    # WRITE_CMD: Writes the command output to the file, is timed (with the bytes written) if the run is timed
+    # ----------------------------------------------------------------------------
+    def write_cmd(self, each_file: dict[str, Any], each_cmd: str, output: str) -> None:
+        if self.timer != None:
+            with self.timer.phase(self.host, "write", each_cmd) as timing:
+                timing["num_bytes"] = len(output.encode())
+                self.save_cmd(each_file, each_cmd, output)
+        else:
+            self.save_cmd(each_file, each_cmd, output)
+
+    # ----------------------------------------------------------------------------
+    # SAVE_CMD: Saves the command output to the text file (flushed straight to disk) or the store, is then added to the journal
+    # ----------------------------------------------------------------------------
+    def save_cmd(self, each_file: dict[str, Any], each_cmd: str, output: str) -> None:
+        import nornir_catalog
+        import nornir_store
+
+        if each_file["file"] == None:
+            each_file["file"] = self.open_file(each_file)
+        if self.catalog != None:
+            each_file["hashes"][each_cmd] = nornir_catalog.output_hash(output)
+        if self.store != None:
+            each_file["file"].write_cmd(each_cmd, output)
+        else:
+            each_file["file"].write(nornir_store.format_cmd(each_cmd, output))
+            each_file["file"].flush()
+        if self.journal != None:
+            self.journal.add_cmd(self.host, each_file["type"], each_cmd, output)
+
+    # ----------------------------------------------------------------------------
+    # WRITE: Writes the output to each file in the order of the file types commands (out of order outputs are held until their turn)
+    # ----------------------------------------------------------------------------
+    def write(self, each_cmd: str, output: str) -> None:
+        self.pending[each_cmd] = output
+        still_needed = set()
+        for each_file in self.files.values():
+            cmds = each_file["cmds"]
+            while each_file["next"] < len(cmds):
+                next_cmd = cmds[each_file["next"]]
+                if next_cmd not in self.pending:
+                    break
+                self.write_cmd(each_file, next_cmd, self.pending[next_cmd])
+                each_file["next"] += 1
+            still_needed.update(cmds[each_file["next"] :])
+        # Only outputs still to be written are kept
+        self.pending = {k: v for k, v in self.pending.items() if k in still_needed}
+
+    # ----------------------------------------------------------------------------
+    # SAVED_META: The files a commands output is saved to, its size and hash (what low memory mode keeps of it), None if it isn't saved
+    # ----------------------------------------------------------------------------
+    def saved_meta(self, each_cmd: str, output: Any) -> Optional[dict[str, Any]]:
+        import nornir_catalog
+
+        paths = [x["path"] for x in self.files.values() if each_cmd in x["cmds"]]
+        if len(paths) == 0 or not isinstance(output, str):
+            return None
+        return dict(
+            paths=paths,
+            bytes=len(output.encode()),
+            sha256=nornir_catalog.output_hash(output),
+        )
+
+    # ----------------------------------------------------------------------------
+    # FINGERPRINT: Hashes of the fingerprint command outputs, are added to the catalog with the vital file
+    # ----------------------------------------------------------------------------
+    def add_fingerprint(self, outputs: dict[str, str]) -> None:
+        import nornir_catalog
+
+        for each_cmd, output in outputs.items():
+            self.fingerprint[each_cmd] = nornir_catalog.output_hash(output)
+
+    # ----------------------------------------------------------------------------
+    # CLOSE: Closes the files and adds the hash of each output saved to the catalog, any commands already written are kept if a later command failed
+    # ----------------------------------------------------------------------------
+    def close(self) -> None:
+        for each_file in self.files.values():
+            if each_file["file"] != None:
+                each_file["file"].close()
+            if each_file["id"] != None:
+                self.catalog.add_sections(each_file["id"], each_file["hashes"])
+                if each_file["type"] == "vital" and len(self.fingerprint) != 0:
+                    self.catalog.add_sections(
+                        each_file["id"], self.fingerprint, "fingerprint"
+                    )
+
+    # ----------------------------------------------------------------------------
+    # SAVE_MSG: Result message for a file type, is 'empty' if there were no commands for that type
+    # ----------------------------------------------------------------------------
+    def saved_msg(self, file_type: str) -> str:
+        if self.files.get(file_type) != None and self.store != None:
+            return f"✅ Saved command output to snapshot store '{self.files[file_type]['path']}'"
+        elif self.files.get(file_type) != None:
+            return f"✅ Created command output file '{self.files[file_type]['path']}'"
+        return "empty"
+
+
+# ----------------------------------------------------------------------------
+# SESSION_LIMIT: Limits the sessions open at the same time per group and the rate new connections are opened
+# ----------------------------------------------------------------------------
+class SessionLimits:
+    def __init__(
+        self, group_sessions: dict[str, int], conn_rate: Optional[float]
+    ) -> None:
+        self.group_sessions = group_sessions
+        self.conn_rate = conn_rate
+        self.group_lock = {
+            grp: threading.BoundedSemaphore(num) for grp, num in group_sessions.items()
+        }
+        self.rate_lock = threading.Lock()
+        self.next_conn = 0.0
+
+    # ----------------------------------------------------------------------------
+    # GRP_LIMIT: Gets the group session limits from the groups 'max_sessions' data in groups.yml, runtime values take precedence
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def get_group_sessions(nr_inv: Nornir, group_sessions: dict[str, int]) -> dict:
+        all_group_sessions = {}
+        for grp_name, grp in nr_inv.inventory.groups.items():
+            if grp.data.get("max_sessions") != None:
+                all_group_sessions[grp_name] = int(grp.data["max_sessions"])
+        all_group_sessions.update(group_sessions)
+        return all_group_sessions
+
+    # ----------------------------------------------------------------------------
+    # SPREAD: Orders the hosts so each limited groups hosts are spread evenly through the run, if bunched the workers wait on the groups sessions (holding a worker)
+    # ----------------------------------------------------------------------------
+    def spread_hosts(self, nr_inv: Nornir) -> Nornir:
+        if len(self.group_lock) == 0:
+            return nr_inv
+        from nornir.core.inventory import Hosts
+
+        # Hosts are ranked by how far through the hosts with the same limited groups they are
+        same_limits, rank = ({}, {})
+        for name, host in nr_inv.inventory.hosts.items():
+            groups = sorted(x.name for x in host.groups if x.name in self.group_lock)
+            same_limits.setdefault(tuple(groups), []).append(name)
+        for names in same_limits.values():
+            rank.update({x: idx / len(names) for idx, x in enumerate(names)})
+        hosts = nr_inv.inventory.hosts
+        spread_nr = nr_inv.filter()
+        spread_nr.inventory.hosts = Hosts(
+            {x: hosts[x] for x in sorted(hosts, key=rank.get)}
+        )
+        return spread_nr
+
+    # ----------------------------------------------------------------------------
+    # CONN_WAIT: Gets how long to wait before opening a new connection so connections are spaced by the connection rate
+    # ----------------------------------------------------------------------------
+    def conn_wait(self) -> float:
+        if self.conn_rate == None:
+            return 0
+        with self.rate_lock:
+            now = time.monotonic()
+            start = max(now, self.next_conn)
+            self.next_conn = start + 1 / self.conn_rate
+        return start - now
+
+    # ----------------------------------------------------------------------------
+    # HOST_LIMIT: Waits for a session of each of the hosts limited groups and the connection rate, limited sessions are closed when done
+    # ----------------------------------------------------------------------------
+    @contextmanager
+    def host_sessions(self, task: Task) -> Iterator[None]:
+        groups = sorted(grp.name for grp in task.host.groups)
+        groups = [grp for grp in groups if grp in self.group_lock]
+        for each_grp in groups:
+            self.group_lock[each_grp].acquire()
+        try:
+            if "netmiko" not in task.host.connections:
+                time.sleep(self.conn_wait())
+            yield
+        finally:
+            if len(groups) != 0:
+                task.host.close_connection("netmiko")
+            for each_grp in reversed(groups):
+                self.group_lock[each_grp].release()
+
+
 # ----------------------------------------------------------------------------
 # 3. Uses nornir to run commands
 # ----------------------------------------------------------------------------
 class NornirEngine:
-    def __init__(self, nr_inv: Nornir) -> None:
+    def __init__(
+        self,
+        nr_inv: Nornir,
+        data: dict[str, Any] = {},
+        host_plans: Optional[dict[str, Any]] = None,
+    ) -> None:
         self.nr_inv = nr_inv
+        self.host_plans = host_plans
+        group_sessions = SessionLimits.get_group_sessions(
+            nr_inv, data.get("group_sessions", {})
+        )
+        self.limits = SessionLimits(group_sessions, data.get("conn_rate"))
+        # Outputs of each chunk gathered by the async engine, the task only gets the chunk number
+        self.gathered: dict[int, dict[str, Any]] = {}
 
     # ----------------------------------------------------------------------------
     # 2b. Command engine runs the sub-tasks to get commands and possibly save results to file
@@ -362,39 +1196,71 @@ class NornirEngine:
     def cmd_engine(
         self, task: Task, data: dict[str, Any], run_type: str
     ) -> Optional[Result]:
-        self.nr_cmd = NornirCommands(task)
+        from nornir.core.task import Result
+
+        nr_cmd = NornirCommands(
+            task, self.host_plans, self.gathered.get(data.get("chunk"))
+        )
+        # RESUME: Hosts the run being resumed already completed are not connected to again
+        journal = data.get("journal")
+        if journal != None and journal.is_done(str(task.host)):
+            return Result(
+                host=task.host, result=f"⏩ Already collected by run {journal.run_id}"
+            )
 
         # ORG_CMD: Organises cmds to be run and also creates empty lists to store results
         result, empty_result = ([] for i in range(2))
-        cmds = self.nr_cmd.organise_cmds(data.get("input_data", {}))
+        cmds = nr_cmd.host_cmds(data)
+
+        # PLAN: Runs each command once and streams its output to the print, vital, detail and config files it is in
+        plan = nr_cmd.plan_cmds(run_type, data, cmds)
+        # RESUME: Commands the run being resumed already saved aren't run, their saved output is written to the same files
+        run_plan, reused = nr_cmd.resume_cmds(plan, data)
+        save_files = nr_cmd.open_save_files(plan, data)
+        try:
+            for each_cmd, output in reused.items():
+                save_files.write(each_cmd, output)
+            # LIMIT: Only hosts that connect to the device directly (not async or broker) are limited
+            if data.get("chunk") == None and data.get("broker") == None:
+                with self.limits.host_sessions(task):
+                    run_plan, inc_msg = nr_cmd.incremental_cmds(
+                        run_type, run_plan, data, save_files
+                    )
+                    nr_cmd.run_cmds(run_plan, data, save_files)
+            else:
+                run_plan, inc_msg = nr_cmd.incremental_cmds(
+                    run_type, run_plan, data, save_files
+                )
+                nr_cmd.run_cmds(run_plan, data, save_files)
+        finally:
+            save_files.close()
+        if len(reused) != 0:
+            result.append(
+                f"⏩ Resumed run {journal.run_id}, reused the saved output of {len(reused)} commands"
+            )
+        if inc_msg != None:
+            result.append(inc_msg)
 
         # RUN_CFG: Saves running config to file
-        if cmds["run_cfg"] != False and data["output_fldr"] != None:
-            result.append(self.nr_cmd.run_save_cmd("config", data, cmds["run_cfg"]))
-        # PRT: Prints command output to screen
-        if run_type == "print":
-            self.nr_cmd.run_print_cmd(cmds["print"])
-        # VTL_DTL: Saves vital or detail commands to file
-        elif run_type == "vital" or run_type == "detail":
-            result.append(self.nr_cmd.run_save_cmd(run_type, data, cmds[run_type]))
+        if plan.get("config") != None:
+            result.append(save_files.saved_msg("config"))
+        # VTL_DTL: Saves vital or detail commands to file (print commands are displayed by print_result)
+        if run_type == "vital" or run_type == "detail":
+            result.append(save_files.saved_msg(run_type))
         # CMP: Compares 2 specified files
         elif run_type == "compare":
-            result.append(self.nr_cmd.create_diff(data))
+            with nr_cmd.timed(data, "diff"):
+                result.append(nr_cmd.create_diff(data))
 
         # PRE/POST: Prints cmds to screen and saves vital commands to file
-        else:
-            self.nr_cmd.run_print_cmd(cmds["print"])
-            result.append(self.nr_cmd.run_save_cmd("vital", data, cmds["vital"]))
+        elif run_type == "pre_test" or run_type == "post_test":
+            result.append(save_files.saved_msg("vital"))
             # PRE: saves vital commands to file
             if run_type == "pre_test":
-                result.append(self.nr_cmd.run_save_cmd("detail", data, cmds["detail"]))
-            # POST: Compares 2 latest vital and config
-            elif run_type == "post_test":
-                result.append(self.nr_cmd.pos_create_diff("vital", data["output_fldr"]))
-                if cmds["run_cfg"] != False:
-                    result.append(
-                        self.nr_cmd.pos_create_diff("config", data["output_fldr"])
-                    )
+                result.append(save_files.saved_msg("detail"))
+            # POST: Compares 2 latest vital and config, is done by the diff stage (if used) so this worker can collect the next host
+            elif run_type == "post_test" and data.get("diff_stage") == None:
+                result.extend(self.post_diffs(nr_cmd, data, cmds)[0])
 
         # RESULT: Prints warning if no commands (for pre and post test) and/or file location for any saved files
         for each_type in ["print", "vital", "detail"]:
@@ -412,23 +1278,166 @@ class NornirEngine:
                 result.remove("empty")
             except:
                 pass
-            return Result(host=task.host, result="\n".join(result))
+            host_result = Result(host=task.host, result="\n".join(result))
         else:
-            return None
+            host_result = None
+        # DIFF_STAGE: The diff messages are added to the hosts result (and it is marked done in the journal) once diffed
+        if run_type == "post_test" and data.get("diff_stage") != None:
+            diff_job = partial(self.post_diffs, nr_cmd, data, cmds)
+            data["diff_stage"].submit(str(task.host), diff_job, host_result, journal)
+        elif journal != None:
+            journal.host_done(str(task.host))
+        return host_result
+
+    # ----------------------------------------------------------------------------
+    # POST_DIFF: Compares the hosts latest 2 vital and config files, returns the result messages and the commands changed in each (None if not compared)
+    # ----------------------------------------------------------------------------
+    def post_diffs(
+        self, nr_cmd: NornirCommands, data: dict[str, Any], cmds: dict[str, Any]
+    ) -> tuple[list[str], dict[str, Optional[list]]]:
+        result, changes = ([], {})
+        diff_opts = dict(
+            compact=data.get("compact"),
+            structured=data.get("structured"),
+            parse=data["input_data"].get("parse"),
+            run_ids=data.get("run_ids"),
+        )
+        # Config is always compared as text as it has no TextFSM template
+        cfg_opts = dict(compact=data.get("compact"), run_ids=data.get("run_ids"))
+        for file_type, opts in [("vital", diff_opts), ("config", cfg_opts)]:
+            if file_type == "config" and cmds["run_cfg"] == False:
+                continue
+            changes[file_type] = []
+            opts = dict(opts, changes=changes[file_type])
+            with nr_cmd.timed(data, "diff", file_type):
+                result.append(
+                    nr_cmd.pos_create_diff(file_type, data["output_fldr"], opts)
+                )
+            if result[-1].startswith("❌"):
+                changes[file_type] = None
+        return result, changes
+
+    # ----------------------------------------------------------------------------
+    # 2c. Plan engine gets the unique commands each host needs to run (used by the async engine)
+    # ----------------------------------------------------------------------------
+    def plan_engine(self, task: Task, data: dict[str, Any], run_type: str) -> Result:
+        from nornir.core.task import Result
+
+        nr_cmd = NornirCommands(task, self.host_plans)
+        # RESUME: Hosts already completed and commands already saved by the run being resumed aren't run
+        if data.get("journal") != None and data["journal"].is_done(str(task.host)):
+            return Result(host=task.host, result=[])
+        cmds = nr_cmd.host_cmds(data)
+        plan, reused = nr_cmd.resume_cmds(nr_cmd.plan_cmds(run_type, data, cmds), data)
+        return Result(host=task.host, result=list(nr_cmd.unique_cmds(plan).keys()))
+
+    # ----------------------------------------------------------------------------
+    # 2d. Async engine runs the hosts commands with asyncio a chunk of hosts at a time, the cmd_engine then uses this output rather than connecting
+    # ----------------------------------------------------------------------------
+    def async_engine(
+        self, run_type: str, data: dict[str, Any], nr_inv: Nornir
+    ) -> Iterator[tuple[Nornir, dict[str, Any]]]:
+        from concurrent.futures import ThreadPoolExecutor
+        import nornir_async
+
+        hosts = list(nr_inv.inventory.hosts)
+        size = nornir_async.gather_hosts
+        chunks = [set(hosts[x : x + size]) for x in range(0, max(len(hosts), 1), size)]
+        # CHUNK: The next chunk is gathered while the cmd_engine saves this one, so at most 2 chunks of outputs are held
+        with ThreadPoolExecutor(1, thread_name_prefix="async_engine") as pool:
+            future = pool.submit(self.gather_cmds, run_type, data, chunks[0])
+            for num, each_chunk in enumerate(chunks):
+                gathered = future.result()
+                if num + 1 < len(chunks):
+                    future = pool.submit(
+                        self.gather_cmds, run_type, data, chunks[num + 1]
+                    )
+                chunk_nr = nr_inv.filter(filter_func=lambda h: h.name in each_chunk)
+                self.gathered[num] = gathered
+                try:
+                    yield chunk_nr, dict(data, chunk=num)
+                finally:
+                    del self.gathered[num]
 
     # ----------------------------------------------------------------------------
-    # 2c. Task engine to run nornir task for commands and prints result
+    # GATHER: Plans and runs the commands of a chunk of hosts, a host whose plan failed has its error returned (so the cmd_engine fails only that host)
+    # ----------------------------------------------------------------------------
+    def gather_cmds(
+        self, run_type: str, data: dict[str, Any], hosts: set
+    ) -> dict[str, Any]:
+        import nornir_async
+
+        # Run without the processors of the run so planning isn't timed or printed
+        nr_chunk = self.nr_inv.filter(filter_func=lambda h: h.name in hosts)
+        plans = nr_chunk.run(task=self.plan_engine, data=data, run_type=run_type)
+        gathered, host_cmds = ({}, {})
+        for host, plan in plans.items():
+            if plan.failed:
+                gathered[host] = plan[0].exception
+                # Failed hosts are skipped by nornir, it is recovered so the cmd_engine reports its error
+                self.nr_inv.data.recover_host(host)
+            else:
+                host_cmds[host] = plan.result
+        async_cmds = nornir_async.AsyncCommands(
+            self.nr_inv,
+            limits=self.limits,
+            timer=data.get("timer"),
+            history=data.get("history"),
+        )
+        gathered.update(async_cmds.run_cmds(host_cmds))
+        return gathered
+
+    # ----------------------------------------------------------------------------
+    # 2e. Task engine to run nornir task for commands and prints result
     # ----------------------------------------------------------------------------
     def task_engine(self, run_type: str, data: dict[str, Any]) -> None:
+        import nornir_diff
+        import nornir_live
+
         run_type = run_type.replace("_save", "")
+        # DIFF: Diffs of large command outputs are created in a process pool (shared by all hosts) rather than in the nornir threads
+        if run_type in ["compare", "post_test"] and data.get("diff_workers") != 0:
+            nornir_diff.start_pool(data.get("diff_workers"))
+        # TIMER: Times each hosts task and commands (added to any processors already used)
+        nr_inv = self.nr_inv
+        if data.get("timer") != None:
+            nr_inv = nr_inv.with_processors([*nr_inv.processors, data["timer"]])
+        # DIFF_STAGE: Post-test hosts are diffed as they finish collecting and each hosts verdict is printed as soon as it is known
+        if run_type == "post_test":
+            data = dict(data, diff_stage=nornir_live.DiffStage())
+            nr_inv = nr_inv.with_processors([*nr_inv.processors, data["diff_stage"]])
+        # LIVE: Print runs print each host as soon as it completes (then release its output) rather than all hosts at the end
+        live = None
+        if run_type == "print":
+            live = nornir_live.LiveRenderer()
+            nr_inv = nr_inv.with_processors([*nr_inv.processors, live])
+        # ASYNC: Each chunk of hosts is gathered with asyncio then run by the cmd_engine, rather than gathering all hosts outputs before saving any
+        runs = iter([(self.limits.spread_hosts(nr_inv), data)])
+        if data.get("engine") == "async" and run_type != "compare":
+            runs = self.async_engine(run_type, data, nr_inv)
         # The parent nornir task in which the cmd_engine tuns the nornir sub-tasks
-        if run_type != "validate":
-            result = self.nr_inv.run(
-                name=f"{run_type.upper()} command output",
-                task=self.cmd_engine,
-                data=data,
-                run_type=run_type,
-            )
+        try:
+            if run_type != "validate":
+                result = None
+                for run_nr, run_data in runs:
+                    run_result = run_nr.run(
+                        name=f"{run_type.upper()} command output",
+                        task=self.cmd_engine,
+                        data=run_data,
+                        run_type=run_type,
+                    )
+                    if result == None:
+                        result = run_result
+                    else:
+                        result.update(run_result)
+                # Results are printed in the inventory order rather than the order the hosts were run
+                ordered = {x: result[x] for x in nr_inv.inventory.hosts if x in result}
+                result.clear()
+                result.update(ordered)
+            if data.get("diff_stage") != None:
+                data["diff_stage"].wait()
+        finally:
+            nornir_diff.close_pool()
         # TBD: For future use with nornir_validate
         # elif run_type == "validate":
         #     result = self.nr_inv.run(
@@ -436,6 +1445,10 @@ class NornirEngine:
         #         input_data=data["input_file"],
         #         directory=data["output_fldr"],
         #     )
+        if live != None:
+            return
+        from nornir_rich.functions import print_result
+
         # Only prints out result if commands where run against a device
         if result[list(result.keys())[0]].result != "Nothing run":
             # Adds report information (report_text) if nr_validate has been run
@@ -447,43 +1460,252 @@ class NornirEngine:
                 # Incase want to use orig nornir_print, dont use as doesnt delete empty results when run with prt flag
                 # print_result(result, vars=["result"], line_breaks=True)
 
+    # ----------------------------------------------------------------------------
+    # 2f. Poll engine runs the hosts vital commands over its open session (not saved) and checks which changed from the baseline
+    # ----------------------------------------------------------------------------
+    def poll_engine(self, task: Task, data: dict[str, Any]) -> Result:
+        from nornir.core.task import Result
+
+        nr_cmd = NornirCommands(task, self.host_plans)
+        plan = dict(vital=nr_cmd.host_cmds(data)["vital"])
+        try:
+            # LIMIT: Hosts in groups with a session limit have their session closed after each poll
+            if data.get("broker") == None:
+                with self.limits.host_sessions(task):
+                    outputs = nr_cmd.run_cmds(plan, data)
+            else:
+                outputs = nr_cmd.run_cmds(plan, data)
+        except Exception:
+            # A broken session is closed so the next poll reconnects
+            task.host.close_connections()
+            raise
+        msgs = data["vital_watch"].check(str(task.host), outputs)
+        return Result(host=task.host, result="\n".join(msgs))
+
+    # ----------------------------------------------------------------------------
+    # 2g. Watch engine polls all hosts every interval (sessions are kept open between polls) until interrupted or the number of polls is reached
+    # ----------------------------------------------------------------------------
+    def watch_engine(self, data: dict[str, Any], polls: Optional[int] = None) -> None:
+        import nornir_live
+        import nornir_watch
+
+        watch = nornir_watch.VitalWatch(
+            data["output_fldr"], (data.get("run_ids") or [None])[0]
+        )
+        # Polls aren't timed as the spans of each would be kept for the whole watch
+        interval = data["watch"]
+        data = dict(data, vital_watch=watch, timer=None)
+        nr_inv = self.limits.spread_hosts(self.nr_inv)
+        try:
+            while polls == None or watch.poll < polls:
+                begin = time.monotonic()
+                watch.start_poll()
+                # Hosts that failed the last poll are polled again
+                result = nr_inv.run(
+                    name="WATCH vital commands",
+                    task=self.poll_engine,
+                    data=data,
+                    on_failed=True,
+                )
+                for host, host_result in result.failed_hosts.items():
+                    watch.failed(host, nornir_live.error_name(host_result))
+                watch.end_poll(time.monotonic() - begin)
+                if polls == None or watch.poll < polls:
+                    time.sleep(max(0, interval - (time.monotonic() - begin)))
+        except KeyboardInterrupt:
+            watch.rc.print(f":stop_sign: Stopped watching after {watch.poll} polls")
+        finally:
+            self.nr_inv.close_connections()
+
+
+# ----------------------------------------------------------------------------
+# STARTUP: Times each stage of the startup (up to connecting to devices) to report against the startup budget
+# ----------------------------------------------------------------------------
+class StartupTimer:
+    def __init__(self, rc: Console) -> None:
+        self.rc = rc
+        # Imports are measured as the CPU time since the interpreter started (is mostly importing)
+        self.stages = dict(imports=time.process_time())
+        self.last = time.perf_counter()
+        self.reported = False
+
+    # ----------------------------------------------------------------------------
+    # MARK: Records the time since the last stage ended as the time of this stage
+    # ----------------------------------------------------------------------------
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0) + now - self.last
+        self.last = now
+
+    # ----------------------------------------------------------------------------
+    # REPORT: Prints each stages time and the total against the budget, is only printed once (run types that exit early print it at exit)
+    # ----------------------------------------------------------------------------
+    def report(self, stage: Optional[str] = None) -> None:
+        if self.reported:
+            return
+        if stage != None:
+            self.mark(stage)
+        self.reported = True
+        total = sum(self.stages.values())
+        for each_stage, secs in self.stages.items():
+            self.rc.print(f"  {each_stage:<12}{secs * 1000:>8.1f} ms")
+        if total <= startup_budget:
+            self.rc.print(
+                f":white_check_mark: Startup took {total * 1000:.1f} ms, within the {startup_budget * 1000:.0f} ms budget"
+            )
+        else:
+            self.rc.print(
+                f":warning: Startup took {total * 1000:.1f} ms, over the {startup_budget * 1000:.0f} ms budget"
+            )
+
 
 # ----------------------------------------------------------------------------
 # Engine that runs the methods from the script
 # ----------------------------------------------------------------------------
 def main():
+    import nornir_inv
+
     build_inv = nornir_inv.BuildInventory()  # parsers in nor_inv script
     input_val = InputValidate(working_directory)  # parsers & val in this file
+    startup = StartupTimer(input_val.rc)
 
     # 1. Gets info input by user by calling local method that calls remote nor_inv method
     tmp_args = input_val.add_arg_parser(build_inv)
     args = vars(tmp_args.parse_args())
+    # Run types that exit before connecting to devices (show, compare, etc) print the startup report at exit
+    if args.get("startup_time", False) == True:
+        atexit.register(startup.report, "run")
+    startup.mark("args")
 
     # 2. Get the run type (flag used)
     run_type, file_path = input_val.get_run_type(args)
+    data, device = ({}, dict(user=None, pword=None))
+
+    # 3a. RST: Recreates the text files from the snapshot store, doesn't need the inventory
+    if run_type == "restore":
+        import nornir_store
+
+        z, output_fldr, z = input_val.dir_exist_get_paths(run_type, file_path)
+        store = nornir_store.SnapshotStore(output_fldr)
+        for each_file in sorted(store.list_files()):
+            restore_file = store.restore(each_file, output_fldr)
+            input_val.rc.print(
+                f":white_check_mark: Restored file [i]{restore_file}[/i]"
+            )
+        sys.exit(0)
+    # 3b. LST: Lists the runs in the catalog, doesn't need the inventory
+    elif run_type == "list_runs":
+        import nornir_catalog
 
-    # 3a. CMP: Validate directories and files exist, doesn't need device creds
-    if run_type == "compare":
+        z, output_fldr, z = input_val.dir_exist_get_paths(run_type, file_path)
+        runs = nornir_catalog.SnapshotCatalog(output_fldr).runs()
+        if len(runs) == 0:
+            input_val.rc.print(f":x: There are no saved files in [i]{output_fldr}[/i]")
+        for each_run in runs:
+            created = datetime.fromtimestamp(each_run["created"]).strftime(
+                "%d/%m/%Y %H:%M"
+            )
+            input_val.rc.print(
+                f"[b]{each_run['run_id']}[/b]  {created}  {each_run['hosts']} hosts, "
+                f"{each_run['files']} files ({each_run['file_types']})"
+            )
+        sys.exit(0)
+    # 3c. CMP: Validate directories and files exist, doesn't need device creds
+    elif run_type == "compare":
         data = input_val.val_compare_arg(run_type, file_path)
-        device = dict(user=None, pword=None)
-        # 3b. OTHER: Validates the input file exists, is correct format and gets device creds
+        # FAST: Only a structured compare needs the inventory (for the platform), any other compare doesn't load nornir
+        if args.get("structured", False) == False:
+            import nornir_diff
+
+            run_opts = input_val.get_run_opts(args)
+            startup.mark("input")
+            if run_opts["diff_workers"] != 0:
+                nornir_diff.start_pool(run_opts["diff_workers"])
+            try:
+                result = nornir_diff.create_diff_file(
+                    data["cmp_file1"],
+                    data["cmp_file2"],
+                    data["output_fldr"],
+                    context=run_opts["compact"],
+                )
+            finally:
+                nornir_diff.close_pool()
+            input_val.rc.print(result)
+            sys.exit(0)
+        # 3d. OTHER: Validates the input file exists, is correct format and gets device creds
     elif run_type != None:
         data = input_val.val_noncompare_arg(run_type, file_path)
         device = input_val.get_user_pass(args)
+    # 3e. Gets the run options (how commands are run and number of workers)
+    run_opts = input_val.get_run_opts(args)
+    startup.mark("input")
 
     # 4. Loads inventory using static host and group files (checks first if location changed with env vars)
-    nr_inv = build_inv.load_inventory(
+    inv_files = [
         os.path.join(os.environ.get("INVENTORY", inventory), "hosts.yml"),
         os.path.join(os.environ.get("INVENTORY", inventory), "groups.yml"),
-    )
+    ]
+    nr_inv = build_inv.load_inventory(inv_files[0], inv_files[1], run_opts["workers"])
+    all_hosts = nr_inv.inventory.hosts
+    startup.mark("inventory")
 
-    # 5. Filter the inventory based on the runtime flags and add creds to Nornir inventory defaults
+    # 5. Filter the inventory based on the runtime flags (show prints the hosts and exits) and add creds to Nornir inventory defaults
     nr_inv = build_inv.filter_inventory(args, nr_inv)
     nr_inv = build_inv.inventory_defaults(nr_inv, device)
+    startup.mark("filter")
+
+    # 6. Compiles each hosts commands once for the run (cached by the hash of the input and inventory files) rather than in each hosts task
+    host_plans = None
+    if data.get("input_data") != None:
+        import nornir_plan
+
+        host_plans = nornir_plan.get_plans(
+            data["input_file"], inv_files, data["input_data"], all_hosts
+        )
+    startup.mark("plans")
+
+    # 7. Add the run options and the run ID (used to group the files saved by this run in the catalog) to the data passed to the nornir tasks
+    import nornir_timeout
+    import nornir_timing
 
-    # 6. Run the nornir tasks dependant on the run type (runtime flag)
-    nr_eng = NornirEngine(nr_inv)
-    nr_eng.task_engine(run_type, data)
+    data.update(run_opts)
+    data["run_id"] = datetime.now().strftime("%Y%m%d-%H%M%S")
+    # JOURNAL: Records the files and commands saved so the run can be resumed, a resumed run keeps the run ID of the run it resumes
+    data["journal"] = None
+    if run_opts["watch"] == None:
+        data["journal"] = input_val.get_journal(
+            run_type, data.get("output_fldr"), data["run_id"], run_opts["resume"]
+        )
+    if data["journal"] != None:
+        data["run_id"] = data["journal"].run_id
+    # TIMER: Only times each host, command and phase if a run report or spans are saved
+    data["timer"] = None
+    if data["report"] != None or data["spans"] != None:
+        data["timer"] = nornir_timing.RunTimer(data["run_id"], run_type)
+    # HISTORY: Each commands read timeout is learnt from how long it took (and its output size) on the platform in earlier runs, the broker runs commands with its own timeouts
+    data["history"] = None
+    if data["broker"] == None:
+        data["history"] = nornir_timeout.CmdHistory()
+
+    # 8. Run the nornir tasks dependant on the run type (runtime flag), watch polls the post-test vital commands until interrupted
+    if args.get("startup_time", False) == True:
+        startup.report()
+    nr_eng = NornirEngine(nr_inv, data, host_plans)
+    if data["watch"] != None:
+        nr_eng.watch_engine(data)
+    else:
+        nr_eng.task_engine(run_type, data)
+    if data["journal"] != None:
+        data["journal"].finish(list(nr_inv.inventory.hosts))
+
+    # 9. Saves the command history, run report and spans of the time taken by each host, command and phase
+    if data["history"] != None:
+        data["history"].save()
+    if data["timer"] != None:
+        for each_msg in nornir_timing.save_report(
+            data["timer"], data.get("output_fldr"), data["report"], data["spans"]
+        ):
+            input_val.rc.print(each_msg)
 
 
 if __name__ == "__main__":
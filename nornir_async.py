@@ -0,0 +1,216 @@
+from __future__ import annotations
+import re
+import time
+import asyncio
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from nornir.core import Nornir
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the asyncio engine
+# ----------------------------------------------------------------------------
+async_sessions: int = 500  # Max number of device sessions open at the same time
+# Max hosts whose outputs are gathered at once, each chunk is saved by the nornir run while the next is gathered
+gather_hosts: int = 1000
+connect_timeout: float = 30  # Max secs to wait for a device to return a prompt
+read_timeout: float = 60  # Max seconds to wait for each command output
+prompt_pattern: str = r"[\w\-\.\/:@()]+[>#]\s*$"  # Finds the first device prompt
+# Same output normalisation netmiko does, linefeeds to '\n', ANSI next line/insert line codes to returns and other ANSI codes removed
+linefeed_pattern: str = r"\r\r\r\n|\r\r\n|\r\n|\n\r|\r"
+ansi_return_pattern: str = r"\x1bE|\x1b\[(\d+)L"
+ansi_pattern: str = r"\x1b\[[\d;?]*[A-Za-z]"
+# Command that disables paging for each netmiko platform, any not listed use 'terminal length 0'
+paging_cmds: dict[str, str] = dict(
+    cisco_asa="terminal pager 0",
+    cisco_asa_ssh="terminal pager 0",
+    cisco_wlc="config paging disable",
+    cisco_wlc_ssh="config paging disable",
+    checkpoint_gaia="set clienv rows 0",
+    checkpoint_gaia_ssh="set clienv rows 0",
+)
+
+
+# ----------------------------------------------------------------------------
+# ASYNC_CMDS: Runs each hosts commands over asyncssh sessions all driven from the one event loop
+# ----------------------------------------------------------------------------
+class AsyncCommands:
+    def __init__(
+        self,
+        nr_inv: Nornir,
+        max_sessions: int = async_sessions,
+        limits: Any = None,
+        timer: Any = None,
+        history: Any = None,
+    ) -> None:
+        self.nr_inv = nr_inv
+        self.max_sessions = max_sessions
+        self.limits = limits
+        self.timer = timer
+        self.history = history
+
+    # ----------------------------------------------------------------------------
+    # TIMED: Adds the time since begin (perf_counter) to the run timings if the run is timed
+    # ----------------------------------------------------------------------------
+    def timed(
+        self,
+        host: str,
+        phase: str,
+        start: float,
+        begin: float,
+        cmd: Optional[str] = None,
+        output: str = "",
+    ) -> None:
+        if self.timer != None:
+            secs = time.perf_counter() - begin
+            self.timer.add(host, phase, start, secs, cmd, len(output.encode()))
+
+    # ----------------------------------------------------------------------------
+    # READ: Reads the session until the pattern is matched, anything after the match is kept in the buffer for the next read
+    # ----------------------------------------------------------------------------
+    async def read_until(
+        self, process: Any, buffer: dict[str, str], pattern: str, timeout: float
+    ) -> str:
+        async def read():
+            while not re.search(pattern, buffer["output"]):
+                data = await process.stdout.read(65535)
+                if not data:
+                    raise ConnectionError("Session closed by the device")
+                buffer["output"] += data
+            return re.search(pattern, buffer["output"])
+
+        match = await asyncio.wait_for(read(), timeout)
+        output = buffer["output"][: match.end()]
+        buffer["output"] = buffer["output"][match.end() :]
+        return output
+
+    # ----------------------------------------------------------------------------
+    # CLEAN: Normalises the output the same as netmiko does so the async outputs match those got over netmiko
+    # ----------------------------------------------------------------------------
+    def clean_output(self, output: str) -> str:
+        output = re.sub(linefeed_pattern, "\n", output)
+        output = re.sub(
+            ansi_return_pattern, lambda code: "\n" * int(code.group(1) or 1), output
+        )
+        return re.sub(ansi_pattern, "", output)
+
+    # ----------------------------------------------------------------------------
+    # RUN_CMD: Sends a command and gets its output, which is everything after the command echo up to the next prompt
+    # ----------------------------------------------------------------------------
+    async def send_cmd(
+        self,
+        process: Any,
+        buffer: dict[str, str],
+        each_cmd: str,
+        prompt: str,
+        timeout: float = read_timeout,
+    ) -> str:
+        process.stdin.write(each_cmd + "\n")
+        await self.read_until(process, buffer, re.escape(each_cmd), timeout)
+        output = await self.read_until(
+            process, buffer, rf"(?:^|\n){re.escape(prompt)}", timeout
+        )
+        return self.clean_output(output[: -len(prompt)]).strip("\n")
+
+    # ----------------------------------------------------------------------------
+    # HOST_CMD: Connects to a host, disables paging and runs each command one after the other
+    # ----------------------------------------------------------------------------
+    async def host_cmds(self, host: str, cmds: list) -> dict[str, str]:
+        import asyncssh
+
+        params = self.nr_inv.inventory.hosts[host].get_connection_parameters("netmiko")
+        cmd_output, buffer = ({}, dict(output=""))
+        start, begin = (time.time(), time.perf_counter())
+        async with asyncssh.connect(
+            params.hostname,
+            port=params.port or 22,
+            username=params.username,
+            password=params.password,
+            known_hosts=None,
+            connect_timeout=connect_timeout,
+        ) as conn:
+            process = await conn.create_process(term_type="vt100", encoding="utf-8")
+            # PROMPT: The first prompt is used to find the end of each command output
+            output = await self.read_until(
+                process, buffer, prompt_pattern, connect_timeout
+            )
+            prompt = output.split("\n")[-1].strip()
+            paging = paging_cmds.get(params.platform, "terminal length 0")
+            await self.send_cmd(process, buffer, paging, prompt)
+            self.timed(host, "connect", start, begin)
+            for each_cmd in cmds:
+                start, begin = (time.time(), time.perf_counter())
+                timeout = read_timeout
+                if self.history != None:
+                    timeout = self.history.read_timeout(
+                        params.platform, each_cmd, read_timeout
+                    )
+                try:
+                    cmd_output[each_cmd] = await self.send_cmd(
+                        process, buffer, each_cmd, prompt, timeout
+                    )
+                except asyncio.TimeoutError:
+                    if self.history != None:
+                        self.history.record(params.platform, each_cmd, timeout, 0, True)
+                    raise
+                self.timed(
+                    host, "command", start, begin, each_cmd, cmd_output[each_cmd]
+                )
+                if self.history != None:
+                    self.history.record(
+                        params.platform,
+                        each_cmd,
+                        time.perf_counter() - begin,
+                        len(cmd_output[each_cmd].encode()),
+                    )
+            process.stdin.write("exit\n")
+        return cmd_output
+
+    # ----------------------------------------------------------------------------
+    # LIMIT: Limits the sessions open at the same time (total and per group) and the connection rate, errors are returned so fail only that host
+    # ----------------------------------------------------------------------------
+    async def limit_host_cmds(
+        self,
+        limit: list,
+        grp_limit: dict[str, asyncio.Semaphore],
+        host: str,
+        cmds: list,
+    ) -> Any:
+        groups = sorted(grp.name for grp in self.nr_inv.inventory.hosts[host].groups)
+        host_limits = limit + [grp_limit[grp] for grp in groups if grp in grp_limit]
+        for each_limit in host_limits:
+            await each_limit.acquire()
+        try:
+            if self.limits != None:
+                await asyncio.sleep(self.limits.conn_wait())
+            return await self.host_cmds(host, cmds)
+        except Exception as err:
+            return err
+        finally:
+            for each_limit in host_limits:
+                each_limit.release()
+
+    # ----------------------------------------------------------------------------
+    # RUN_ALL: Runs the commands for all hosts concurrently, the result is the commands output or error per host
+    # ----------------------------------------------------------------------------
+    async def run_all_cmds(self, host_cmds: dict[str, list]) -> dict[str, Any]:
+        limit = [asyncio.Semaphore(self.max_sessions)]
+        grp_limit = {}
+        if self.limits != None:
+            for grp, num in self.limits.group_sessions.items():
+                grp_limit[grp] = asyncio.Semaphore(num)
+        hosts = [host for host, cmds in host_cmds.items() if len(cmds) != 0]
+        results = await asyncio.gather(
+            *[
+                self.limit_host_cmds(limit, grp_limit, host, host_cmds[host])
+                for host in hosts
+            ]
+        )
+        return dict(zip(hosts, results))
+
+    # ----------------------------------------------------------------------------
+    # RUN_CMD: Starts the event loop that runs the commands for all hosts
+    # ----------------------------------------------------------------------------
+    def run_cmds(self, host_cmds: dict[str, list]) -> dict[str, Any]:
+        return asyncio.run(self.run_all_cmds(host_cmds))
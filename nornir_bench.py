@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import contextlib
+from typing import Any, Optional
+
+import yaml
+from rich.console import Console
+from rich.table import Table
+from rich.theme import Theme
+
+from main import InputValidate, NornirEngine, input_cmd_file, output_folder
+import nornir_inv
+import nornir_sim
+import nornir_plan
+import nornir_diff
+import nornir_catalog
+import nornir_timing
+import nornir_timeout
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the benchmark
+# ----------------------------------------------------------------------------
+bench_hosts: int = 20  # Number of simulated hosts the run types are run against
+bench_run_types: list = ["print", "vital", "detail", "pre_test", "post_test"]
+# Max % a result can be worse than the baseline (fewer hosts/sec, slower p99 or diff) before it is a regression
+regression_pct: float = 20
+# Commands run on all hosts by the benchmark, shared commands are only run once
+bench_cmds: dict[str, Any] = dict(
+    run_cfg=True,
+    cmd_print=["show version", "show ip interface brief"],
+    cmd_vital=["show ip interface brief", "show ip route", "show ip arp"],
+    cmd_detail=["show interfaces", "show mac address-table"],
+)
+
+
+# ----------------------------------------------------------------------------
+# PERCENTILE: Nearest-rank percentile of the values, 0 if there are none
+# ----------------------------------------------------------------------------
+def percentile(values: list[float], pct: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+# ----------------------------------------------------------------------------
+# RSS: Peak memory (MB) of this process, ru_maxrss is KB on Linux and bytes on macOS
+# ----------------------------------------------------------------------------
+def peak_rss() -> float:
+    import resource
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+# ----------------------------------------------------------------------------
+# RUN_TYPE: Runs a run type with the task engine (the result print is thrown away) and returns its throughput and command latency (from the run timings)
+# ----------------------------------------------------------------------------
+def bench_run_type(
+    nr_inv: Any, run_type: str, data: dict[str, Any], host_plans: dict[str, Any]
+) -> dict:
+    run_id = f"bench-{run_type}"
+    timer = nornir_timing.RunTimer(run_id, run_type)
+    history = nornir_timeout.CmdHistory()
+    nr_inv.data.reset_failed_hosts()
+    nr_eng = NornirEngine(nr_inv, data, host_plans)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        nr_eng.task_engine(
+            run_type, dict(data, run_id=run_id, timer=timer, history=history)
+        )
+    secs = time.perf_counter() - start
+    history.save()
+    num_hosts = len(nr_inv.inventory.hosts)
+    failed = len(nr_inv.data.failed_hosts)
+    cmd_times = [x["secs"] for x in timer.records if x["phase"] == "command"]
+    return dict(
+        run_type=run_type,
+        hosts=num_hosts,
+        failed=failed,
+        secs=round(secs, 3),
+        hosts_sec=round((num_hosts - failed) / secs, 2),
+        cmds=len(cmd_times),
+        p50_ms=round(percentile(cmd_times, 50) * 1000, 1),
+        p99_ms=round(percentile(cmd_times, 99) * 1000, 1),
+        rss_mb=round(peak_rss(), 1),
+    )
+
+
+# ----------------------------------------------------------------------------
+# DIFF: Times creating the HTML diff of each hosts latest 2 vital files (those of the pre and post test)
+# ----------------------------------------------------------------------------
+def bench_diff(output_fldr: str, hosts: list, diff_fldr: str) -> dict:
+    catalog = nornir_catalog.SnapshotCatalog(output_fldr)
+    times = []
+    os.makedirs(diff_fldr, exist_ok=True)
+    start = time.perf_counter()
+    for each_host in hosts:
+        files = catalog.cmp_files(each_host, "vital")
+        if len(files) < 2:
+            continue
+        diff_start = time.perf_counter()
+        nornir_diff.create_diff_file(files[1], files[0], diff_fldr)
+        times.append(time.perf_counter() - diff_start)
+    secs = time.perf_counter() - start
+    return dict(
+        run_type="diff",
+        hosts=len(times),
+        failed=len(hosts) - len(times),
+        secs=round(secs, 3),
+        hosts_sec=round(len(times) / secs, 2) if secs != 0 else 0,
+        cmds=len(times),
+        p50_ms=round(percentile(times, 50) * 1000, 1),
+        p99_ms=round(percentile(times, 99) * 1000, 1),
+        rss_mb=round(peak_rss(), 1),
+    )
+
+
+# ----------------------------------------------------------------------------
+# BENCH: Starts the simulated hosts and runs each run type against them (in a temp working dir, inventory and cache) in order
+# ----------------------------------------------------------------------------
+def run_bench(
+    num_hosts: int = bench_hosts,
+    run_types: Optional[list] = None,
+    opts: Optional[dict[str, Any]] = None,
+    run_opts: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    run_types = run_types or bench_run_types
+    opts = dict(nornir_sim.sim_opts, **(opts or {}))
+    hosts = nornir_sim.sim_hosts(num_hosts)
+    sim = nornir_sim.SimProcess(hosts, opts, 0)
+    ports = sim.start()
+    cache_dir = os.environ.get("CACHE_DIRECTORY")
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.environ["CACHE_DIRECTORY"] = os.path.join(tmp_dir, "cache")
+            inv_files = nornir_sim.build_inventory(
+                os.path.join(tmp_dir, "inventory"), hosts, ports
+            )
+            # CHANGE_DIR: Input file and output folder of the benchmark change
+            change_dir = os.path.join(tmp_dir, "BENCH")
+            os.makedirs(os.path.join(change_dir, output_folder))
+            with open(os.path.join(change_dir, input_cmd_file), "w") as cmd_file:
+                yaml.dump(dict(all=bench_cmds), cmd_file)
+            input_val = InputValidate(tmp_dir)
+            data = input_val.val_noncompare_arg("pre_test", change_dir)
+            data.update(input_val.get_run_opts(run_opts or {}))
+            build_inv = nornir_inv.BuildInventory()
+            nr_inv = build_inv.load_inventory(*inv_files, data["workers"])
+            nr_inv = build_inv.inventory_defaults(
+                nr_inv, dict(user="bench", pword="bench")
+            )
+            host_plans = nornir_plan.get_plans(
+                data["input_file"],
+                inv_files,
+                data["input_data"],
+                nr_inv.inventory.hosts,
+            )
+            runs = [bench_run_type(nr_inv, x, data, host_plans) for x in run_types]
+            if "post_test" in run_types:
+                diff_fldr = os.path.join(tmp_dir, "diffs")
+                runs.append(bench_diff(data["output_fldr"], list(hosts), diff_fldr))
+    finally:
+        sim.stop()
+        if cache_dir != None:
+            os.environ["CACHE_DIRECTORY"] = cache_dir
+        else:
+            os.environ.pop("CACHE_DIRECTORY", None)
+    return dict(hosts=num_hosts, sim=opts, run_opts=run_opts or {}, runs=runs)
+
+
+# ----------------------------------------------------------------------------
+# REGRESSION: Results worse than the baseline by more than the regression percentage (fewer hosts/sec or a slower p99)
+# ----------------------------------------------------------------------------
+def find_regressions(
+    report: dict[str, Any], baseline: dict[str, Any], pct: float = regression_pct
+) -> list[str]:
+    regressions = []
+    base_runs = {x["run_type"]: x for x in baseline.get("runs", [])}
+    for each_run in report["runs"]:
+        base = base_runs.get(each_run["run_type"])
+        if base == None:
+            continue
+        if each_run["hosts_sec"] < base["hosts_sec"] * (1 - pct / 100):
+            regressions.append(
+                f"{each_run['run_type']} hosts/sec {each_run['hosts_sec']} is down on the baseline {base['hosts_sec']}"
+            )
+        if each_run["p99_ms"] > base["p99_ms"] * (1 + pct / 100):
+            regressions.append(
+                f"{each_run['run_type']} p99 {each_run['p99_ms']} ms is up on the baseline {base['p99_ms']} ms"
+            )
+    return regressions
+
+
+# ----------------------------------------------------------------------------
+# REPORT: Prints a table of the results of each run type
+# ----------------------------------------------------------------------------
+def print_report(rc: Console, report: dict[str, Any]) -> None:
+    table = Table(title=f"Benchmark of {report['hosts']} simulated hosts")
+    columns = dict(
+        run_type="Run type",
+        hosts="Hosts",
+        failed="Failed",
+        secs="Secs",
+        hosts_sec="Hosts/sec",
+        cmds="Cmds",
+        p50_ms="p50 ms",
+        p99_ms="p99 ms",
+        rss_mb="Peak RSS MB",
+    )
+    for each_col in columns.values():
+        table.add_column(each_col, justify="right")
+    for each_run in report["runs"]:
+        table.add_row(*[str(each_run[x]) for x in columns])
+    rc.print(table)
+
+
+# ----------------------------------------------------------------------------
+# Engine that runs the benchmark
+# ----------------------------------------------------------------------------
+def main():
+    my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+    rc = Console(theme=Theme(my_theme))
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        "--num_hosts",
+        type=int,
+        default=bench_hosts,
+        help="Number of simulated hosts",
+    )
+    parser.add_argument(
+        "-rt",
+        "--run_types",
+        nargs="+",
+        default=bench_run_types,
+        choices=bench_run_types,
+        help="Run types to benchmark (in the order given), post_test also times the diffs",
+    )
+    parser.add_argument("-w", "--workers", type=int, help="Number of nornir workers")
+    parser.add_argument(
+        "-eng",
+        "--engine",
+        choices=["threaded", "async"],
+        default="threaded",
+        help="Engine used to run the commands",
+    )
+    parser.add_argument(
+        "-dw", "--diff_workers", type=int, help="Number of diff worker processes"
+    )
+    parser.add_argument(
+        "-lm",
+        "--low_memory",
+        action="store_true",
+        help="Results of saved commands only keep the files, bytes and hash",
+    )
+    parser.add_argument(
+        "-lat",
+        "--latency",
+        type=float,
+        default=nornir_sim.sim_opts["latency"],
+        help="Secs each simulated command takes to return its output",
+    )
+    parser.add_argument(
+        "-lin",
+        "--lines",
+        type=int,
+        default=nornir_sim.sim_opts["lines"],
+        help="Lines of output of each simulated command",
+    )
+    parser.add_argument(
+        "-af",
+        "--auth_fail",
+        type=float,
+        default=nornir_sim.sim_opts["auth_fail"],
+        help="Chance (0 to 1) a simulated login fails",
+    )
+    parser.add_argument(
+        "-drp",
+        "--drop",
+        type=float,
+        default=nornir_sim.sim_opts["drop"],
+        help="Chance (0 to 1) a simulated session is dropped when a command is run",
+    )
+    parser.add_argument(
+        "-chg",
+        "--change",
+        type=float,
+        default=0.05,
+        help="Chance (0 to 1) each line of output differs between runs, so the post-test has diffs",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="JSON file the results are saved to (to use as a baseline)",
+    )
+    parser.add_argument(
+        "-bl",
+        "--baseline",
+        help="JSON file of earlier results, exits with an error if any result has regressed",
+    )
+    parser.add_argument(
+        "-rp",
+        "--regression_pct",
+        type=float,
+        default=regression_pct,
+        help="Max %% a result can be worse than the baseline",
+    )
+    args = vars(parser.parse_args())
+
+    opts = {k: v for k, v in args.items() if k in nornir_sim.sim_opts}
+    run_opts = {k: args[k] for k in ["workers", "engine", "diff_workers", "low_memory"]}
+    rc.print(
+        f":stopwatch: Benchmarking {', '.join(args['run_types'])} against {args['num_hosts']} simulated hosts"
+    )
+    report = run_bench(args["num_hosts"], args["run_types"], opts, run_opts)
+    print_report(rc, report)
+    if args["output"] != None:
+        with open(args["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        rc.print(f":white_check_mark: Saved the results to [i]{args['output']}[/i]")
+    # BASELINE: A regression against the baseline fails the run so it can be used in CI
+    if args["baseline"] != None:
+        with open(args["baseline"]) as baseline_file:
+            regressions = find_regressions(
+                report, json.load(baseline_file), args["regression_pct"]
+            )
+        for each_regression in regressions:
+            rc.print(f":x: {each_regression}")
+        if len(regressions) != 0:
+            sys.exit(1)
+        rc.print(":white_check_mark: No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
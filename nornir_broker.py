@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import stat
+import time
+import hashlib
+import socket
+import argparse
+import threading
+import socketserver
+from typing import Any, Optional
+
+from rich.console import Console
+from rich.theme import Theme
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the broker daemon
+# ----------------------------------------------------------------------------
+# Per user folder (only accessible by the user) the socket is in, as the requests contain the device credentials
+socket_directory: str = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "nornir_checks"
+)
+broker_socket: str = os.path.join(socket_directory, "nornir_ppcheck.sock")
+idle_timeout: int = 900  # Seconds a session can be unused before it is closed
+keepalive: int = 60  # Seconds between keepalives sent to idle sessions
+
+
+# ----------------------------------------------------------------------------
+# SESSIONS: Holds the open netmiko sessions, keyed by the device address, user, platform and password
+# ----------------------------------------------------------------------------
+class BrokerSessions:
+    def __init__(self, idle_timeout: int, keepalive: int) -> None:
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.sessions: dict[tuple, dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # KEY: Sessions are only shared by requests with the same address, user, platform and password (hashed so it isn't held in the key)
+    # ----------------------------------------------------------------------------
+    def session_key(self, host: dict[str, Any]) -> tuple:
+        password = hashlib.sha256((host.get("password") or "").encode()).hexdigest()
+        return (
+            host["hostname"],
+            host.get("port"),
+            host["username"],
+            host["platform"],
+            password,
+        )
+
+    # ----------------------------------------------------------------------------
+    # GET: Gets the session for a host (creating an empty one if new), a per-session lock stops it being used by 2 requests at once
+    # ----------------------------------------------------------------------------
+    def get_session(self, host: dict[str, Any]) -> dict[str, Any]:
+        with self.lock:
+            key = self.session_key(host)
+            if key not in self.sessions:
+                self.sessions[key] = dict(
+                    conn=None, lock=threading.Lock(), last_used=time.time()
+                )
+            return self.sessions[key]
+
+    # ----------------------------------------------------------------------------
+    # CONNECT: Opens the netmiko session if the host has no session or the existing one has died
+    # ----------------------------------------------------------------------------
+    def connect(self, session: dict[str, Any], host: dict[str, Any]) -> Any:
+        from netmiko import ConnectHandler
+
+        if session["conn"] != None and session["conn"].is_alive():
+            return session["conn"]
+        params = dict(
+            host=host["hostname"],
+            username=host["username"],
+            password=host["password"],
+            device_type=host["platform"],
+        )
+        if host.get("port") != None:
+            params["port"] = host["port"]
+        params.update(host.get("extras", {}))
+        session["conn"] = ConnectHandler(**params)
+        return session["conn"]
+
+    # ----------------------------------------------------------------------------
+    # RUN_CMD: Runs the commands over the hosts warm session, is reconnected once if the session drops (returns the number of reconnects)
+    # ----------------------------------------------------------------------------
+    def run_cmds(self, host: dict[str, Any], cmds: list) -> tuple[dict[str, str], int]:
+        session = self.get_session(host)
+        with session["lock"]:
+            cmd_output, retries = ({}, 0)
+            for each_cmd in cmds:
+                try:
+                    conn = self.connect(session, host)
+                    cmd_output[each_cmd] = conn.send_command(each_cmd)
+                except OSError:
+                    session["conn"] = None
+                    retries += 1
+                    conn = self.connect(session, host)
+                    cmd_output[each_cmd] = conn.send_command(each_cmd)
+            session["last_used"] = time.time()
+        return cmd_output, retries
+
+    # ----------------------------------------------------------------------------
+    # KEEPALIVE: Sends keepalives to idle sessions and closes any sessions that have been idle for longer than the idle timeout
+    # ----------------------------------------------------------------------------
+    def keepalive_sessions(self) -> None:
+        with self.lock:
+            sessions = list(self.sessions.items())
+        for key, session in sessions:
+            # Skip sessions currently running commands
+            if not session["lock"].acquire(blocking=False):
+                continue
+            try:
+                idle = time.time() - session["last_used"]
+                if session["conn"] != None and idle < self.idle_timeout:
+                    if not session["conn"].is_alive():
+                        session["conn"] = None
+                elif session["conn"] != None:
+                    session["conn"].disconnect()
+                    session["conn"] = None
+                # Only removed if it wasn't replaced by a new session since the sessions were listed
+                if session["conn"] == None:
+                    with self.lock:
+                        if self.sessions.get(key) is session:
+                            del self.sessions[key]
+            finally:
+                session["lock"].release()
+
+    # ----------------------------------------------------------------------------
+    # STATUS: Gets the sessions currently held by the broker and how long they have been idle
+    # ----------------------------------------------------------------------------
+    def status(self) -> list:
+        with self.lock:
+            return [
+                dict(
+                    hostname=key[0],
+                    port=key[1],
+                    username=key[2],
+                    platform=key[3],
+                    idle=int(time.time() - session["last_used"]),
+                )
+                for key, session in self.sessions.items()
+            ]
+
+    # ----------------------------------------------------------------------------
+    # CLOSE: Disconnects all sessions when the broker is stopped
+    # ----------------------------------------------------------------------------
+    def close(self) -> None:
+        with self.lock:
+            for session in self.sessions.values():
+                if session["conn"] != None:
+                    session["conn"].disconnect()
+            self.sessions = {}
+
+
+# ----------------------------------------------------------------------------
+# HANDLER: Each request is a single line of JSON, the reply is a single line of JSON
+# ----------------------------------------------------------------------------
+class BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("action") == "status":
+                reply = dict(status=self.server.sessions.status())
+            elif request.get("action") == "stop":
+                reply = dict(status="stopping")
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                cmd_output, retries = self.server.sessions.run_cmds(
+                    request["host"], request["cmds"]
+                )
+                reply = dict(output=cmd_output, retries=retries)
+        except Exception as err:
+            reply = dict(error=f"{type(err).__name__}: {err}")
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# ----------------------------------------------------------------------------
+# CLIENT: Used by the nornir tasks to send requests to the broker
+# ----------------------------------------------------------------------------
+class BrokerClient:
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.retries = 0
+
+    # ----------------------------------------------------------------------------
+    # REQUEST: Sends a request to the broker and returns its reply, errors are raised so fail the nornir task
+    # ----------------------------------------------------------------------------
+    def request(self, request: dict[str, Any]) -> dict[str, Any]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            reply = json.loads(sock.makefile("rb").readline())
+        if reply.get("error") != None:
+            raise ConnectionError(f"Connection broker error, {reply['error']}")
+        return reply
+
+    # ----------------------------------------------------------------------------
+    # RUN_CMD: Gets the connection details from the nornir host and sends the commands to the broker to run
+    # ----------------------------------------------------------------------------
+    def run_cmds(self, task: Any, cmds: list) -> dict[str, str]:
+        params = task.host.get_connection_parameters("netmiko")
+        host = dict(
+            hostname=params.hostname,
+            port=params.port,
+            username=params.username,
+            password=params.password,
+            platform=params.platform,
+            extras=params.extras or {},
+        )
+        reply = self.request(dict(host=host, cmds=cmds))
+        # Number of times the broker reconnected the session to run the commands
+        self.retries = reply.get("retries", 0)
+        return reply["output"]
+
+
+# ----------------------------------------------------------------------------
+# SOCKET_DIR: Creates the default socket folder (only accessible by the user), the folder must be owned by and only writable by the user so the socket can't be replaced by another user
+# ----------------------------------------------------------------------------
+def check_socket_dir(socket_path: str) -> Optional[str]:
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    if socket_dir == socket_directory:
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        os.chmod(socket_dir, 0o700)
+    if not os.path.isdir(socket_dir):
+        return f"Socket folder [i]{socket_dir}[/i] doesn't exist"
+    dir_stat = os.stat(socket_dir)
+    if dir_stat.st_uid != os.getuid() or dir_stat.st_mode & 0o022 != 0:
+        return f"Socket folder [i]{socket_dir}[/i] must be owned by and only writable by you"
+    return None
+
+
+# ----------------------------------------------------------------------------
+# START: Removes a socket left by an earlier broker, the socket is created under a umask so only the user can ever connect to it
+# ----------------------------------------------------------------------------
+def start_server(socket_path: str) -> BrokerServer:
+    if os.path.exists(socket_path):
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            raise FileExistsError(f"{socket_path} exists and is not a socket")
+        os.remove(socket_path)
+    umask = os.umask(0o077)
+    try:
+        server = BrokerServer(socket_path, BrokerHandler)
+    finally:
+        os.umask(umask)
+    return server
+
+
+# ----------------------------------------------------------------------------
+# Engine that runs the broker daemon
+# ----------------------------------------------------------------------------
+def main():
+    my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+    rc = Console(theme=Theme(my_theme))
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-sock",
+        "--socket",
+        default=os.environ.get("BROKER_SOCKET", broker_socket),
+        help="Unix socket the broker listens on",
+    )
+    parser.add_argument(
+        "-idle",
+        "--idle_timeout",
+        type=int,
+        default=idle_timeout,
+        help="Seconds a session can be unused before it is closed",
+    )
+    parser.add_argument(
+        "-ka",
+        "--keepalive",
+        type=int,
+        default=keepalive,
+        help="Seconds between keepalives sent to idle sessions",
+    )
+    parser.add_argument(
+        "-st",
+        "--status",
+        action="store_true",
+        help="Prints the sessions held by a running broker",
+    )
+    parser.add_argument(
+        "-stop", "--stop", action="store_true", help="Stops a running broker"
+    )
+    args = vars(parser.parse_args())
+
+    # STATUS/STOP: Sent to an already running broker
+    if args["status"] == True or args["stop"] == True:
+        action = "status" if args["status"] == True else "stop"
+        rc.print(BrokerClient(args["socket"]).request(dict(action=action))["status"])
+        sys.exit(0)
+
+    # START: Socket is only accessible by the user as the requests contain credentials
+    err = check_socket_dir(args["socket"])
+    if err != None:
+        rc.print(f":x: {err}")
+        sys.exit(1)
+    try:
+        server = start_server(args["socket"])
+    except FileExistsError as err:
+        rc.print(f":x: {err}")
+        sys.exit(1)
+    server.sessions = BrokerSessions(args["idle_timeout"], args["keepalive"])
+
+    def run_keepalive():
+        while True:
+            time.sleep(args["keepalive"])
+            server.sessions.keepalive_sessions()
+
+    threading.Thread(target=run_keepalive, daemon=True).start()
+    rc.print(
+        f":white_check_mark: Connection broker listening on [i]{args['socket']}[/i]"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.sessions.close()
+        server.server_close()
+        os.remove(args["socket"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Optional
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the snapshot catalog
+# ----------------------------------------------------------------------------
+catalog_file: str = "catalog.db"  # SQLite catalog of saved files in the output folder
+db_timeout: float = 30  # Secs to wait for the catalog if locked by another worker
+# Catalogs whose schema has been created by this run, kept by path as a catalog object is created for each host and file
+schema_paths: set[str] = set()
+schema_lock = threading.Lock()
+
+
+# ----------------------------------------------------------------------------
+# HASH: Hash of a command output, is the same as the snapshot store object hash
+# ----------------------------------------------------------------------------
+def output_hash(output: str) -> str:
+    return hashlib.sha256(output.encode()).hexdigest()
+
+
+# ----------------------------------------------------------------------------
+# CATALOG: Index of every saved file (text or snapshot store) by run, host and type so the latest files don't need to be found with glob
+# ----------------------------------------------------------------------------
+class SnapshotCatalog:
+    def __init__(self, output_fldr: str, run_id: Optional[str] = None) -> None:
+        self.path = os.path.join(output_fldr, catalog_file)
+        self.run_id = run_id
+
+    # ----------------------------------------------------------------------------
+    # CONNECT: A connection per call as is used from all the nornir worker threads, the schema is only created by the first connection to each catalog
+    # ----------------------------------------------------------------------------
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=db_timeout)
+        conn.row_factory = sqlite3.Row
+        with schema_lock:
+            if os.path.abspath(self.path) not in schema_paths:
+                self.create_schema(conn)
+                schema_paths.add(os.path.abspath(self.path))
+        return conn
+
+    # ----------------------------------------------------------------------------
+    # SCHEMA: Creates the tables and indexes if the catalog is new, WAL mode is kept by the database file
+    # ----------------------------------------------------------------------------
+    def create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "run_id TEXT, host TEXT, file_type TEXT, file_name TEXT, path TEXT, created REAL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS host_type ON snapshots (host, file_type, id)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS run ON snapshots (run_id)")
+        # Hash of each command output (kind 'output') and fingerprint command output (kind 'fingerprint') of a saved file
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sections (snapshot_id INTEGER, kind TEXT, cmd TEXT, sha256 TEXT)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS snapshot ON sections (snapshot_id, kind)"
+        )
+
+    # ----------------------------------------------------------------------------
+    # ADD: Adds a saved file returning its ID, any older entry for the same path is removed as that file has been overwritten
+    # ----------------------------------------------------------------------------
+    def add(self, host: str, file_type: str, file_name: str, path: str) -> int:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "DELETE FROM sections WHERE snapshot_id IN (SELECT id FROM snapshots WHERE path = ?)",
+                    (path,),
+                )
+                conn.execute("DELETE FROM snapshots WHERE path = ?", (path,))
+                cursor = conn.execute(
+                    "INSERT INTO snapshots (run_id, host, file_type, file_name, path, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.run_id, host, file_type, file_name, path, time.time()),
+                )
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------------
+    # SECTIONS: Adds the hash of each command output (or fingerprint output) of a saved file
+    # ----------------------------------------------------------------------------
+    def add_sections(
+        self, snapshot_id: int, hashes: dict[str, str], kind: str = "output"
+    ) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO sections (snapshot_id, kind, cmd, sha256) VALUES (?, ?, ?, ?)",
+                    [(snapshot_id, kind, cmd, sha) for cmd, sha in hashes.items()],
+                )
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------------
+    # LATEST: Gets the paths of the latest files (newest first) of a host and type, files deleted from disk or of the excluded run are skipped
+    # ----------------------------------------------------------------------------
+    def latest_files(
+        self,
+        conn: sqlite3.Connection,
+        host: str,
+        file_type: str,
+        num: int,
+        exclude_run: Optional[str] = None,
+    ) -> list:
+        files = []
+        rows = conn.execute(
+            "SELECT path FROM snapshots WHERE host = ? AND file_type = ? "
+            "AND (? IS NULL OR run_id IS NOT ?) ORDER BY id DESC",
+            (host, file_type, exclude_run, exclude_run),
+        )
+        for row in rows:
+            if len(files) == num:
+                break
+            if os.path.exists(row["path"]):
+                files.append(row["path"])
+        return files
+
+    # ----------------------------------------------------------------------------
+    # RUN_FILE: Gets the path of the file a run saved for a host and type, None if the run has no file
+    # ----------------------------------------------------------------------------
+    def run_file(
+        self, conn: sqlite3.Connection, run_id: str, host: str, file_type: str
+    ) -> Optional[str]:
+        row = conn.execute(
+            "SELECT path FROM snapshots WHERE run_id = ? AND host = ? AND file_type = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (run_id, host, file_type),
+        ).fetchone()
+        if row != None and os.path.exists(row["path"]):
+            return row["path"]
+        return None
+
+    # ----------------------------------------------------------------------------
+    # CMP_FILES: Gets the paths of the 2 files to compare (newest first), the latest 2 or those of the run IDs (a single run ID is compared to the latest)
+    # ----------------------------------------------------------------------------
+    def cmp_files(
+        self, host: str, file_type: str, run_ids: Optional[list] = None
+    ) -> list:
+        if not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            if not run_ids:
+                return self.latest_files(conn, host, file_type, 2)
+            files = [self.run_file(conn, x, host, file_type) for x in run_ids]
+            if len(run_ids) == 1:
+                files.extend(self.latest_files(conn, host, file_type, 1))
+            # Newest first by when added to the catalog, whatever order the run IDs are given in
+            files = [x for x in files if x != None]
+            ids = {
+                x: conn.execute(
+                    "SELECT MAX(id) FROM snapshots WHERE path = ?", (x,)
+                ).fetchone()[0]
+                for x in files
+            }
+            return sorted(files, key=ids.get, reverse=True)
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------------
+    # HISTORY: Gets the latest files (newest first) of a host and type with the output and fingerprint hashes of each, the files of the excluded run aren't history
+    # ----------------------------------------------------------------------------
+    def history(
+        self, host: str, file_type: str, num: int, exclude_run: Optional[str] = None
+    ) -> list[dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            return [
+                self.file_hashes(conn, x)
+                for x in self.latest_files(conn, host, file_type, num, exclude_run)
+            ]
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------------
+    # BASELINE: Gets the file of a run (or the latest file if no run ID) of a host and type with its output and fingerprint hashes, None if there is no file
+    # ----------------------------------------------------------------------------
+    def baseline(
+        self, host: str, file_type: str, run_id: Optional[str] = None
+    ) -> Optional[dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        conn = self.connect()
+        try:
+            if run_id != None:
+                path = self.run_file(conn, run_id, host, file_type)
+            else:
+                path = (self.latest_files(conn, host, file_type, 1) or [None])[0]
+            return self.file_hashes(conn, path) if path != None else None
+        finally:
+            conn.close()
+
+    # ----------------------------------------------------------------------------
+    # HASHES: Gets the output and fingerprint hashes of each command in a saved file
+    # ----------------------------------------------------------------------------
+    def file_hashes(self, conn: sqlite3.Connection, path: str) -> dict[str, Any]:
+        each_file: dict[str, Any] = dict(path=path, output={}, fingerprint={})
+        rows = conn.execute(
+            "SELECT kind, cmd, sha256 FROM sections WHERE snapshot_id = "
+            "(SELECT MAX(id) FROM snapshots WHERE path = ?)",
+            (path,),
+        )
+        for row in rows:
+            each_file[row["kind"]][row["cmd"]] = row["sha256"]
+        return each_file
+
+    # ----------------------------------------------------------------------------
+    # RUNS: Gets each run with when it was saved and the number of hosts and files
+    # ----------------------------------------------------------------------------
+    def runs(self) -> list[dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT run_id, MIN(created) AS created, COUNT(DISTINCT host) AS hosts, "
+                "COUNT(*) AS files, GROUP_CONCAT(DISTINCT file_type) AS file_types "
+                "FROM snapshots GROUP BY run_id ORDER BY MIN(id)"
+            )
+            return [dict(x) for x in rows]
+        finally:
+            conn.close()
@@ -0,0 +1,543 @@
+import os
+import re
+import html
+import hashlib
+import difflib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the diff engine
+# ----------------------------------------------------------------------------
+# Header written above each command output
+header_pattern = re.compile(r"^==== (.+?) =*$")
+pool_min_lines: int = 2000  # Min lines of a changed section to use the process pool
+# Max edit distance the Myers diff searches for (is O(ND) in pure python), a block of lines with more changes is shown as all replaced
+myers_max_cost: int = 1000
+# Process pool shared by all hosts, is only set when started by start_pool
+diff_pool: Optional[ProcessPoolExecutor] = None
+diff_styles: str = """
+        table.diff {font-family:Courier; border:medium;}
+        .diff_header {background-color:#e0e0e0}
+        td.diff_header {text-align:right}
+        td.diff_text {white-space:pre}
+        .diff_add {background-color:#aaffaa}
+        .diff_chg {background-color:#ffff77}
+        .diff_sub {background-color:#ffaaaa}
+"""
+context_lines: int = 3  # Lines shown either side of a change in compact reports
+# Compact reports link to a CSS and JS file shared by all reports in the output folder
+css_asset: str = "diff_report.css"
+js_asset: str = "diff_report.js"
+compact_styles: str = diff_styles.replace("        ", "").lstrip() + (
+    """table.diff tbody {font-size:12px}
+tr.diff_title td {background-color:#c0c0c0; font-weight:bold; cursor:pointer}
+tr.diff_fold td {background-color:#f0f0f0; color:#808080; text-align:center}
+tbody.diff_collapsed tr:not(.diff_title) {display:none}
+"""
+)
+compact_script: str = """document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("tr.diff_title").forEach(function (title) {
+    title.addEventListener("click", function () {
+      title.parentElement.classList.toggle("diff_collapsed");
+    });
+  });
+});
+"""
+
+
+# ----------------------------------------------------------------------------
+# POOL: Starts the process pool, the diffs are CPU bound so in threads would all wait on the GIL
+# ----------------------------------------------------------------------------
+def start_pool(workers: Optional[int] = None) -> None:
+    global diff_pool
+    if diff_pool == None:
+        # Forkserver as forking a process with running nornir threads is unsafe, only this module is loaded in the workers
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([__name__])
+        else:
+            ctx = multiprocessing.get_context("spawn")
+        diff_pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+
+
+def close_pool() -> None:
+    global diff_pool
+    if diff_pool != None:
+        diff_pool.shutdown()
+        diff_pool = None
+
+
+# ----------------------------------------------------------------------------
+# SPLIT: Splits a saved file into a section per command output (anything before the first header is its own section)
+# ----------------------------------------------------------------------------
+def split_sections(lines: list) -> list[dict[str, Any]]:
+    sections: list[dict[str, Any]] = []
+    for num, line in enumerate(lines):
+        header = header_pattern.match(line.rstrip("\n"))
+        if header != None or len(sections) == 0:
+            cmd = header.group(1) if header != None else ""
+            sections.append(dict(cmd=cmd, start=num, lines=[]))
+        sections[-1]["lines"].append(line)
+    for each_section in sections:
+        content = "".join(each_section["lines"]).encode()
+        each_section["sha256"] = hashlib.sha256(content).hexdigest()
+    return sections
+
+
+# ----------------------------------------------------------------------------
+# PAIR: Matches the pre and post sections by command (and occurrence if a command is run twice)
+# ----------------------------------------------------------------------------
+def pair_sections(pre: list, post: list) -> list[tuple]:
+    def section_keys(sections: list) -> list[tuple]:
+        keys, seen = ([], {})
+        for each_section in sections:
+            seen[each_section["cmd"]] = seen.get(each_section["cmd"], 0) + 1
+            keys.append((each_section["cmd"], seen[each_section["cmd"]]))
+        return keys
+
+    post_sections = dict(zip(section_keys(post), post))
+    pairs = []
+    for key, each_section in zip(section_keys(pre), pre):
+        pairs.append((each_section, post_sections.pop(key, None)))
+    # Commands only in the post file are added after all the pre file commands
+    for each_section in post_sections.values():
+        pairs.append((None, each_section))
+    return pairs
+
+
+# ----------------------------------------------------------------------------
+# COST: Raised when a section has more changes than the Myers diff searches for
+# ----------------------------------------------------------------------------
+class DiffCostError(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------------
+# SNAKE: Finds the middle snake of the Myers diff, searching from both ends at once so only uses linear memory
+# ----------------------------------------------------------------------------
+def middle_snake(
+    a: list, b: list, a_lo: int, a_hi: int, b_lo: int, b_hi: int
+) -> Optional[tuple[int, int]]:
+    n, m = (a_hi - a_lo, b_hi - b_lo)
+    max_d = (n + m + 1) // 2
+    offset, delta = (max_d, n - m)
+    v1, v2 = ([-1] * (2 * max_d + 2), [-1] * (2 * max_d + 2))
+    v1[offset + 1], v2[offset + 1] = (0, 0)
+    # Only one direction can meet the other, depends on if the difference in lengths is odd or even
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d):
+        # Both paths have gone d edits, so the edit distance is at least 2d
+        if 2 * d > myers_max_cost:
+            raise DiffCostError(f"More than {myers_max_cost} edits")
+        # Forward path
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < len(v2) and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return (a_lo + x1, b_lo + y1)
+        # Reverse path
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - x2 - 1] == b[b_hi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < len(v1) and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    if x1 >= n - x2:
+                        return (a_lo + x1, b_lo + offset + x1 - k1_offset)
+    return None
+
+
+# ----------------------------------------------------------------------------
+# MATCHES: Myers diff (linear space), gets the line numbers (pre, post) of all lines that are the same in both
+# ----------------------------------------------------------------------------
+def myers_matches(a: list, b: list) -> list[tuple[int, int]]:
+    matches = []
+    # Uses a stack rather than recursion so large sections do not hit the recursion limit
+    stack = [(0, len(a), 0, len(b))]
+    while len(stack) != 0:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        # Strip the common start and end lines, these are never part of the diff
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo, b_lo = (a_lo + 1, b_lo + 1)
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi, b_hi = (a_hi - 1, b_hi - 1)
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+        try:
+            split = middle_snake(a, b, a_lo, a_hi, b_lo, b_hi)
+        except DiffCostError:
+            split = None
+        # No common lines, no progress or too many changes, whole block is a replace
+        if split == None or split in [(a_lo, b_lo), (a_hi, b_hi)]:
+            continue
+        stack.append((split[0], a_hi, split[1], b_hi))
+        stack.append((a_lo, split[0], b_lo, split[1]))
+    return sorted(matches)
+
+
+# ----------------------------------------------------------------------------
+# OPCODES: Converts the matched lines to opcodes in the same format as difflib (tag, i1, i2, j1, j2)
+# ----------------------------------------------------------------------------
+def diff_opcodes(a: list, b: list) -> list[tuple]:
+    opcodes: list[tuple] = []
+    i = j = 0
+    for x, y in myers_matches(a, b) + [(len(a), len(b))]:
+        if x > i or y > j:
+            if x > i and y > j:
+                tag = "replace"
+            else:
+                tag = "delete" if x > i else "insert"
+            opcodes.append((tag, i, x, j, y))
+        if (x, y) != (len(a), len(b)):
+            if len(opcodes) != 0 and opcodes[-1][0] == "equal":
+                opcodes[-1] = ("equal", opcodes[-1][1], x + 1, opcodes[-1][3], y + 1)
+            else:
+                opcodes.append(("equal", x, x + 1, y, y + 1))
+        i, j = (x + 1, y + 1)
+    return opcodes
+
+
+# ----------------------------------------------------------------------------
+# SECTION: Diffs a pair of sections, identical (same hash) sections are not diffed
+# ----------------------------------------------------------------------------
+def diff_section(
+    pre: Optional[dict],
+    post: Optional[dict],
+    opcodes: Optional[list] = None,
+    parsed: Optional[dict] = None,
+) -> dict[str, Any]:
+    pre_lines = pre["lines"] if pre != None else []
+    post_lines = post["lines"] if post != None else []
+    if pre != None and post != None and pre["sha256"] == post["sha256"]:
+        status = "identical"
+        opcodes = [("equal", 0, len(pre_lines), 0, len(post_lines))]
+    # PARSED: Compared by the parsed records rather than the lines
+    elif parsed != None:
+        changes = parsed["removed"] + parsed["added"] + parsed["changed"]
+        status = "changed" if len(changes) != 0 else "identical"
+        opcodes = []
+    else:
+        status = "changed" if pre != None and post != None else "added"
+        status = "removed" if post == None else status
+        if opcodes == None:
+            opcodes = diff_opcodes(pre_lines, post_lines)
+    return dict(
+        cmd=(pre or post)["cmd"],
+        status=status,
+        pre_start=pre["start"] if pre != None else None,
+        post_start=post["start"] if post != None else None,
+        pre_lines=pre_lines,
+        post_lines=post_lines,
+        opcodes=opcodes,
+        parsed=parsed,
+    )
+
+
+# ----------------------------------------------------------------------------
+# DIFF: Diffs the lines of 2 saved files section by section, large changed sections are sent to the process pool (if started)
+# ----------------------------------------------------------------------------
+def diff_files(pre: list, post: list, parser: Any = None) -> list[dict[str, Any]]:
+    pairs = pair_sections(split_sections(pre), split_sections(post))
+    futures, parsed = ({}, {})
+    for num, (pre_sect, post_sect) in enumerate(pairs):
+        if pre_sect == None or post_sect == None:
+            continue
+        if pre_sect["sha256"] == post_sect["sha256"]:
+            continue
+        # STRUCTURED: Sections that can be parsed (parser is a nornir_parse.SectionParser) are compared by record
+        if parser != None:
+            parsed[num] = parser.compare(
+                pre_sect["cmd"], pre_sect["lines"], post_sect["lines"]
+            )
+            if parsed[num] != None:
+                continue
+        num_lines = len(pre_sect["lines"]) + len(post_sect["lines"])
+        if diff_pool != None and num_lines >= pool_min_lines:
+            futures[num] = diff_pool.submit(
+                diff_opcodes, pre_sect["lines"], post_sect["lines"]
+            )
+    # Smaller sections are diffed in this thread whilst waiting on the pool
+    diffs = []
+    for num, (pre_sect, post_sect) in enumerate(pairs):
+        opcodes = futures[num].result() if num in futures else None
+        diffs.append(diff_section(pre_sect, post_sect, opcodes, parsed.get(num)))
+    return diffs
+
+
+# ----------------------------------------------------------------------------
+# MARK: Highlights the characters that changed between 2 lines
+# ----------------------------------------------------------------------------
+def mark_line(pre: str, post: str) -> tuple[str, str]:
+    pre_html, post_html = ("", "")
+    matcher = difflib.SequenceMatcher(None, pre, post, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pre_html += html.escape(pre[i1:i2])
+            post_html += html.escape(post[j1:j2])
+        else:
+            if i2 > i1:
+                pre_html += f'<span class="diff_chg">{html.escape(pre[i1:i2])}</span>'
+            if j2 > j1:
+                post_html += f'<span class="diff_chg">{html.escape(post[j1:j2])}</span>'
+    return (pre_html, post_html)
+
+
+# ----------------------------------------------------------------------------
+# ROW: A html table row of the line number and text for pre and post
+# ----------------------------------------------------------------------------
+def table_row(pre_num: Any, pre_text: str, post_num: Any, post_text: str) -> str:
+    return (
+        f'<tr><td class="diff_header">{pre_num}</td><td class="diff_text">{pre_text}</td>'
+        f'<td class="diff_header">{post_num}</td><td class="diff_text">{post_text}</td></tr>'
+    )
+
+
+# ----------------------------------------------------------------------------
+# PARSED_ROWS: Creates the html table rows of a parsed section, a row per removed, added or changed record
+# ----------------------------------------------------------------------------
+def parsed_rows(diff: dict[str, Any]) -> list[str]:
+    parsed = diff["parsed"]
+
+    def rec_text(record: dict[str, Any], fields: list) -> str:
+        return html.escape(" ".join(f"{x}={record.get(x)}" for x in fields))
+
+    header = html.escape(diff["pre_lines"][0].rstrip("\n"))
+    rows = [table_row(diff["pre_start"] + 1, header, diff["post_start"] + 1, header)]
+    for each_rec in parsed["removed"]:
+        text = rec_text(each_rec, [x for x in each_rec if x not in parsed["ignore"]])
+        rows.append(table_row("", f'<span class="diff_sub">{text}</span>', "", ""))
+    for each_rec in parsed["added"]:
+        text = rec_text(each_rec, [x for x in each_rec if x not in parsed["ignore"]])
+        rows.append(table_row("", "", "", f'<span class="diff_add">{text}</span>'))
+    # Changed records show the key and only the fields that changed
+    for rec_key, fld_changes in parsed["changed"]:
+        key_text = rec_text(rec_key, list(rec_key))
+        pre_chg = {x: y[0] for x, y in fld_changes.items()}
+        post_chg = {x: y[1] for x, y in fld_changes.items()}
+        pre_text = f'{key_text} <span class="diff_chg">{rec_text(pre_chg, list(pre_chg))}</span>'
+        post_text = f'{key_text} <span class="diff_chg">{rec_text(post_chg, list(post_chg))}</span>'
+        rows.append(table_row("", pre_text, "", post_text))
+    if len(rows) == 1:
+        text = f"{parsed['records'][0]} records parsed, no changes"
+        if len(parsed["ignore"]) != 0:
+            text += f" (ignoring {', '.join(parsed['ignore'])})"
+        rows.append(table_row("", html.escape(text), "", html.escape(text)))
+    return rows
+
+
+# ----------------------------------------------------------------------------
+# ROWS: Creates the html table rows (line number and text for pre and post) of a sections opcodes
+# ----------------------------------------------------------------------------
+def section_rows(diff: dict[str, Any], context: Optional[int] = None) -> list[str]:
+    if diff.get("parsed") != None:
+        return parsed_rows(diff)
+
+    def equal_rows(lines: list) -> list[str]:
+        rows = []
+        for i, j in lines:
+            text = html.escape(pre[i].rstrip("\n"))
+            rows.append(table_row(pre_start + i, text, post_start + j, text))
+        return rows
+
+    pre, post = (diff["pre_lines"], diff["post_lines"])
+    # Line numbers are of the whole file, not the section
+    pre_start = (diff["pre_start"] or 0) + 1
+    post_start = (diff["post_start"] or 0) + 1
+    rows = []
+    for num, (tag, i1, i2, j1, j2) in enumerate(diff["opcodes"]):
+        if tag == "equal":
+            lines = list(zip(range(i1, i2), range(j1, j2)))
+            # COMPACT: Only context lines either side of a change are shown, the rest are replaced by a fold row
+            if context != None:
+                head = lines[:context] if num != 0 else []
+                tail = lines[len(lines) - context :] if context != 0 else []
+                tail = tail if num != len(diff["opcodes"]) - 1 else []
+                if len(head) + len(tail) < len(lines):
+                    hidden = len(lines) - len(head) - len(tail)
+                    fold = f'<tr class="diff_fold"><td colspan="4">{hidden} unchanged lines</td></tr>'
+                    rows.extend(equal_rows(head) + [fold] + equal_rows(tail))
+                    continue
+            rows.extend(equal_rows(lines))
+            continue
+        # Changed lines are paired up side by side, any extra lines are a delete or an add
+        for pos in range(max(i2 - i1, j2 - j1)):
+            i, j = (i1 + pos, j1 + pos)
+            if i < i2 and j < j2:
+                pre_text, post_text = mark_line(
+                    pre[i].rstrip("\n"), post[j].rstrip("\n")
+                )
+                rows.append(
+                    table_row(pre_start + i, pre_text, post_start + j, post_text)
+                )
+            elif i < i2:
+                text = html.escape(pre[i].rstrip("\n"))
+                rows.append(
+                    table_row(
+                        pre_start + i, f'<span class="diff_sub">{text}</span>', "", ""
+                    )
+                )
+            else:
+                text = html.escape(post[j].rstrip("\n"))
+                rows.append(
+                    table_row(
+                        "", "", post_start + j, f'<span class="diff_add">{text}</span>'
+                    )
+                )
+    return rows
+
+
+# ----------------------------------------------------------------------------
+# ASSETS: Writes the CSS and JS shared by all compact diff pages to the output folder (only if missing or changed)
+# ----------------------------------------------------------------------------
+def write_assets(output_fldr: str) -> None:
+    for file_name, content in [(css_asset, compact_styles), (js_asset, compact_script)]:
+        path = os.path.join(output_fldr, file_name)
+        if os.path.exists(path) and open(path).read() == content:
+            continue
+        # Renamed into place as the nornir workers may write it at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=output_fldr)
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+
+# ----------------------------------------------------------------------------
+# HTML: Creates the html page of the side by side diff with a summary of the command sections that changed
+# ----------------------------------------------------------------------------
+def make_html(
+    diffs: list[dict[str, Any]],
+    pre_name: str,
+    post_name: str,
+    context: Optional[int] = None,
+) -> str:
+    changed = [x for x in diffs if x["status"] != "identical"]
+    summary = f"{len(changed)} of {len(diffs)} command sections changed"
+    if len(changed) != 0:
+        links = [
+            f'<a href="#section{diffs.index(x)}">{html.escape(x["cmd"])}</a> ({x["status"]})'
+            for x in changed
+        ]
+        summary += ": " + ", ".join(links)
+    names = (html.escape(pre_name), html.escape(post_name))
+    head = (
+        "<!DOCTYPE html>\n<html>\n<head>\n"
+        '    <meta charset="utf-8" />\n'
+        f"    <title>{names[0]} vs {names[1]}</title>\n"
+    )
+    table = (
+        f"    <p>{summary}</p>\n"
+        '    <table class="diff" cellspacing="0" cellpadding="0" rules="groups">\n'
+        f'        <thead><tr><th colspan="2" class="diff_header">{names[0]}</th>'
+        f'<th colspan="2" class="diff_header">{names[1]}</th></tr></thead>\n'
+    )
+    # COMPACT: A tbody per section with a title row that collapses it, identical sections start collapsed
+    if context != None:
+        body = []
+        for num, each_diff in enumerate(diffs):
+            collapsed = " diff_collapsed" if each_diff["status"] == "identical" else ""
+            num_lines = max(len(each_diff["pre_lines"]), len(each_diff["post_lines"]))
+            status = each_diff["status"]
+            if each_diff.get("parsed") != None:
+                status += ", parsed"
+            title = f'{html.escape(each_diff["cmd"])} ({status}, {num_lines} lines)'
+            body.append(
+                f'        <tbody class="diff_section{collapsed}" id="section{num}">\n'
+                f'            <tr class="diff_title"><td colspan="4">{title}</td></tr>\n'
+            )
+            body.extend(f"            {x}\n" for x in section_rows(each_diff, context))
+            body.append("        </tbody>\n")
+        return (
+            head
+            + f'    <link rel="stylesheet" type="text/css" href="{css_asset}" />\n'
+            + f'    <script src="{js_asset}" defer></script>\n'
+            + "</head>\n<body>\n"
+            + table
+            + "".join(body)
+            + "    </table>\n</body>\n</html>\n"
+        )
+    # FULL: Every line of both files in the one table
+    body = []
+    for num, each_diff in enumerate(diffs):
+        rows = section_rows(each_diff)
+        if len(rows) != 0:
+            rows[0] = rows[0].replace("<tr>", f'<tr id="section{num}">', 1)
+        body.extend(rows)
+    return (
+        head
+        + f'    <style type="text/css">{diff_styles}    </style>\n'
+        + "</head>\n<body>\n"
+        + table
+        + '        <tbody style="font-size:12px">\n'
+        + "".join(f"            {x}\n" for x in body)
+        + "        </tbody>\n    </table>\n</body>\n</html>\n"
+    )
+
+
+# ----------------------------------------------------------------------------
+# DIFF_FILE: Creates the HTML diff file of 2 saved files in the output folder (named from the pre files host and type), the commands that changed are added to changes
+# ----------------------------------------------------------------------------
+def create_diff_file(
+    cmp_file1: str,
+    cmp_file2: str,
+    output_fldr: str,
+    parser: Any = None,
+    context: Optional[int] = None,
+    changes: Optional[list] = None,
+) -> str:
+    pre_file_name = os.path.basename(cmp_file1)
+    post_file_name = os.path.basename(cmp_file2)
+    output_file = os.path.join(
+        output_fldr,
+        pre_file_name.split("_")[0]
+        + "_diff_"
+        + pre_file_name.split("_")[1].replace(".txt", "")
+        + ".html",
+    )
+    pre = open(cmp_file1).readlines()
+    post = open(cmp_file2).readlines()
+    # Create diff html page, only the command sections that changed are diffed
+    diffs = diff_files(pre, post, parser)
+    if changes != None:
+        changes.extend(x["cmd"] for x in diffs if x["status"] != "identical")
+    if context != None:
+        write_assets(output_fldr)
+    diff_html = make_html(diffs, pre_file_name, post_file_name, context)
+    with open(output_file, "w") as f:
+        f.write(diff_html)
+    return f"✅ Created compare HTML file '{output_file}'"
@@ -0,0 +1,128 @@
+import os
+import json
+from typing import Any, Optional
+
+import nornir_diff
+import nornir_store
+import nornir_catalog
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the incremental post-test
+# ----------------------------------------------------------------------------
+stable_runs: int = 3  # Latest vital files a command must be unchanged in to be stable
+# Quick commands (by netmiko platform) whose output changes if anything the vital commands show may have moved, replaced by 'fingerprint' in input_cmd.yml
+fingerprint_cmds: dict[str, list] = {
+    "cisco_ios": [
+        "show running-config | include ^! Last configuration change",
+        "show ip route summary",
+    ],
+    "cisco_xe": [
+        "show running-config | include ^! Last configuration change",
+        "show ip route summary",
+    ],
+    "cisco_nxos": ["show running-config | include ^!Time", "show ip route summary"],
+    "cisco_asa": ["show checksum", "show route summary"],
+}
+# Netmiko platforms that are the same device as a platform in fingerprint_cmds (a platform ending in _ssh is the same as without it)
+platform_alias: dict[str, str] = dict(cisco_iosxe="cisco_xe")
+
+
+# ----------------------------------------------------------------------------
+# PLATFORM: Normalises the netmiko platform to its name in the fingerprint commands, such as cisco_nxos_ssh to cisco_nxos
+# ----------------------------------------------------------------------------
+def normalise_platform(platform: Optional[str]) -> str:
+    platform = platform or ""
+    if platform.endswith("_ssh"):
+        platform = platform[: -len("_ssh")]
+    return platform_alias.get(platform, platform)
+
+
+# ----------------------------------------------------------------------------
+# READ: Gets the command outputs of a saved text file or snapshot store file (manifest)
+# ----------------------------------------------------------------------------
+def read_outputs(path: str) -> dict[str, str]:
+    outputs = {}
+    if path.endswith(".json"):
+        store = nornir_store.SnapshotStore(os.path.dirname(os.path.dirname(path)))
+        with open(path) as manifest_file:
+            for each_section in json.load(manifest_file)["sections"]:
+                outputs[each_section["cmd"]] = store.get_blob(each_section["sha256"])
+    else:
+        with open(path) as saved_file:
+            sections = nornir_diff.split_sections(saved_file.readlines())
+        # Removes the header and the 3 new lines added after each output when saved
+        for each_section in sections:
+            output = "".join(each_section["lines"][1:])
+            outputs[each_section["cmd"]] = (
+                output[:-3] if output.endswith("\n\n\n") else output
+            )
+    return outputs
+
+
+# ----------------------------------------------------------------------------
+# INCREMENTAL: Decides which vital commands don't need to be run again as their output in the latest vital file is still valid
+# ----------------------------------------------------------------------------
+class IncrementalCmds:
+    def __init__(
+        self,
+        catalog: nornir_catalog.SnapshotCatalog,
+        host: str,
+        platform: Optional[str],
+        inc_cfg: Optional[dict[str, Any]] = None,
+    ) -> None:
+        self.inc_cfg = inc_cfg or {}
+        self.platform = platform
+        # The files of this run (a resumed run has already saved its vital file) are what is being compared, not history
+        self.history = catalog.history(host, "vital", stable_runs, catalog.run_id)
+
+    # ----------------------------------------------------------------------------
+    # FINGERPRINT: Fingerprint commands from the input file, else the default for the platform (none means all commands are run)
+    # ----------------------------------------------------------------------------
+    def fingerprint_cmds(self) -> list:
+        if self.inc_cfg.get("fingerprint") != None:
+            return self.inc_cfg["fingerprint"]
+        return fingerprint_cmds.get(normalise_platform(self.platform), [])
+
+    # ----------------------------------------------------------------------------
+    # UNCHANGED: Whether the fingerprint is the same as that of the latest vital file, is False if that file has no fingerprint
+    # ----------------------------------------------------------------------------
+    def unchanged(self, fp_hashes: dict[str, str]) -> bool:
+        if len(self.history) == 0 or len(fp_hashes) == 0:
+            return False
+        return self.history[0]["fingerprint"] == fp_hashes
+
+    # ----------------------------------------------------------------------------
+    # STABLE: Commands set as static in the input file or whose output was the same in each of the latest vital files
+    # ----------------------------------------------------------------------------
+    def stable_cmds(self, cmds: list) -> list:
+        if len(self.history) == 0:
+            return []
+        latest = self.history[0]["output"]
+        stable = []
+        for each_cmd in cmds:
+            if latest.get(each_cmd) == None:
+                continue
+            if each_cmd in self.inc_cfg.get("static", []):
+                stable.append(each_cmd)
+            elif len(self.history) >= stable_runs and all(
+                x["output"].get(each_cmd) == latest[each_cmd] for x in self.history
+            ):
+                stable.append(each_cmd)
+        return stable
+
+    # ----------------------------------------------------------------------------
+    # REUSE: Gets the saved outputs of the commands from the latest vital file, only those that still match the catalog hash are used
+    # ----------------------------------------------------------------------------
+    def reuse_outputs(self, cmds: list) -> dict[str, str]:
+        if len(cmds) == 0:
+            return {}
+        latest = self.history[0]
+        outputs = read_outputs(latest["path"])
+        reused = {}
+        for each_cmd in cmds:
+            output = outputs.get(each_cmd)
+            if output != None:
+                if nornir_catalog.output_hash(output) == latest["output"][each_cmd]:
+                    reused[each_cmd] = output
+        return reused
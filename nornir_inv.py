@@ -1,16 +1,234 @@
-from typing import Any
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Optional
 import argparse
+import hashlib
+import os
+import pickle
 import sys
+import tempfile
 
 
 from rich.console import Console
 from rich.theme import Theme
 
 
-from nornir import InitNornir
-from nornir.core import Nornir
-from nornir.core.filter import F
-from nornir_rich.functions import print_inventory
+# Nornir is slow to import so is only imported when the inventory is loaded
+if TYPE_CHECKING:
+    from nornir.core import Nornir
+    from nornir.core.inventory import Inventory
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the inventory cache
+# ----------------------------------------------------------------------------
+# Cache of compiled inventories (per user as can hold credentials), changed with env var CACHE_DIRECTORY
+cache_directory: str = os.path.join(os.path.expanduser("~"), ".cache", "nornir_checks")
+inv_folder: str = "inventory"  # Folder in the cache directory of the inventories
+cache_version: int = 1  # Changed if what is cached changes so older caches are not used
+# Runtime filter flags of host attributes (inherited from the hosts groups) matched by value
+filter_attrs: dict[str, str] = dict(
+    location="Infra_Location", logical="Infra_Logical_Location", type="type"
+)
+index_attrs: list = list(filter_attrs.values()) + ["IOSVersion"]
+
+
+# ----------------------------------------------------------------------------
+# CACHED_INV: Nornir inventory plugin that loads the inventory built by SimpleInventory from a pickled snapshot rather than parsing the YAML files
+# ----------------------------------------------------------------------------
+class CachedInventory:
+    def __init__(
+        self,
+        host_file: str = "hosts.yaml",
+        group_file: str = "groups.yaml",
+        defaults_file: str = "defaults.yaml",
+        encoding: str = "utf-8",
+    ) -> None:
+        from nornir.plugins.inventory.simple import SimpleInventory
+
+        self.simple_inv = SimpleInventory(
+            host_file, group_file, defaults_file, encoding
+        )
+        self.src_files = [
+            os.path.abspath(x) for x in [host_file, group_file, defaults_file]
+        ]
+        # A cache file per set of inventory files so different inventories don't replace each others cache
+        cache_dir = os.environ.get("CACHE_DIRECTORY", cache_directory)
+        key = hashlib.sha256("\0".join(self.src_files).encode()).hexdigest()
+        self.path = os.path.join(cache_dir, inv_folder, key + ".pickle")
+
+    # ----------------------------------------------------------------------------
+    # STATS: Modified time and size of each inventory file, if unchanged the cache is used without reading the files
+    # ----------------------------------------------------------------------------
+    def file_stats(self) -> list:
+        stats = []
+        for each_file in self.src_files:
+            if os.path.exists(each_file):
+                file_stat = os.stat(each_file)
+                stats.append((file_stat.st_mtime_ns, file_stat.st_size))
+            else:
+                stats.append(None)
+        return stats
+
+    # ----------------------------------------------------------------------------
+    # HASH: Hash of the content of the inventory files, the cache is still used if only the modified time changed
+    # ----------------------------------------------------------------------------
+    def file_hash(self) -> str:
+        sha = hashlib.sha256()
+        for each_file in self.src_files:
+            if os.path.exists(each_file):
+                with open(each_file, "rb") as content:
+                    sha.update(content.read())
+            sha.update(b"\0")
+        return sha.hexdigest()
+
+    # ----------------------------------------------------------------------------
+    # READ: Gets the cached inventory snapshot, None if there is no cache or it can't be read
+    # ----------------------------------------------------------------------------
+    def read_cache(self) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.path, "rb") as cache_file:
+                cached = pickle.load(cache_file)
+        except Exception:
+            return None
+        # Objects pickled by a different version of nornir may not load correctly
+        from nornir import __version__ as nornir_version
+
+        version = (cache_version, nornir_version)
+        if not isinstance(cached, dict) or cached.get("version") != version:
+            return None
+        return cached
+
+    # ----------------------------------------------------------------------------
+    # WRITE: Saves the inventory snapshot (temp file renamed so is never read partially written), only readable by the user
+    # ----------------------------------------------------------------------------
+    def write_cache(self, stats: list, sha: str, inventory: Inventory) -> None:
+        from nornir import __version__ as nornir_version
+
+        version = (cache_version, nornir_version)
+        cached = dict(version=version, stats=stats, sha=sha, inventory=inventory)
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, "wb") as tmp_file:
+                pickle.dump(cached, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        # The cache is only a speed up so the inventory is still loaded if it can't be saved
+        except OSError:
+            pass
+
+    # ----------------------------------------------------------------------------
+    # LOAD: Uses the cache if the files are unchanged (by modified time then by hash), else loads with SimpleInventory and caches it
+    # ----------------------------------------------------------------------------
+    def load(self) -> Inventory:
+        stats = self.file_stats()
+        cached = self.read_cache()
+        if cached != None and cached["stats"] == stats:
+            return cached["inventory"]
+        sha = self.file_hash()
+        if cached != None and cached["sha"] == sha:
+            self.write_cache(stats, sha, cached["inventory"])
+            return cached["inventory"]
+        inventory = self.simple_inv.load()
+        self.write_cache(stats, sha, inventory)
+        return inventory
+
+    # ----------------------------------------------------------------------------
+    # LOAD_INDEX: Gets the filter index saved with the cache if the files are unchanged, else builds it from the loaded inventory and saves it
+    # ----------------------------------------------------------------------------
+    def load_index(self, nr: Nornir) -> "InventoryIndex":
+        stats = self.file_stats()
+        index_path = self.path.replace(".pickle", ".index.pickle")
+        try:
+            with open(index_path, "rb") as index_file:
+                cached = pickle.load(index_file)
+            if cached["version"] == cache_version and cached["stats"] == stats:
+                return cached["index"]
+        except Exception:
+            pass
+        inv_index = InventoryIndex(nr)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, "wb") as tmp_file:
+                cached = dict(version=cache_version, stats=stats, index=inv_index)
+                pickle.dump(cached, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+        return inv_index
+
+
+# ----------------------------------------------------------------------------
+# INV_INDEX: Indexes of the hosts by name trigram, group and filter attribute so filters are set lookups rather than checking every host
+# ----------------------------------------------------------------------------
+class InventoryIndex:
+    def __init__(self, nr: Nornir) -> None:
+        self.names = set(nr.inventory.hosts)
+        self.trigrams: dict[str, set] = {}
+        self.groups: dict[str, set] = {}
+        # Attribute values (or list elements if the value is a list) are matched like nornir F filters
+        self.values: dict[str, dict] = {x: {} for x in index_attrs}
+        self.elements: dict[str, dict] = {x: {} for x in index_attrs}
+        for name, host in nr.inventory.hosts.items():
+            for num in range(len(name) - 2):
+                self.trigrams.setdefault(name[num : num + 3], set()).add(name)
+            for each_grp in host.groups:
+                self.groups.setdefault(each_grp.name, set()).add(name)
+            for attr in index_attrs:
+                self.add_value(attr, host.get(attr), name)
+
+    # ----------------------------------------------------------------------------
+    # ADD_VALUE: Adds the host to the index of the attributes value (unhashable values can't match a filter string so are skipped)
+    # ----------------------------------------------------------------------------
+    def add_value(self, attr: str, value: Any, name: str) -> None:
+        index = self.elements[attr] if isinstance(value, list) else self.values[attr]
+        for each_value in value if isinstance(value, list) else [value]:
+            try:
+                if each_value != None:
+                    index.setdefault(each_value, set()).add(name)
+            except TypeError:
+                pass
+
+    # ----------------------------------------------------------------------------
+    # NAME: Hosts whose name contains any of the terms, candidates are those with all the terms trigrams (short terms check all names)
+    # ----------------------------------------------------------------------------
+    def name_contains(self, terms: list) -> set:
+        matched: set = set()
+        for each_term in terms:
+            if len(each_term) < 3:
+                candidates = self.names
+            else:
+                trigrams = [each_term[x : x + 3] for x in range(len(each_term) - 2)]
+                candidates = set.intersection(
+                    *[self.trigrams.get(x, set()) for x in trigrams]
+                )
+            matched.update(x for x in candidates if each_term in x)
+        return matched
+
+    # ----------------------------------------------------------------------------
+    # GROUP: Hosts that are a member of any of the groups
+    # ----------------------------------------------------------------------------
+    def group_any(self, groups: list) -> set:
+        return set().union(*[self.groups.get(x, set()) for x in groups])
+
+    # ----------------------------------------------------------------------------
+    # ATTR_ANY: Hosts whose attribute value is any of the terms (or has any of the terms if the value is a list)
+    # ----------------------------------------------------------------------------
+    def attr_any(self, attr: str, terms: list) -> set:
+        matched: set = set()
+        for each_term in terms:
+            matched.update(self.values[attr].get(each_term, set()))
+            matched.update(self.elements[attr].get(each_term, set()))
+        return matched
+
+    # ----------------------------------------------------------------------------
+    # ATTR_CONTAINS: Hosts whose attribute value contains the term (or has the term if the value is a list)
+    # ----------------------------------------------------------------------------
+    def attr_contains(self, attr: str, term: str) -> set:
+        matched = set(self.elements[attr].get(term, set()))
+        for value, names in self.values[attr].items():
+            if isinstance(value, str) and term in value:
+                matched.update(names)
+        return matched
 
 
 # ----------------------------------------------------------------------------
@@ -74,53 +292,56 @@ class BuildInventory:
         )
         return parser
 
-    # LOAD_INV: Creates inventory from static files
-    def load_inventory(self, hosts: str, groups: str) -> Nornir:
+    # LOAD_INV: Creates inventory from static files (cached so only parsed when changed), the number of workers is the Nornir default unless set
+    def load_inventory(
+        self, hosts: str, groups: str, num_workers: Optional[int] = None
+    ) -> Nornir:
+        runner = {"plugin": "threaded", "options": {}}
+        if num_workers != None:
+            runner["options"]["num_workers"] = num_workers
+        from nornir import InitNornir
+        from nornir.core.plugins.inventory import InventoryPluginRegister
+
+        InventoryPluginRegister.register("CachedInventory", CachedInventory)
         nr: Nornir = InitNornir(
+            runner=runner,
             inventory={
-                "plugin": "SimpleInventory",
+                "plugin": "CachedInventory",
                 "options": {"host_file": hosts, "group_file": groups},
-            }
+            },
         )
         return nr
 
     # ----------------------------------------------------------------------------
-    # 2 FILTER_INV: Filters the host in the inventory  based on any arguments passed
+    # 2 FILTER_INV: Filters the host in the inventory based on any arguments passed, hosts must match all filters and any of the filters values
     # ----------------------------------------------------------------------------
     def filter_inventory(self, args: dict[str, Any], nr: Nornir) -> Nornir:
-        filters = []
+        filters, matches = ([], [])
+        # The index is only needed if filtering, is cached with the inventory (if loaded from the cache)
+        filter_args = ["hostname", "group", "version"] + list(filter_attrs)
+        if any(args.get(x) != None for x in filter_args):
+            if nr.config.inventory.plugin == "CachedInventory":
+                options = nr.config.inventory.options
+                inv_index = CachedInventory(**options).load_index(nr)
+            else:
+                inv_index = InventoryIndex(nr)
         if args.get("hostname") != None:
-            list_hosts = args["hostname"].split()
-            for n in range(10 - len(list_hosts)):
-                list_hosts.append("DUMMY")
-            nr = nr.filter(
-                F(name__contains=list_hosts[0])
-                | F(name__contains=list_hosts[1])
-                | F(name__contains=list_hosts[2])
-                | F(name__contains=list_hosts[3])
-                | F(name__contains=list_hosts[4])
-                | F(name__contains=list_hosts[5])
-                | F(name__contains=list_hosts[6])
-                | F(name__contains=list_hosts[7])
-                | F(name__contains=list_hosts[8])
-                | F(name__contains=list_hosts[9])
-            )
+            matches.append(inv_index.name_contains(args["hostname"].split()))
             filters.append(args["hostname"])
         if args.get("group") != None:
-            nr = nr.filter(F(groups__any=args["group"]))
+            matches.append(inv_index.group_any(args["group"]))
             filters.extend(args["group"])
-        if args.get("location") != None:
-            nr = nr.filter(F(Infra_Location__any=args["location"]))
-            filters.extend(args["location"])
-        if args.get("logical") != None:
-            nr = nr.filter(F(Infra_Logical_Location__any=args["logical"]))
-            filters.extend(args["logical"])
-        if args.get("type") != None:
-            nr = nr.filter(F(type__any=args["type"]))
-            filters.extend(args["type"])
+        for each_arg, attr in filter_attrs.items():
+            if args.get(each_arg) != None:
+                matches.append(inv_index.attr_any(attr, args[each_arg]))
+                filters.extend(args[each_arg])
         if args.get("version") != None:
-            nr = nr.filter(F(IOSVersion__contains=args["version"]))
+            matches.append(inv_index.attr_contains("IOSVersion", args["version"]))
             filters.append(args["version"])
+        # All filters must match, is a single pass over the hosts to keep those in all the matched sets
+        if len(matches) != 0:
+            matched = set.intersection(*matches)
+            nr = nr.filter(filter_func=lambda host: host.name in matched)
 
         # Print and exit if show or show_detail flags set
         num_hosts = len(nr.inventory.hosts.items())
@@ -139,6 +360,8 @@ class BuildInventory:
             self.rc.print(
                 f"[i cyan]{num_hosts}[/i cyan] hosts have matched the filters [i cyan]'{', '.join(filters)}'[/i cyan]:"
             )
+            from nornir_rich.functions import print_inventory
+
             print_inventory(nr)
             sys.exit(0)
         else:
@@ -0,0 +1,164 @@
+import os
+import json
+import glob
+import threading
+from datetime import datetime
+from typing import Any, Optional
+import nornir_catalog
+import nornir_incremental
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the run journal
+# ----------------------------------------------------------------------------
+# Journal file name (in the output folder), the run type and run ID are added to the name
+journal_name: str = "journal"
+max_journals: int = 20  # Journals kept in the output folder, the oldest are deleted
+# Run types that save files so can be resumed
+resume_types: list = ["vital", "detail", "pre_test", "post_test"]
+
+
+# ----------------------------------------------------------------------------
+# JOURNAL: Append-only record (JSON lines) of the files and host x command units a run has saved, so an interrupted run can be resumed
+# ----------------------------------------------------------------------------
+class RunJournal:
+    def __init__(self, output_fldr: str, run_type: str, run_id: str) -> None:
+        self.run_type = run_type
+        self.run_id = run_id
+        self.path = os.path.join(
+            output_fldr, f"{journal_name}_{run_type}_{run_id}.jsonl"
+        )
+        self.files: dict[str, dict[str, dict[str, str]]] = {}
+        self.cmds: dict[str, dict[str, dict[str, str]]] = {}
+        self.done: set = set()
+        self.complete = False
+        self.journal_file: Any = None
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # LOAD: Loads the units already saved by the run, a line cut short by the run being killed is ignored
+    # ----------------------------------------------------------------------------
+    @classmethod
+    def load(cls, path: str) -> "RunJournal":
+        journal = None
+        with open(path) as journal_file:
+            for each_line in journal_file:
+                try:
+                    entry = json.loads(each_line)
+                except ValueError:
+                    continue
+                if journal == None:
+                    journal = cls(
+                        os.path.dirname(path), entry["run_type"], entry["run_id"]
+                    )
+                elif entry.get("complete") == True:
+                    journal.complete = True
+                elif entry.get("done") == True:
+                    journal.done.add(entry["host"])
+                elif entry.get("cmd") != None:
+                    host_cmds = journal.cmds.setdefault(entry["host"], {})
+                    host_cmds[entry["cmd"]] = dict(
+                        type=entry["file"], sha256=entry["sha256"]
+                    )
+                elif entry.get("path") != None:
+                    host_files = journal.files.setdefault(entry["host"], {})
+                    host_files[entry["file"]] = dict(
+                        name=entry["name"], path=entry["path"]
+                    )
+        if journal == None:
+            raise ValueError(f"Journal {path} has no header")
+        journal.path = path
+        return journal
+
+    # ----------------------------------------------------------------------------
+    # WRITE: Appends an entry and flushes it straight to disk so it survives the run being killed
+    # ----------------------------------------------------------------------------
+    def write(self, entry: dict[str, Any]) -> None:
+        with self.lock:
+            if self.journal_file == None:
+                new_journal = not os.path.exists(self.path)
+                self.journal_file = open(self.path, "a")
+                if new_journal:
+                    header = dict(
+                        run_id=self.run_id,
+                        run_type=self.run_type,
+                        created=datetime.now().isoformat(timespec="seconds"),
+                    )
+                    self.journal_file.write(json.dumps(header) + "\n")
+            self.journal_file.write(json.dumps(entry) + "\n")
+            self.journal_file.flush()
+
+    # ----------------------------------------------------------------------------
+    # ADD: Records a file opened for a host and each command output saved to it (by hash so the output can be checked when reused)
+    # ----------------------------------------------------------------------------
+    def add_file(self, host: str, file_type: str, file_name: str, path: str) -> None:
+        self.files.setdefault(host, {})[file_type] = dict(name=file_name, path=path)
+        self.write(dict(host=host, file=file_type, name=file_name, path=path))
+
+    def add_cmd(self, host: str, file_type: str, each_cmd: str, output: str) -> None:
+        sha = nornir_catalog.output_hash(output)
+        self.cmds.setdefault(host, {})[each_cmd] = dict(type=file_type, sha256=sha)
+        self.write(dict(host=host, file=file_type, cmd=each_cmd, sha256=sha))
+
+    # ----------------------------------------------------------------------------
+    # DONE: Records a host has run all its commands (and diffs), a resumed run doesn't connect to it
+    # ----------------------------------------------------------------------------
+    def host_done(self, host: str) -> None:
+        self.done.add(host)
+        self.write(dict(host=host, done=True))
+
+    def is_done(self, host: str) -> bool:
+        return host in self.done
+
+    # ----------------------------------------------------------------------------
+    # SAVED: Gets the command outputs the run already saved for a host, any not in the file or that don't match the journalled hash are run again
+    # ----------------------------------------------------------------------------
+    def saved_outputs(self, host: str) -> dict[str, str]:
+        outputs = {}
+        for each_file in self.files.get(host, {}).values():
+            try:
+                file_outputs = nornir_incremental.read_outputs(each_file["path"])
+            except (OSError, ValueError, KeyError):
+                continue
+            for each_cmd, output in file_outputs.items():
+                saved = self.cmds.get(host, {}).get(each_cmd)
+                if saved == None:
+                    continue
+                if saved["sha256"] == nornir_catalog.output_hash(output):
+                    outputs[each_cmd] = output
+        return outputs
+
+    # ----------------------------------------------------------------------------
+    # FINISH: Marks the run complete if every host was done (so it isn't resumed) and closes the journal
+    # ----------------------------------------------------------------------------
+    def finish(self, hosts: list) -> None:
+        if len(hosts) != 0 and all(x in self.done for x in hosts):
+            self.complete = True
+            self.write(dict(complete=True))
+        with self.lock:
+            if self.journal_file != None:
+                self.journal_file.close()
+                self.journal_file = None
+
+
+# ----------------------------------------------------------------------------
+# LATEST: Path of the latest journal of the run type in the output folder (run IDs sort by date), None if there isn't one
+# ----------------------------------------------------------------------------
+def latest_journal(output_fldr: str, run_type: str) -> Optional[str]:
+    journals = glob.glob(
+        os.path.join(output_fldr, f"{journal_name}_{run_type}_*.jsonl")
+    )
+    if len(journals) == 0:
+        return None
+    return sorted(journals, key=os.path.basename)[-1]
+
+
+# ----------------------------------------------------------------------------
+# PRUNE: Deletes the oldest journals so only the latest (of all run types) are kept in the output folder
+# ----------------------------------------------------------------------------
+def prune_journals(output_fldr: str, keep: int = max_journals) -> None:
+    journals = glob.glob(os.path.join(output_fldr, f"{journal_name}_*.jsonl"))
+    # Sorted by run ID (the end of the name) as the run type is in the middle
+    journals.sort(key=lambda x: os.path.basename(x).rsplit("_", 1)[-1])
+    for each_journal in journals[: max(len(journals) - keep, 0)]:
+        os.remove(each_journal)
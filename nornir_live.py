@@ -0,0 +1,153 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from rich.console import Console
+from rich.theme import Theme
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the live console output
+# ----------------------------------------------------------------------------
+diff_stage_workers: int = 4  # Threads diffing the hosts that have finished collecting
+my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+
+
+# ----------------------------------------------------------------------------
+# ERROR: Name of the exception that failed a host, a failed sub-task is the exception of that sub-task
+# ----------------------------------------------------------------------------
+def error_name(result: Any) -> str:
+    exception = result[0].exception if len(result) != 0 else None
+    if type(exception).__name__ == "NornirSubTaskError":
+        exception = exception.result[0].exception
+    return type(exception).__name__ if exception != None else "Failed"
+
+
+# ----------------------------------------------------------------------------
+# DIFF_STAGE: Diffs each host as soon as it has collected its outputs (freeing the nornir worker for the next host) and prints its verdict straight away
+# ----------------------------------------------------------------------------
+class DiffStage:
+    def __init__(
+        self, rc: Optional[Console] = None, workers: int = diff_stage_workers
+    ) -> None:
+        self.rc = rc or Console(theme=Theme(my_theme))
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="diff_stage")
+        self.futures: list = []
+        self.verdicts: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # SUBMIT: Queues the hosts diffs, their messages are added to the hosts result and the host is marked done in the journal once diffed
+    # ----------------------------------------------------------------------------
+    def submit(
+        self, host: str, diff_job: Callable, result: Any, journal: Any = None
+    ) -> None:
+        self.futures.append(
+            self.pool.submit(self.run_job, host, diff_job, result, journal)
+        )
+
+    def run_job(self, host: str, diff_job: Callable, result: Any, journal: Any) -> None:
+        try:
+            msgs, changes = diff_job()
+        except Exception as err:
+            msgs, changes = ([f"❌ Creating the diff failed: {err!r}"], {})
+            result.failed, result.exception = (True, err)
+        result.result = "\n".join([result.result] + msgs)
+        if journal != None and not result.failed:
+            journal.host_done(host)
+        self.print_verdict(host, changes, result.failed)
+
+    # ----------------------------------------------------------------------------
+    # VERDICT: One line per host of whether each file type changed (and the commands that did), a type that couldn't be compared is an error
+    # ----------------------------------------------------------------------------
+    def print_verdict(
+        self, host: str, changes: dict[str, Optional[list]], failed: bool = False
+    ) -> None:
+        status, icon = ([], ":white_check_mark:")
+        for file_type, changed in changes.items():
+            if changed == None:
+                status.append(f"{file_type} not compared")
+                icon = ":x:"
+            elif len(changed) != 0:
+                status.append(f"{file_type} changed ({', '.join(changed)})")
+                icon = ":warning:" if icon != ":x:" else icon
+            else:
+                status.append(f"{file_type} unchanged")
+        if failed:
+            status, icon = (["creating the diff failed"], ":x:")
+        self.show(host, icon, ", ".join(status) or "nothing to compare")
+
+    def show(self, host: str, icon: str, verdict: str) -> None:
+        with self.lock:
+            self.verdicts[host] = verdict
+            self.rc.print(f"{icon} [b]{host}[/b]  {verdict}")
+
+    # ----------------------------------------------------------------------------
+    # PROCESSOR: Nornir processor methods, a host that failed collecting has its verdict printed as soon as its task completes
+    # ----------------------------------------------------------------------------
+    def task_started(self, task: Any) -> None:
+        pass
+
+    def task_completed(self, task: Any, result: Any) -> None:
+        pass
+
+    def task_instance_started(self, task: Any, host: Any) -> None:
+        pass
+
+    def task_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        if result.failed:
+            self.show(host.name, ":x:", f"failed collecting ({error_name(result)})")
+
+    def subtask_instance_started(self, task: Any, host: Any) -> None:
+        pass
+
+    def subtask_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        pass
+
+    # ----------------------------------------------------------------------------
+    # WAIT: Waits for all the queued diffs to finish, any error of a diff job is raised
+    # ----------------------------------------------------------------------------
+    def wait(self) -> None:
+        for each_future in self.futures:
+            each_future.result()
+        self.pool.shutdown()
+
+
+# ----------------------------------------------------------------------------
+# LIVE: Nornir processor that prints each hosts results as soon as the host completes (rather than all at the end of the run) and then releases them
+# ----------------------------------------------------------------------------
+class LiveRenderer:
+    def __init__(self, rc: Optional[Console] = None, vars: list = ["result"]) -> None:
+        self.rc = rc or Console(theme=Theme(my_theme))
+        self.vars = vars
+        self.rendered: list = []
+        self.lock = threading.Lock()
+
+    def task_started(self, task: Any) -> None:
+        pass
+
+    def task_completed(self, task: Any, result: Any) -> None:
+        pass
+
+    def task_instance_started(self, task: Any, host: Any) -> None:
+        pass
+
+    # ----------------------------------------------------------------------------
+    # RENDER: Prints the hosts panel (the same as print_result) in one go so hosts never interleave, then only the hosts task result is kept
+    # ----------------------------------------------------------------------------
+    def task_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        from nornir_rich.functions import RichHelper
+
+        rich_helper = RichHelper(vars=self.vars, severity_level=logging.INFO)
+        panel = rich_helper.print_multi_result(result, host.name)
+        with self.lock:
+            self.rc.print(panel)
+            self.rendered.append(host.name)
+        # The command outputs are only needed to print, so are released once printed
+        del result[1:]
+
+    def subtask_instance_started(self, task: Any, host: Any) -> None:
+        pass
+
+    def subtask_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        pass
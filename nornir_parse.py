@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+from typing import Any, Optional
+
+import nornir_store
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the structured (parsed) compare
+# ----------------------------------------------------------------------------
+parse_folder: str = "parsed"  # Folder in the snapshots folder of the parse cache
+# Fields (TextFSM value names in lowercase) that change on every run so are ignored by default, added to by 'parse' in input_cmd.yml
+ignore_fields: dict[str, list] = {
+    "show clock": ["time", "timezone", "dayweek", "month", "day", "year"],
+    "show version": [
+        "uptime",
+        "uptime_years",
+        "uptime_weeks",
+        "uptime_days",
+        "uptime_hours",
+        "uptime_minutes",
+    ],
+    "show ip bgp summary": [
+        "messages_received",
+        "messages_sent",
+        "table_version",
+        "input_queue",
+        "output_queue",
+        "up_down",
+    ],
+    "show bgp all summary": [
+        "messages_received",
+        "messages_sent",
+        "table_version",
+        "input_queue",
+        "output_queue",
+        "up_down",
+    ],
+    "show ip ospf neighbor": ["dead_time"],
+    "show ip route": ["uptime"],
+    "show ip arp": ["age"],
+}
+
+
+# ----------------------------------------------------------------------------
+# PARSE: Parses command output with the ntc-templates TextFSM template of the platform, None if there is no template
+# ----------------------------------------------------------------------------
+def parse_output(platform: str, each_cmd: str, output: str) -> Optional[list]:
+    from ntc_templates.parse import parse_output as ntc_parse_output
+
+    # Any template errors (as well as no template) fall back to comparing the text
+    try:
+        return ntc_parse_output(platform=platform, command=each_cmd, data=output)
+    except Exception:
+        return None
+
+
+# ----------------------------------------------------------------------------
+# KEY: Fields used to match records, is the fewest leading fields that make the records unique in both outputs
+# ----------------------------------------------------------------------------
+def get_key(fields: list, pre: list, post: list) -> list:
+    for num in range(1, len(fields) + 1):
+        unique = True
+        for records in [pre, post]:
+            keys = [tuple(x.get(y) for y in fields[:num]) for x in records]
+            unique = unique and len(keys) == len(set(keys))
+        if unique:
+            return fields[:num]
+    return fields
+
+
+# ----------------------------------------------------------------------------
+# COMPARE: Compares the parsed records of 2 outputs by key, any ignored fields are not compared
+# ----------------------------------------------------------------------------
+def compare_records(
+    pre: list, post: list, key: Optional[list] = None, ignore: list = []
+) -> dict[str, Any]:
+    fields = [x for x in (pre or post or [{}])[0] if x not in ignore]
+    key = key or get_key(fields, pre, post)
+
+    # Duplicate keys (such as identical records) are numbered so no record is lost
+    def by_key(records: list) -> dict[tuple, dict]:
+        keyed: dict[tuple, dict] = {}
+        for each_rec in records:
+            rec_key = tuple(each_rec.get(x) for x in key)
+            while rec_key in keyed:
+                rec_key = rec_key + ("",)
+            keyed[rec_key] = each_rec
+        return keyed
+
+    pre_keyed, post_keyed = (by_key(pre), by_key(post))
+    changed = []
+    for rec_key, each_rec in pre_keyed.items():
+        if rec_key in post_keyed:
+            fld_changes = {}
+            for each_fld in fields:
+                if each_rec.get(each_fld) != post_keyed[rec_key].get(each_fld):
+                    fld_changes[each_fld] = (
+                        each_rec.get(each_fld),
+                        post_keyed[rec_key].get(each_fld),
+                    )
+            if len(fld_changes) != 0:
+                changed.append((dict(zip(key, rec_key)), fld_changes))
+    return dict(
+        key=key,
+        ignore=ignore,
+        records=(len(pre), len(post)),
+        removed=[x for y, x in pre_keyed.items() if y not in post_keyed],
+        added=[x for y, x in post_keyed.items() if y not in pre_keyed],
+        changed=changed,
+    )
+
+
+# ----------------------------------------------------------------------------
+# PARSER: Parses and compares the command sections of a host, parsed outputs are cached in the snapshot folder
+# ----------------------------------------------------------------------------
+class SectionParser:
+    def __init__(
+        self,
+        platform: str,
+        output_fldr: str,
+        parse_cfg: Optional[dict[str, Any]] = None,
+    ) -> None:
+        self.platform = platform
+        self.parse_cfg = parse_cfg or {}
+        self.store = nornir_store.SnapshotStore(output_fldr)
+        self.cache_dir = os.path.join(self.store.manifest_dir, parse_folder)
+
+    # ----------------------------------------------------------------------------
+    # CACHE: Cache is keyed by a hash of the content (as well as platform and command), so is only parsed once
+    # ----------------------------------------------------------------------------
+    def cached_parse(self, each_cmd: str, output: str) -> Optional[list]:
+        content = json.dumps([self.platform, each_cmd, output]).encode()
+        sha = hashlib.sha256(content).hexdigest()
+        cache_file = os.path.join(self.cache_dir, sha[:2], sha + ".json")
+        if os.path.exists(cache_file):
+            with open(cache_file) as parsed_file:
+                return json.load(parsed_file)["records"]
+        records = parse_output(self.platform, each_cmd, output)
+        # Commands without a template are also cached (as null) so are not looked up again
+        parsed = dict(platform=self.platform, cmd=each_cmd, records=records)
+        self.store.write_atomic(cache_file, json.dumps(parsed).encode())
+        return records
+
+    # ----------------------------------------------------------------------------
+    # IGNORE: Default ignored fields for the command plus any set for it in the input file
+    # ----------------------------------------------------------------------------
+    def get_ignore(self, each_cmd: str) -> list:
+        cmd_cfg = self.parse_cfg.get(each_cmd) or {}
+        return ignore_fields.get(each_cmd, []) + cmd_cfg.get("ignore", [])
+
+    # ----------------------------------------------------------------------------
+    # COMPARE: Compares the parsed sections (lines incl header), None if either can't be parsed so is compared as text
+    # ----------------------------------------------------------------------------
+    def compare(
+        self, each_cmd: str, pre_lines: list, post_lines: list
+    ) -> Optional[dict[str, Any]]:
+        if self.platform == None:
+            return None
+        parsed = []
+        for lines in [pre_lines, post_lines]:
+            records = self.cached_parse(each_cmd, "".join(lines[1:]).rstrip("\n"))
+            if records == None or len(records) == 0:
+                return None
+            parsed.append(records)
+        cmd_cfg = self.parse_cfg.get(each_cmd) or {}
+        return compare_records(
+            parsed[0], parsed[1], cmd_cfg.get("key"), self.get_ignore(each_cmd)
+        )
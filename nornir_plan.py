@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+from typing import Any, Optional
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the compiled command plan
+# ----------------------------------------------------------------------------
+# Cache of compiled plans (per user so plans can't be changed by others), changed with env var CACHE_DIRECTORY
+cache_directory: str = os.path.join(os.path.expanduser("~"), ".cache", "nornir_checks")
+plan_folder: str = "plans"  # Folder in the cache directory of the compiled plans
+max_plans: int = 50  # Number of compiled plans kept in the cache, older are deleted
+
+
+# ----------------------------------------------------------------------------
+# ADD_CMD: Adds the commands of an input file entry (all, group or host) to the hosts commands
+# ----------------------------------------------------------------------------
+def add_cmds(cmds: dict[str, Any], input_data: dict[str, Any]) -> None:
+    cmds["run_cfg"] = cmds["run_cfg"] + input_data.get("run_cfg", False)
+    cmds["print"].extend(input_data.get("cmd_print", []))
+    cmds["vital"].extend(input_data.get("cmd_vital", []))
+    cmds["detail"].extend(input_data.get("cmd_detail", []))
+
+
+# ----------------------------------------------------------------------------
+# INDEX: Input file entries indexed by group and lowercase host name, so a hosts commands are got without checking every entry
+# ----------------------------------------------------------------------------
+class PlanIndex:
+    def __init__(self, input_data: dict[str, Any]) -> None:
+        self.all = input_data.get("all")
+        # Position in the input file is kept so entries are added in the same order as they are in the file
+        self.groups: dict[str, tuple] = {}
+        for num, (grp, grp_data) in enumerate((input_data.get("groups") or {}).items()):
+            self.groups[grp] = (num, grp_data)
+        self.hosts: dict[str, list] = {}
+        for num, (hst, hst_data) in enumerate((input_data.get("hosts") or {}).items()):
+            self.hosts.setdefault(hst.lower(), []).append((num, hst_data))
+
+    # ----------------------------------------------------------------------------
+    # HOST_CMD: Gets the merged commands of a host from the all, group (in any of the hosts groups) and host (name or hostname) entries
+    # ----------------------------------------------------------------------------
+    def host_cmds(self, name: str, hostname: Any, groups: list) -> dict[str, Any]:
+        cmds = dict(print=[], vital=[], detail=[], run_cfg=False)
+        # If run_cfg is set gathers and saves that first before getting the rest of commands
+        if self.all != None:
+            add_cmds(cmds, self.all)
+        grp_entries = [self.groups[x] for x in groups if x in self.groups]
+        for num, grp_data in sorted(grp_entries, key=lambda x: x[0]):
+            add_cmds(cmds, grp_data)
+        hst_entries = dict(self.hosts.get(name.lower(), []))
+        hst_entries.update(self.hosts.get(str(hostname).lower(), []))
+        for num in sorted(hst_entries):
+            add_cmds(cmds, hst_entries[num])
+        if cmds["run_cfg"] == True:
+            cmds["run_cfg"] = ["show running-config"]
+        return cmds
+
+
+# ----------------------------------------------------------------------------
+# COMPILE: Gets the merged commands of every host in the inventory (nornir hosts), is done once per run rather than in each hosts task
+# ----------------------------------------------------------------------------
+def compile_plans(input_data: dict[str, Any], hosts: dict) -> dict[str, dict]:
+    index = PlanIndex(input_data)
+    plans = {}
+    for name, host in hosts.items():
+        groups = [x.name for x in host.groups]
+        plans[name] = index.host_cmds(name, host.hostname, groups)
+    return plans
+
+
+# ----------------------------------------------------------------------------
+# CACHE: Compiled plans saved to disk keyed by a hash of the input file and inventory files, any change to either is a new plan
+# ----------------------------------------------------------------------------
+class PlanCache:
+    def __init__(self, input_file: str, inv_files: list) -> None:
+        sha = hashlib.sha256()
+        for each_file in [input_file] + inv_files:
+            sha.update(each_file.encode() + b"\0")
+            if os.path.exists(each_file):
+                with open(each_file, "rb") as content:
+                    sha.update(content.read())
+            sha.update(b"\0")
+        cache_dir = os.environ.get("CACHE_DIRECTORY", cache_directory)
+        self.plan_dir = os.path.join(cache_dir, plan_folder)
+        self.path = os.path.join(self.plan_dir, sha.hexdigest() + ".json")
+
+    # ----------------------------------------------------------------------------
+    # LOAD: Gets the compiled plans, None if not cached (or the cache file can't be read)
+    # ----------------------------------------------------------------------------
+    def load(self) -> Optional[dict[str, dict]]:
+        try:
+            with open(self.path) as plan_file:
+                return json.load(plan_file)
+        except (OSError, ValueError):
+            return None
+
+    # ----------------------------------------------------------------------------
+    # SAVE: Saves the compiled plans (written to a temp file that is renamed so is never read partially written) and deletes the oldest plans
+    # ----------------------------------------------------------------------------
+    def save(self, plans: dict[str, dict]) -> None:
+        try:
+            os.makedirs(self.plan_dir, mode=0o700, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as plan_file:
+                json.dump(plans, plan_file)
+            os.replace(tmp_path, self.path)
+            cached = [os.path.join(self.plan_dir, x) for x in os.listdir(self.plan_dir)]
+            cached = [x for x in cached if x.endswith(".json")]
+            for each_file in sorted(cached, key=os.path.getmtime)[:-max_plans]:
+                os.remove(each_file)
+        # The cache is only a speed up so the run continues if it can't be saved
+        except OSError:
+            pass
+
+
+# ----------------------------------------------------------------------------
+# PLANS: Gets the compiled plans of all hosts from the cache, else compiles and caches them
+# ----------------------------------------------------------------------------
+def get_plans(
+    input_file: str, inv_files: list, input_data: dict[str, Any], hosts: dict
+) -> dict[str, dict]:
+    cache = PlanCache(input_file, inv_files)
+    plans = cache.load()
+    if plans == None:
+        plans = compile_plans(input_data, hosts)
+        cache.save(plans)
+    return plans
@@ -0,0 +1,376 @@
+import os
+import time
+import random
+import socket
+import argparse
+import threading
+import multiprocessing
+from typing import Any, Optional
+
+import yaml
+import paramiko
+from rich.console import Console
+from rich.theme import Theme
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the device simulator
+# ----------------------------------------------------------------------------
+# Port of the first simulated host, each host listens on its own port
+sim_port: int = 22000
+sim_address: str = "127.0.0.1"  # Address the simulated hosts listen on
+# Inventory groups the simulated hosts are put in (in turn) with the netmiko platform of each group
+sim_groups: dict[str, str] = dict(
+    ios="cisco_ios", iosxe="cisco_xe", nxos="cisco_nxos_ssh"
+)
+# How the simulated hosts behave, is changed with the runtime flags
+sim_opts: dict[str, Any] = dict(
+    latency=0.05,  # Secs each command takes to return its output
+    jitter=0.2,  # Latency varies by up to this fraction either way
+    lines=20,  # Lines of output of each command (and of the running config)
+    auth_fail=0.0,  # Chance a login fails
+    drop=0.0,  # Chance the session is dropped rather than a command returning output
+    change=0.0,  # Chance each line of output differs from the last time it was run
+)
+# Canned show version of each group, the rest of the outputs are generated
+show_version: dict[str, str] = dict(
+    ios=(
+        "Cisco IOS Software, C3560 Software (C3560-IPSERVICESK9-M), Version 15.2(4)E10, RELEASE SOFTWARE (fc2)\n"
+        "Technical Support: http://www.cisco.com/techsupport\n"
+        "Copyright (c) 1986-2020 by Cisco Systems, Inc.\n\n"
+        "ROM: Bootstrap program is C3560 boot loader\n"
+        "{name} uptime is 12 weeks, 3 days, 4 hours, 10 minutes\n"
+        'System image file is "flash:c3560-ipservicesk9-mz.152-4.E10.bin"\n\n'
+        "cisco WS-C3560X-48P (PowerPC405) processor with 262144K bytes of memory.\n"
+        "Configuration register is 0xF"
+    ),
+    iosxe=(
+        "Cisco IOS XE Software, Version 17.03.04a\n"
+        "Cisco IOS Software [Amsterdam], ASR1000 Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), Version 17.3.4a, RELEASE SOFTWARE (fc3)\n"
+        "Technical Support: http://www.cisco.com/techsupport\n"
+        "Copyright (c) 1986-2021 by Cisco Systems, Inc.\n\n"
+        "{name} uptime is 12 weeks, 3 days, 4 hours, 10 minutes\n"
+        'System image file is "bootflash:asr1000-universalk9.17.03.04a.SPA.bin"\n\n'
+        "cisco ASR1002-X (2RU-X) processor with 3755053K/6147K bytes of memory.\n"
+        "Configuration register is 0x2102"
+    ),
+    nxos=(
+        "Cisco Nexus Operating System (NX-OS) Software\n"
+        "TAC support: http://www.cisco.com/tac\n"
+        "Copyright (C) 2002-2021, Cisco and/or its affiliates.\n\n"
+        "Software\n"
+        "  BIOS: version 05.45\n"
+        " NXOS: version 9.3(8)\n\n"
+        "Hardware\n"
+        "  cisco Nexus9000 C93180YC-EX chassis\n"
+        "  Device name: {name}\n\n"
+        "Kernel uptime is 85 day(s), 4 hour(s), 10 minute(s), 2 second(s)"
+    ),
+)
+
+
+# ----------------------------------------------------------------------------
+# HOSTS: Names and groups of the simulated hosts, the groups are used in turn
+# ----------------------------------------------------------------------------
+def sim_hosts(num_hosts: int, groups: Optional[list] = None) -> dict[str, str]:
+    groups = groups or list(sim_groups.keys())
+    return {f"SIM{x:04d}": groups[x % len(groups)] for x in range(num_hosts)}
+
+
+# ----------------------------------------------------------------------------
+# INVENTORY: Writes the hosts.yml and groups.yml of the simulated hosts (each on its own port) and returns their paths
+# ----------------------------------------------------------------------------
+def build_inventory(
+    inv_dir: str, hosts: dict[str, str], ports: dict[str, int]
+) -> list[str]:
+    os.makedirs(inv_dir, exist_ok=True)
+    inv_hosts, inv_groups = ({}, {})
+    for name, group in hosts.items():
+        inv_hosts[name] = dict(
+            hostname=sim_address,
+            port=ports[name],
+            groups=[group],
+            data=dict(
+                Infra_Location="SIM",
+                Infra_Logical_Location=group.upper(),
+                type="switch" if group != "iosxe" else "router",
+            ),
+        )
+    for group in set(hosts.values()):
+        netmiko = dict(platform=sim_groups[group])
+        inv_groups[group] = dict(connection_options=dict(netmiko=netmiko))
+    inv_files = [
+        os.path.join(inv_dir, "hosts.yml"),
+        os.path.join(inv_dir, "groups.yml"),
+    ]
+    for each_file, content in zip(inv_files, [inv_hosts, inv_groups]):
+        with open(each_file, "w") as inv_file:
+            yaml.dump(content, inv_file, default_flow_style=False)
+    return inv_files
+
+
+# ----------------------------------------------------------------------------
+# DEVICE: A simulated device session, accepts any login (unless it fails by chance) and answers commands at the hosts prompt
+# ----------------------------------------------------------------------------
+class SimDevice(paramiko.ServerInterface):
+    def __init__(self, name: str, group: str, opts: dict[str, Any]) -> None:
+        self.name = name
+        self.group = group
+        self.opts = opts
+        self.prompt = name + "#"
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if random.random() < self.opts["auth_fail"]:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, *args: Any) -> bool:
+        return True
+
+    def check_channel_shell_request(self, channel: Any) -> bool:
+        return True
+
+    # ----------------------------------------------------------------------------
+    # OUTPUT: Output of a command, is the same each time it is run other than the lines changed by chance
+    # ----------------------------------------------------------------------------
+    def output(self, cmd: str) -> str:
+        if cmd.startswith("terminal"):
+            return ""
+        elif cmd.startswith("show ver"):
+            return show_version[self.group].format(name=self.name)
+        # Seeded by the host and command so the output is the same on every session
+        seed = random.Random(f"{self.name}|{cmd}")
+        lines = []
+        for num in range(self.opts["lines"]):
+            value = seed.randint(0, 99999)
+            if random.random() < self.opts["change"]:
+                value = random.randint(100000, 199999)
+            if cmd.startswith("show run"):
+                lines.append(f"interface Ethernet1/{num}\n description link {value}")
+            else:
+                lines.append(f"{cmd.split()[-1]}  {num:<6}{self.name:<12}{value}")
+        if cmd.startswith("show run"):
+            lines.insert(0, f"hostname {self.name}\n!")
+        return "\n".join(lines)
+
+    # ----------------------------------------------------------------------------
+    # SHELL: Echos the characters sent and on a new line runs the command (after the latency) followed by the prompt
+    # ----------------------------------------------------------------------------
+    def run_shell(self, channel: Any) -> None:
+        channel.sendall("\r\n" + self.prompt)
+        cmd = ""
+        while True:
+            data = channel.recv(4096)
+            if not data:
+                return
+            for char in data.decode(errors="ignore"):
+                if char not in "\r\n":
+                    cmd += char
+                    channel.sendall(char)
+                    continue
+                channel.sendall("\r\n")
+                cmd, run_cmd = ("", cmd.strip())
+                if run_cmd in ["exit", "logout"]:
+                    return
+                if len(run_cmd) != 0:
+                    if random.random() < self.opts["drop"]:
+                        return
+                    jitter = random.uniform(-self.opts["jitter"], self.opts["jitter"])
+                    time.sleep(self.opts["latency"] * (1 + jitter))
+                    output = self.output(run_cmd)
+                    if len(output) != 0:
+                        channel.sendall(output.replace("\n", "\r\n") + "\r\n")
+                channel.sendall(self.prompt)
+
+
+# ----------------------------------------------------------------------------
+# SERVER: Runs a listener (in a thread) for each simulated host, port 0 gives each host a free port
+# ----------------------------------------------------------------------------
+class SimServer:
+    def __init__(
+        self, hosts: dict[str, str], opts: dict[str, Any], port: int = sim_port
+    ) -> None:
+        self.hosts = hosts
+        self.opts = dict(sim_opts, **opts)
+        self.port = port
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.listeners: list[socket.socket] = []
+
+    # ----------------------------------------------------------------------------
+    # START: Opens the port of each host and returns the ports, the hosts are answered in background threads
+    # ----------------------------------------------------------------------------
+    def start(self) -> dict[str, int]:
+        ports = {}
+        for num, (name, group) in enumerate(self.hosts.items()):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((sim_address, self.port + num if self.port != 0 else 0))
+            listener.listen(50)
+            self.listeners.append(listener)
+            ports[name] = listener.getsockname()[1]
+            threading.Thread(
+                target=self.serve, args=(listener, name, group), daemon=True
+            ).start()
+        return ports
+
+    # ----------------------------------------------------------------------------
+    # SERVE: Accepts the connections to a host, each session is run in its own thread
+    # ----------------------------------------------------------------------------
+    def serve(self, listener: socket.socket, name: str, group: str) -> None:
+        while True:
+            try:
+                conn, z = listener.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self.handle, args=(conn, name, group), daemon=True
+            ).start()
+
+    # ----------------------------------------------------------------------------
+    # HANDLE: Runs the SSH session of a connection, a failed login or dropped session closes the connection
+    # ----------------------------------------------------------------------------
+    def handle(self, conn: socket.socket, name: str, group: str) -> None:
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self.host_key)
+        device = SimDevice(name, group, self.opts)
+        try:
+            transport.start_server(server=device)
+            channel = transport.accept(20)
+            if channel != None:
+                device.run_shell(channel)
+        except (EOFError, OSError, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+    # ----------------------------------------------------------------------------
+    # STOP: Closes the hosts ports, open sessions are closed when the process ends
+    # ----------------------------------------------------------------------------
+    def stop(self) -> None:
+        for listener in self.listeners:
+            listener.close()
+        self.listeners = []
+
+
+# ----------------------------------------------------------------------------
+# PROCESS: Runs the simulator in its own process so it doesn't share the GIL with the nornir threads it is answering
+# ----------------------------------------------------------------------------
+def serve_process(hosts: dict[str, str], opts: dict[str, Any], port: int, pipe) -> None:
+    server = SimServer(hosts, opts, port)
+    pipe.send(server.start())
+    pipe.recv()
+    server.stop()
+
+
+class SimProcess:
+    def __init__(
+        self, hosts: dict[str, str], opts: dict[str, Any], port: int = sim_port
+    ) -> None:
+        self.pipe, child_pipe = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve_process, args=(hosts, opts, port, child_pipe), daemon=True
+        )
+
+    def start(self) -> dict[str, int]:
+        self.process.start()
+        return self.pipe.recv()
+
+    def stop(self) -> None:
+        self.pipe.send("stop")
+        self.process.join(10)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+# ----------------------------------------------------------------------------
+# Engine that runs the device simulator
+# ----------------------------------------------------------------------------
+def main():
+    my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+    rc = Console(theme=Theme(my_theme))
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", "--num_hosts", type=int, default=10, help="Number of simulated hosts"
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=sim_port,
+        help="Port of the first host, the rest are on the ports after it",
+    )
+    parser.add_argument(
+        "-inv",
+        "--inventory",
+        help="Folder the hosts.yml and groups.yml of the simulated hosts are written to",
+    )
+    parser.add_argument(
+        "-lat",
+        "--latency",
+        type=float,
+        default=sim_opts["latency"],
+        help="Secs each command takes to return its output",
+    )
+    parser.add_argument(
+        "-jit",
+        "--jitter",
+        type=float,
+        default=sim_opts["jitter"],
+        help="Fraction the latency varies by either way",
+    )
+    parser.add_argument(
+        "-lin",
+        "--lines",
+        type=int,
+        default=sim_opts["lines"],
+        help="Lines of output of each command",
+    )
+    parser.add_argument(
+        "-af",
+        "--auth_fail",
+        type=float,
+        default=sim_opts["auth_fail"],
+        help="Chance (0 to 1) a login fails",
+    )
+    parser.add_argument(
+        "-drp",
+        "--drop",
+        type=float,
+        default=sim_opts["drop"],
+        help="Chance (0 to 1) a session is dropped when a command is run",
+    )
+    parser.add_argument(
+        "-chg",
+        "--change",
+        type=float,
+        default=sim_opts["change"],
+        help="Chance (0 to 1) each line of output differs from the last time it was run",
+    )
+    args = vars(parser.parse_args())
+
+    hosts = sim_hosts(args["num_hosts"])
+    opts = {k: v for k, v in args.items() if k in sim_opts}
+    server = SimServer(hosts, opts, args["port"])
+    ports = server.start()
+    if args["inventory"] != None:
+        inv_files = build_inventory(args["inventory"], hosts, ports)
+        rc.print(f":white_check_mark: Created inventory [i]{', '.join(inv_files)}[/i]")
+    rc.print(
+        f":white_check_mark: Simulating {len(hosts)} hosts on [i]{sim_address}[/i] ports "
+        f"{min(ports.values())}-{max(ports.values())}"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from typing import Any, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the snapshot store
+# ----------------------------------------------------------------------------
+store_folder: str = "snapshots"  # Folder in output folder that holds the manifests
+zstd_level: int = 10  # Compression level used if zstandard is installed, else gzip
+
+
+# ----------------------------------------------------------------------------
+# FORMAT: The command output with a header of the command name (format of saved files)
+# ----------------------------------------------------------------------------
+def format_cmd(each_cmd: str, output: str) -> str:
+    header = "==== " + each_cmd + " " + "=" * (79 - len(each_cmd)) + "\n"
+    return header + output + "\n\n\n"
+
+
+# ----------------------------------------------------------------------------
+# SNAPSHOT: Content addressed store of compressed command outputs with a manifest per saved file
+# ----------------------------------------------------------------------------
+class SnapshotStore:
+    def __init__(self, output_fldr: str) -> None:
+        self.manifest_dir = os.path.join(output_fldr, store_folder)
+        # Objects can be shared between change folders to dedup across changes
+        self.object_dir = os.environ.get(
+            "SNAPSHOT_STORE", os.path.join(self.manifest_dir, "objects")
+        )
+        self.ext = ".zst" if zstandard != None else ".gz"
+
+    # ----------------------------------------------------------------------------
+    # OBJ_PATH: Objects are stored in sub-folders of the first 2 characters of their hash
+    # ----------------------------------------------------------------------------
+    def object_path(self, sha: str, ext: str) -> str:
+        return os.path.join(self.object_dir, sha[:2], sha + ext)
+
+    # ----------------------------------------------------------------------------
+    # ATOMIC: Writes to a temp file that is renamed so a partially written file is never read
+    # ----------------------------------------------------------------------------
+    def write_atomic(self, path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
+
+    # ----------------------------------------------------------------------------
+    # PUT: Compresses and saves the command output, is only saved if that content is not already in the store
+    # ----------------------------------------------------------------------------
+    def put_blob(self, output: str) -> str:
+        content = output.encode()
+        sha = hashlib.sha256(content).hexdigest()
+        if self.find_blob(sha) == None:
+            if zstandard != None:
+                data = zstandard.ZstdCompressor(level=zstd_level).compress(content)
+            else:
+                data = gzip.compress(content)
+            self.write_atomic(self.object_path(sha, self.ext), data)
+        return sha
+
+    # ----------------------------------------------------------------------------
+    # FIND: Gets the path of an object in either compression format, None if not in the store
+    # ----------------------------------------------------------------------------
+    def find_blob(self, sha: str) -> Optional[str]:
+        for ext in [".zst", ".gz"]:
+            if os.path.exists(self.object_path(sha, ext)):
+                return self.object_path(sha, ext)
+        return None
+
+    # ----------------------------------------------------------------------------
+    # GET: Gets and decompresses the command output of an object
+    # ----------------------------------------------------------------------------
+    def get_blob(self, sha: str) -> str:
+        path = self.find_blob(sha)
+        if path == None:
+            raise FileNotFoundError(f"Object {sha} is not in {self.object_dir}")
+        with open(path, "rb") as blob_file:
+            data = blob_file.read()
+        if path.endswith(".zst"):
+            if zstandard == None:
+                raise ImportError(f"zstandard is needed to read {path}")
+            return zstandard.ZstdDecompressor().decompress(data).decode()
+        return gzip.decompress(data).decode()
+
+    # ----------------------------------------------------------------------------
+    # MAN_PATH: The manifest has the same name as the text file it replaces
+    # ----------------------------------------------------------------------------
+    def manifest_path(self, file_name: str) -> str:
+        return os.path.join(self.manifest_dir, file_name.replace(".txt", ".json"))
+
+    # ----------------------------------------------------------------------------
+    # MANIFEST: Saves the list of command outputs (command and hash) that make up a saved file
+    # ----------------------------------------------------------------------------
+    def save_manifest(self, file_name: str, sections: list[dict[str, Any]]) -> str:
+        path = self.manifest_path(file_name)
+        manifest = dict(file_name=file_name, sections=sections)
+        self.write_atomic(path, json.dumps(manifest, indent=2).encode())
+        return path
+
+    # ----------------------------------------------------------------------------
+    # LIST: Gets the text file names of all the manifests in the store
+    # ----------------------------------------------------------------------------
+    def list_files(self) -> list:
+        if not os.path.exists(self.manifest_dir):
+            return []
+        manifests = os.listdir(self.manifest_dir)
+        return [x.replace(".json", ".txt") for x in manifests if x.endswith(".json")]
+
+    # ----------------------------------------------------------------------------
+    # RESTORE: Recreates the text file of a manifest in the destination folder
+    # ----------------------------------------------------------------------------
+    def restore(self, file_name: str, dest_fldr: str) -> str:
+        with open(self.manifest_path(file_name)) as manifest_file:
+            manifest = json.load(manifest_file)
+        output_file = os.path.join(dest_fldr, manifest["file_name"])
+        with open(output_file, "w") as restore_file:
+            for each_section in manifest["sections"]:
+                output = self.get_blob(each_section["sha256"])
+                restore_file.write(format_cmd(each_section["cmd"], output))
+        return output_file
+
+
+# ----------------------------------------------------------------------------
+# STORE_FILE: Used in place of a text file to save each command output to the store as it is run
+# ----------------------------------------------------------------------------
+class StoreFile:
+    def __init__(self, store: SnapshotStore, file_name: str) -> None:
+        self.store = store
+        self.file_name = file_name
+        self.sections: list[dict[str, Any]] = []
+
+    # ----------------------------------------------------------------------------
+    # WRITE: Saves the output to the store and adds it to the sections of the manifest
+    # ----------------------------------------------------------------------------
+    def write_cmd(self, each_cmd: str, output: str) -> None:
+        sha = self.store.put_blob(output)
+        self.sections.append(dict(cmd=each_cmd, sha256=sha, bytes=len(output.encode())))
+
+    # ----------------------------------------------------------------------------
+    # CLOSE: Saves the manifest once with all outputs saved, is closed even if a later command fails so has the outputs saved up to then
+    # ----------------------------------------------------------------------------
+    def close(self) -> None:
+        self.store.save_manifest(self.file_name, self.sections)
@@ -0,0 +1,94 @@
+import os
+import json
+import tempfile
+import threading
+from typing import Any, Optional
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the per-command read timeouts
+# ----------------------------------------------------------------------------
+# Cache of command history (per user), changed with env var CACHE_DIRECTORY
+cache_directory: str = os.path.join(os.path.expanduser("~"), ".cache", "nornir_checks")
+history_file: str = "cmd_history.json"  # File in the cache directory of the history
+history_runs: int = 10  # Latest runs of each command the timeout is learnt from
+timeout_factor: float = 3  # Read timeout is this many times the slowest recent run
+min_timeout: float = 10  # Never waits less than this (netmiko's default read timeout)
+max_timeout: float = 600  # Never waits more than this, however slow the command
+# Slowest output (bytes per sec) expected from a device, big outputs get at least this long
+min_read_rate: float = 20000
+
+
+# ----------------------------------------------------------------------------
+# HISTORY: Duration and output size of the latest runs of each command per platform, used to set each commands read timeout
+# ----------------------------------------------------------------------------
+class CmdHistory:
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        cache_dir = cache_dir or os.environ.get("CACHE_DIRECTORY", cache_directory)
+        self.path = os.path.join(cache_dir, history_file)
+        self.history: dict[str, dict[str, dict[str, Any]]] = self.load()
+        self.updated: set = set()
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # LOAD: Loads the history, a missing or corrupt file is an empty history (all commands use the default timeout)
+    # ----------------------------------------------------------------------------
+    def load(self) -> dict[str, dict[str, dict[str, Any]]]:
+        try:
+            with open(self.path) as hist_file:
+                return json.load(hist_file)
+        except (OSError, ValueError):
+            return {}
+
+    # ----------------------------------------------------------------------------
+    # TIMEOUT: Read timeout of a command, the slowest recent run (or time to receive its biggest output) times the factor, default if never run
+    # ----------------------------------------------------------------------------
+    def read_timeout(
+        self, platform: Optional[str], each_cmd: str, default: float = min_timeout
+    ) -> float:
+        stats = self.history.get(str(platform), {}).get(each_cmd)
+        if stats == None or len(stats["secs"]) == 0:
+            return default
+        timeout = max(
+            max(stats["secs"]) * timeout_factor,
+            max(stats["bytes"]) / min_read_rate,
+        )
+        return round(min(max(timeout, min_timeout), max_timeout), 1)
+
+    # ----------------------------------------------------------------------------
+    # RECORD: Adds a run of the command, a timed out run is recorded as taking the timeout it was given so the next timeout is longer
+    # ----------------------------------------------------------------------------
+    def record(
+        self,
+        platform: Optional[str],
+        each_cmd: str,
+        secs: float,
+        num_bytes: int = 0,
+        timed_out: bool = False,
+    ) -> None:
+        with self.lock:
+            plat_hist = self.history.setdefault(str(platform), {})
+            stats = plat_hist.setdefault(each_cmd, dict(secs=[], bytes=[], timeouts=0))
+            stats["secs"] = (stats["secs"] + [round(secs, 3)])[-history_runs:]
+            stats["bytes"] = (stats["bytes"] + [num_bytes])[-history_runs:]
+            if timed_out:
+                stats["timeouts"] += 1
+            self.updated.add((str(platform), each_cmd))
+
+    # ----------------------------------------------------------------------------
+    # SAVE: Merges the commands run into the history on disk (could have been saved by another run) and writes it to a temp file that is renamed
+    # ----------------------------------------------------------------------------
+    def save(self) -> None:
+        if len(self.updated) == 0:
+            return
+        with self.lock:
+            history = self.load()
+            for platform, each_cmd in self.updated:
+                plat_hist = history.setdefault(platform, {})
+                plat_hist[each_cmd] = self.history[platform][each_cmd]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(history, tmp_file)
+            os.replace(tmp_path, self.path)
+            self.updated = set()
@@ -0,0 +1,320 @@
+import os
+import csv
+import json
+import time
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for the run timings
+# ----------------------------------------------------------------------------
+# Run report file name (in the output folder), the run ID is added to the name
+report_name: str = "run_report"
+slowest_num: int = 10  # Number of the slowest commands listed in the JSON report
+service_name: str = "nornir_ppcheck"  # Service name of the exported spans
+# Phases whose bytes are the output received from the device (the rest are bytes written)
+recv_phases: list = ["command", "batch", "broker"]
+# Fields of each timing record (and the columns of the CSV report)
+record_fields: list = [
+    "host",
+    "phase",
+    "cmd",
+    "start",
+    "secs",
+    "bytes",
+    "retries",
+    "error",
+]
+
+
+# ----------------------------------------------------------------------------
+# TIMER: Records the timing of every host, command and phase of a run, is also a nornir processor that times the host tasks and commands
+# ----------------------------------------------------------------------------
+class RunTimer:
+    def __init__(self, run_id: str, run_type: Optional[str]) -> None:
+        self.run_id = run_id
+        self.run_type = run_type
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.records: list[dict[str, Any]] = []
+        self.started: dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # ADD: Adds a timing record, start is the epoch time so records of different hosts can be lined up
+    # ----------------------------------------------------------------------------
+    def add(
+        self,
+        host: str,
+        phase: str,
+        start: float,
+        secs: float,
+        cmd: Optional[str] = None,
+        num_bytes: int = 0,
+        retries: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        record = dict(
+            host=host,
+            phase=phase,
+            cmd=cmd,
+            start=round(start, 6),
+            secs=round(secs, 6),
+            bytes=num_bytes,
+            retries=retries,
+            error=error,
+        )
+        with self.lock:
+            self.records.append(record)
+
+    # ----------------------------------------------------------------------------
+    # PHASE: Times the code run in the with block, the record can be updated (bytes, retries) before the block ends
+    # ----------------------------------------------------------------------------
+    @contextmanager
+    def phase(
+        self, host: str, phase: str, cmd: Optional[str] = None
+    ) -> Iterator[dict[str, Any]]:
+        record: dict[str, Any] = dict(num_bytes=0, retries=0, error=None)
+        start, begin = (time.time(), time.perf_counter())
+        try:
+            yield record
+        except Exception as err:
+            record["error"] = type(err).__name__
+            raise
+        finally:
+            secs = time.perf_counter() - begin
+            self.add(host, phase, start, secs, cmd, **record)
+
+    # ----------------------------------------------------------------------------
+    # PROCESSOR: Nornir processor methods, the host task and each command run as a nornir sub-task are timed
+    # ----------------------------------------------------------------------------
+    def task_started(self, task: Any) -> None:
+        pass
+
+    def task_completed(self, task: Any, result: Any) -> None:
+        pass
+
+    def task_instance_started(self, task: Any, host: Any) -> None:
+        with self.lock:
+            self.started[(host.name, None)] = time.time()
+
+    def task_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        self.processor_record(host.name, "host", None, result)
+
+    def subtask_instance_started(self, task: Any, host: Any) -> None:
+        with self.lock:
+            self.started[(host.name, task.name)] = time.time()
+
+    def subtask_instance_completed(self, task: Any, host: Any, result: Any) -> None:
+        # Commands already gathered (batch, broker or async) are timed by the phase that ran them
+        if getattr(task.task, "__name__", None) == "gathered_result":
+            with self.lock:
+                self.started.pop((host.name, task.name), None)
+            return
+        self.processor_record(host.name, "command", task.name, result)
+
+    def processor_record(self, host: str, phase: str, cmd: Any, result: Any) -> None:
+        end = time.time()
+        with self.lock:
+            start = self.started.pop((host, cmd), None)
+        if start == None:
+            return
+        # Only a commands result is output received from the device
+        output = result[0].result if len(result) != 0 else None
+        num_bytes = 0
+        if phase == "command" and isinstance(output, str):
+            num_bytes = len(output.encode())
+        error = None
+        if result.failed:
+            exception = result[0].exception
+            error = type(exception).__name__ if exception != None else "Failed"
+        self.add(host, phase, start, end - start, cmd, num_bytes, 0, error)
+
+    # ----------------------------------------------------------------------------
+    # HOSTS: Per-host totals (run time, connect time, commands, bytes received, retries) and whether the host failed
+    # ----------------------------------------------------------------------------
+    def host_summary(self) -> dict[str, dict[str, Any]]:
+        hosts: dict[str, dict[str, Any]] = {}
+        for each_rec in self.records:
+            host = hosts.setdefault(
+                each_rec["host"],
+                dict(
+                    secs=0,
+                    connect_secs=0,
+                    cmds=0,
+                    cmd_secs=0,
+                    bytes=0,
+                    retries=0,
+                    failed=False,
+                ),
+            )
+            if each_rec["phase"] == "host":
+                host["secs"] = each_rec["secs"]
+                host["failed"] = each_rec["error"] != None
+            elif each_rec["phase"] == "connect":
+                host["connect_secs"] += each_rec["secs"]
+            elif each_rec["phase"] == "command":
+                host["cmds"] += 1
+                host["cmd_secs"] += each_rec["secs"]
+            if each_rec["phase"] in recv_phases:
+                host["bytes"] += each_rec["bytes"]
+            host["retries"] += each_rec["retries"]
+        for host in hosts.values():
+            host["connect_secs"] = round(host["connect_secs"], 6)
+            host["cmd_secs"] = round(host["cmd_secs"], 6)
+        return dict(sorted(hosts.items(), key=lambda x: x[1]["secs"], reverse=True))
+
+    # ----------------------------------------------------------------------------
+    # REPORT: The run report, hosts are ordered slowest first and the slowest commands are listed so overruns are easy to find
+    # ----------------------------------------------------------------------------
+    def report(self) -> dict[str, Any]:
+        end = self.end or time.time()
+        cmds = [x for x in self.records if x["phase"] == "command"]
+        return dict(
+            run_id=self.run_id,
+            run_type=self.run_type,
+            started=datetime.fromtimestamp(self.start).isoformat(timespec="seconds"),
+            secs=round(end - self.start, 3),
+            hosts=self.host_summary(),
+            slowest_cmds=sorted(cmds, key=lambda x: x["secs"], reverse=True)[
+                :slowest_num
+            ],
+            records=sorted(self.records, key=lambda x: x["start"]),
+        )
+
+    # ----------------------------------------------------------------------------
+    # WRITE: Saves the run report as JSON or the timing records as CSV
+    # ----------------------------------------------------------------------------
+    def write_report(self, path: str, report_format: str = "json") -> None:
+        if report_format == "csv":
+            with open(path, "w", newline="") as report_file:
+                writer = csv.DictWriter(report_file, fieldnames=record_fields)
+                writer.writeheader()
+                writer.writerows(sorted(self.records, key=lambda x: x["start"]))
+        else:
+            with open(path, "w") as report_file:
+                json.dump(self.report(), report_file, indent=2)
+
+    # ----------------------------------------------------------------------------
+    # SPANS: Saves the run as OpenTelemetry spans (OTLP JSON), a span for the run with a child span per host and the hosts phases under that
+    # ----------------------------------------------------------------------------
+    def write_spans(self, path: str) -> None:
+        end = self.end or time.time()
+        trace_id = secrets.token_hex(16)
+        run_span = secrets.token_hex(8)
+        spans = [
+            make_span(
+                trace_id,
+                run_span,
+                None,
+                f"{self.run_type} run",
+                self.start,
+                end,
+                dict(run_id=self.run_id),
+            )
+        ]
+        host_spans = {}
+        for each_rec in self.records:
+            if each_rec["phase"] == "host":
+                host_spans[each_rec["host"]] = secrets.token_hex(8)
+        for each_rec in sorted(self.records, key=lambda x: x["start"]):
+            if each_rec["phase"] == "host":
+                span_id, parent, name = (
+                    host_spans[each_rec["host"]],
+                    run_span,
+                    each_rec["host"],
+                )
+            else:
+                span_id = secrets.token_hex(8)
+                parent = host_spans.get(each_rec["host"], run_span)
+                name = (
+                    each_rec["phase"]
+                    if each_rec["cmd"] == None
+                    else f"{each_rec['phase']} {each_rec['cmd']}"
+                )
+            attrs = {
+                k: v
+                for k, v in each_rec.items()
+                if k not in ["start", "secs"] and v != None
+            }
+            rec_end = each_rec["start"] + each_rec["secs"]
+            spans.append(
+                make_span(
+                    trace_id, span_id, parent, name, each_rec["start"], rec_end, attrs
+                )
+            )
+        resource = dict(attributes=otlp_attrs(dict(service_name=service_name)))
+        scope_spans = [dict(scope=dict(name=service_name), spans=spans)]
+        with open(path, "w") as span_file:
+            json.dump(
+                dict(resourceSpans=[dict(resource=resource, scopeSpans=scope_spans)]),
+                span_file,
+            )
+
+
+# ----------------------------------------------------------------------------
+# OTLP: Attributes and spans in the OTLP JSON format, times are nanoseconds since the epoch (as strings) and errors set the span status
+# ----------------------------------------------------------------------------
+def otlp_attrs(attrs: dict[str, Any]) -> list:
+    otlp = []
+    for key, value in attrs.items():
+        key = "service.name" if key == "service_name" else key
+        if isinstance(value, bool):
+            otlp.append(dict(key=key, value=dict(boolValue=value)))
+        elif isinstance(value, int):
+            otlp.append(dict(key=key, value=dict(intValue=str(value))))
+        else:
+            otlp.append(dict(key=key, value=dict(stringValue=str(value))))
+    return otlp
+
+
+def make_span(
+    trace_id: str,
+    span_id: str,
+    parent: Optional[str],
+    name: str,
+    start: float,
+    end: float,
+    attrs: dict[str, Any],
+) -> dict[str, Any]:
+    span = dict(
+        traceId=trace_id,
+        spanId=span_id,
+        name=name,
+        kind=1,
+        startTimeUnixNano=str(int(start * 1e9)),
+        endTimeUnixNano=str(int(end * 1e9)),
+        attributes=otlp_attrs(attrs),
+        status=dict(code=2 if attrs.get("error") != None else 1),
+    )
+    if parent != None:
+        span["parentSpanId"] = parent
+    return span
+
+
+# ----------------------------------------------------------------------------
+# SAVE: Saves the run report (and spans if a file is given) in the output folder, returns the messages of the files saved
+# ----------------------------------------------------------------------------
+def save_report(
+    timer: RunTimer,
+    output_fldr: Optional[str],
+    report_format: Optional[str],
+    span_file: Optional[str] = None,
+) -> list[str]:
+    timer.end = time.time()
+    saved = []
+    if report_format != None:
+        report_fldr = output_fldr or os.getcwd()
+        path = os.path.join(
+            report_fldr, f"{report_name}_{timer.run_id}.{report_format}"
+        )
+        timer.write_report(path, report_format)
+        saved.append(f"✅ Saved the run report '{path}'")
+    if span_file != None:
+        timer.write_spans(span_file)
+        saved.append(f"✅ Saved the run spans '{span_file}'")
+    return saved
@@ -0,0 +1,143 @@
+import threading
+from typing import Any, Optional
+from rich.console import Console
+from rich.markup import escape
+from rich.theme import Theme
+
+import nornir_diff
+import nornir_catalog
+import nornir_incremental
+
+
+# ----------------------------------------------------------------------------
+# VARIABLES: Hardcoded default variables for watching the vital commands
+# ----------------------------------------------------------------------------
+delta_lines: int = 20  # Max changed lines of a command displayed, the rest are counted
+my_theme = {"repr.ipv4": "none", "repr.number": "none", "repr.call": "none"}
+
+
+# ----------------------------------------------------------------------------
+# DELTA: Lines removed and added between the baseline and current output of a command
+# ----------------------------------------------------------------------------
+def output_delta(before: str, after: str) -> tuple[list[str], list[str]]:
+    pre_lines, post_lines = (before.splitlines(), after.splitlines())
+    removed, added = ([], [])
+    for tag, i1, i2, j1, j2 in nornir_diff.diff_opcodes(pre_lines, post_lines):
+        if tag != "equal":
+            removed.extend(pre_lines[i1:i2])
+            added.extend(post_lines[j1:j2])
+    return removed, added
+
+
+# ----------------------------------------------------------------------------
+# WATCH: Compares each poll of the vital commands to the baseline (pre-change vital file), only commands whose hash changed since the last poll are diffed
+# ----------------------------------------------------------------------------
+class VitalWatch:
+    def __init__(
+        self,
+        output_fldr: str,
+        run_id: Optional[str] = None,
+        rc: Optional[Console] = None,
+    ) -> None:
+        self.catalog = nornir_catalog.SnapshotCatalog(output_fldr)
+        self.run_id = run_id
+        self.rc = rc or Console(theme=Theme(my_theme))
+        self.baselines: dict[str, Optional[dict[str, Any]]] = {}
+        # Hash of each hosts command output in the last poll and the commands that differ from the baseline
+        self.seen: dict[str, dict[str, str]] = {}
+        self.differ: dict[str, set] = {}
+        self.poll, self.changed = (0, 0)
+        self.lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    # BASELINE: Gets the hosts baseline vital file (and its hashes) from the catalog once, its outputs are only read when a command first needs diffing
+    # ----------------------------------------------------------------------------
+    def baseline(self, host: str) -> Optional[dict[str, Any]]:
+        if host not in self.baselines:
+            self.baselines[host] = self.catalog.baseline(host, "vital", self.run_id)
+        return self.baselines[host]
+
+    def base_output(self, host: str, each_cmd: str) -> str:
+        baseline = self.baselines[host]
+        if baseline.get("outputs") == None:
+            baseline["outputs"] = nornir_incremental.read_outputs(baseline["path"])
+        return baseline["outputs"].get(each_cmd, "")
+
+    # ----------------------------------------------------------------------------
+    # CHECK: Hashes each command output, those that changed since the last poll are compared to the baseline and their delta printed
+    # ----------------------------------------------------------------------------
+    def check(self, host: str, outputs: dict[str, str]) -> list[str]:
+        baseline = self.baseline(host)
+        if baseline == None:
+            if host in self.seen:
+                return []
+            self.seen[host] = {}
+            return self.show(host, ["❌ No baseline vital file to compare against"])
+        seen = self.seen.setdefault(host, {})
+        differ = self.differ.setdefault(host, set())
+        msgs = []
+        for each_cmd, output in outputs.items():
+            sha256 = nornir_catalog.output_hash(output)
+            if seen.get(each_cmd) == sha256:
+                continue
+            first_poll = each_cmd not in seen
+            seen[each_cmd] = sha256
+            if not first_poll:
+                with self.lock:
+                    self.changed += 1
+            if each_cmd not in baseline["output"]:
+                if first_poll:
+                    msgs.append(f"⚠️  {each_cmd}: not in the baseline")
+            elif sha256 == baseline["output"][each_cmd]:
+                if each_cmd in differ:
+                    differ.discard(each_cmd)
+                    msgs.append(f"✅ {each_cmd}: back to the baseline")
+            else:
+                differ.add(each_cmd)
+                base_output = self.base_output(host, each_cmd)
+                msgs.extend(self.delta_msg(each_cmd, base_output, output))
+        return self.show(host, msgs)
+
+    # ----------------------------------------------------------------------------
+    # DELTA_MSG: Number of lines removed and added from the baseline followed by the lines (up to the max)
+    # ----------------------------------------------------------------------------
+    def delta_msg(self, each_cmd: str, before: str, after: str) -> list[str]:
+        removed, added = output_delta(before, after)
+        lines = [f"- {x}" for x in removed] + [f"+ {x}" for x in added]
+        msgs = [
+            f"⚠️  {each_cmd}: -{len(removed)} +{len(added)} lines from the baseline"
+        ]
+        msgs.extend(f"     {x}" for x in lines[:delta_lines])
+        if len(lines) > delta_lines:
+            msgs.append(f"     ... {len(lines) - delta_lines} more lines")
+        return msgs
+
+    # ----------------------------------------------------------------------------
+    # SHOW: Prints the hosts messages in one go so hosts never interleave
+    # ----------------------------------------------------------------------------
+    def show(self, host: str, msgs: list[str]) -> list[str]:
+        if len(msgs) != 0:
+            with self.lock:
+                self.rc.print(f"[b]{host}[/b]")
+                for each_msg in msgs:
+                    self.rc.print(escape(each_msg), highlight=False)
+        return msgs
+
+    def failed(self, host: str, error: str) -> None:
+        with self.lock:
+            self.rc.print(f":x: [b]{host}[/b]  poll failed ({error})")
+
+    # ----------------------------------------------------------------------------
+    # POLL: Prints the summary of each poll, the commands that changed since the last poll and how many still differ from the baseline
+    # ----------------------------------------------------------------------------
+    def start_poll(self) -> None:
+        self.poll += 1
+        self.changed = 0
+
+    def end_poll(self, secs: float) -> None:
+        differ = sum(len(x) for x in self.differ.values())
+        hosts = len([x for x in self.differ.values() if len(x) != 0])
+        self.rc.print(
+            f":repeat: Poll {self.poll} took {secs:.1f}s, {self.changed} commands changed "
+            f"since the last poll, {differ} differ from the baseline on {hosts} hosts"
+        )
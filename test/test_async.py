@@ -0,0 +1,167 @@
+import pytest
+import socket
+import asyncio
+import nornir_sim
+import nornir_async
+from nornir import InitNornir
+from main import NornirEngine
+from nornir_sim import SimDevice, SimServer, build_inventory
+from nornir_timeout import CmdHistory
+
+
+# ----------------------------------------------------------------------------
+# Starts simulated hosts (an ASA and IOS) and loads them into nornir, a host can be given a closed port so it fails
+# ----------------------------------------------------------------------------
+def load_sim_nornir(inv_dir, opts, dead_host=None):
+    hosts = dict(SIM0000="ios", SIM0001="asa")
+    server = SimServer(hosts, dict(dict(latency=0, lines=5), **opts), 0)
+    ports = server.start()
+    if dead_host != None:
+        hosts[dead_host] = "ios"
+        # A port that was free, so nothing listens on it
+        with socket.socket() as dead_sock:
+            dead_sock.bind(("127.0.0.1", 0))
+            ports[dead_host] = dead_sock.getsockname()[1]
+    inv_files = build_inventory(inv_dir, hosts, ports)
+    nr_inv = InitNornir(
+        inventory={
+            "plugin": "SimpleInventory",
+            "options": {"host_file": inv_files[0], "group_file": inv_files[1]},
+        }
+    )
+    nr_inv.inventory.defaults.username = "u1"
+    nr_inv.inventory.defaults.password = "pw"
+    return server, nr_inv
+
+
+# ----------------------------------------------------------------------------
+# Fixture to add an ASA to the simulated platforms and record each command a simulated host is sent
+# ----------------------------------------------------------------------------
+@pytest.fixture()
+def sim_cmds(monkeypatch):
+    sent = []
+    monkeypatch.setitem(nornir_sim.sim_groups, "asa", "cisco_asa_ssh")
+    monkeypatch.setitem(nornir_sim.show_version, "asa", "Cisco ASA {name}")
+    sim_output = SimDevice.output
+
+    def output(self, cmd):
+        sent.append((self.name, cmd))
+        return sim_output(self, cmd)
+
+    monkeypatch.setattr(SimDevice, "output", output)
+    return sent
+
+
+# ----------------------------------------------------------------------------
+# 1. ASYNC: Testing of running the hosts commands with asyncio against simulated hosts
+# ----------------------------------------------------------------------------
+class TestAsyncCommands:
+
+    # 1a. Testing paging is disabled with the platforms command and each commands output is got up to the next prompt
+    def test_run_cmds(self, tmp_path, sim_cmds):
+        err_msg = "❌ AsyncCommands: Running the commands with asyncio failed"
+        server, nr_inv = load_sim_nornir(str(tmp_path), {})
+        cmds = ["show version", "show ip arp"]
+        history = CmdHistory(str(tmp_path))
+        try:
+            async_cmds = nornir_async.AsyncCommands(nr_inv, history=history)
+            actual_result = async_cmds.run_cmds(dict(SIM0000=cmds, SIM0001=cmds))
+        finally:
+            server.stop()
+        assert actual_result["SIM0001"]["show version"] == "Cisco ASA SIM0001", err_msg
+        arp = actual_result["SIM0000"]["show ip arp"].splitlines()
+        assert len(arp) == 5 and arp[0].startswith("arp  0     SIM0000"), err_msg
+        err_msg = "❌ AsyncCommands: Paging must be disabled with the platforms command"
+        assert ("SIM0000", "terminal length 0") in sim_cmds, err_msg
+        assert ("SIM0001", "terminal pager 0") in sim_cmds, err_msg
+        assert sim_cmds.index(("SIM0001", "terminal pager 0")) < sim_cmds.index(
+            ("SIM0001", "show version")
+        ), err_msg
+        err_msg = "❌ AsyncCommands: Commands run must be added to the history"
+        stats = history.history["cisco_asa_ssh"]["show ip arp"]
+        assert len(stats["secs"]) == 1 and stats["bytes"][0] > 0, err_msg
+
+    # 1b. Testing a host that can't be connected to only fails that host
+    def test_failed_host(self, tmp_path, sim_cmds):
+        err_msg = "❌ AsyncCommands: A failed host must only fail that host"
+        server, nr_inv = load_sim_nornir(str(tmp_path), {}, "SIM0002")
+        host_cmds = dict(SIM0000=["show vrf"], SIM0001=[], SIM0002=["show vrf"])
+        try:
+            actual_result = nornir_async.AsyncCommands(nr_inv).run_cmds(host_cmds)
+        finally:
+            server.stop()
+        # Hosts with no commands aren't connected to
+        assert sorted(actual_result) == ["SIM0000", "SIM0002"], err_msg
+        assert isinstance(actual_result["SIM0002"], OSError), err_msg
+        assert actual_result["SIM0000"]["show vrf"].startswith("vrf  0"), err_msg
+
+    # 1c. Testing a command slower than its read timeout fails the host and is recorded as timed out
+    def test_timeout(self, tmp_path, sim_cmds, monkeypatch):
+        err_msg = "❌ AsyncCommands: A command that times out must fail the host"
+        monkeypatch.setattr(nornir_async, "read_timeout", 0.5)
+        server, nr_inv = load_sim_nornir(str(tmp_path), dict(latency=2, jitter=0))
+        history = CmdHistory(str(tmp_path))
+        try:
+            async_cmds = nornir_async.AsyncCommands(nr_inv, history=history)
+            actual_result = async_cmds.run_cmds(dict(SIM0000=["show ip route"]))
+        finally:
+            server.stop()
+        assert isinstance(actual_result["SIM0000"], asyncio.TimeoutError), err_msg
+        assert history.history["cisco_ios"]["show ip route"]["timeouts"] == 1, err_msg
+
+    # 1d. Testing the output is normalised the same as netmiko, linefeeds to '\n' and ANSI escape codes removed
+    def test_clean_output(self):
+        err_msg = "❌ AsyncCommands: Output must be normalised the same as netmiko"
+        async_cmds = nornir_async.AsyncCommands(None)
+        output = (
+            "\x1b[2Kvrf  0\r\nvrf  1\x1b[K\r\r\n\x1b[00;32mvrf  2\x1b[0m\x1bEvrf  3\r"
+        )
+        expected_result = "vrf  0\nvrf  1\nvrf  2\nvrf  3\n"
+        assert async_cmds.clean_output(output) == expected_result, err_msg
+        expected_result = "--More--\n\nend"
+        assert async_cmds.clean_output("--More--\x1b[2Lend") == expected_result, err_msg
+
+
+# ----------------------------------------------------------------------------
+# Journal whose lookup of a host fails, so that hosts plan fails
+# ----------------------------------------------------------------------------
+class FailedJournal:
+    def is_done(self, host):
+        if host == "SIM0001":
+            raise OSError("Journal unreadable")
+        return False
+
+    def saved_outputs(self, host):
+        return {}
+
+
+# ----------------------------------------------------------------------------
+# 2. ASYNC_ENGINE: Testing of gathering the hosts outputs a chunk of hosts at a time
+# ----------------------------------------------------------------------------
+class TestAsyncEngine:
+
+    # 2a. Testing each chunk only holds its hosts outputs and a host whose plan failed gets its error rather than crashing the run
+    def test_async_engine(self, tmp_path, sim_cmds, monkeypatch):
+        err_msg = "❌ async_engine: Gathering the outputs a chunk at a time failed"
+        monkeypatch.setattr(nornir_async, "gather_hosts", 1)
+        server, nr_inv = load_sim_nornir(str(tmp_path), {})
+        data = dict(
+            input_data=dict(all=dict(cmd_vital=["show vrf"])), journal=FailedJournal()
+        )
+        nr_eng = NornirEngine(nr_inv, data)
+        try:
+            chunks = [
+                (list(x.inventory.hosts), dict(nr_eng.gathered[y["chunk"]]), y)
+                for x, y in nr_eng.async_engine("vital", data, nr_inv)
+            ]
+        finally:
+            server.stop()
+        assert [x[0] for x in chunks] == [["SIM0000"], ["SIM0001"]], err_msg
+        # Only the chunk number is passed to the tasks (nornir logs their kwargs), each chunks outputs are released once run
+        assert [x[2].get("gathered") for x in chunks] == [None, None], err_msg
+        assert nr_eng.gathered == {}, err_msg
+        assert list(chunks[0][1]["SIM0000"]) == ["show vrf"], err_msg
+        err_msg = "❌ async_engine: A host whose plan failed must get its error"
+        assert list(chunks[1][1]) == ["SIM0001"], err_msg
+        assert isinstance(chunks[1][1]["SIM0001"], OSError), err_msg
+        assert "SIM0001" not in nr_inv.data.failed_hosts, err_msg
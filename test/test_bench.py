@@ -0,0 +1,40 @@
+from nornir_bench import find_regressions, percentile, run_bench
+
+
+# ----------------------------------------------------------------------------
+# 1. BENCH: Testing of the benchmark against the simulated hosts
+# ----------------------------------------------------------------------------
+class TestNornirBench:
+
+    # 1a. Testing the nearest-rank percentile and finding results worse than the baseline
+    def test_percentile_regressions(self):
+        err_msg = "❌ percentile: Getting the percentile failed"
+        values = [x / 100 for x in range(1, 101)]
+        actual_result = [
+            percentile(values, 50),
+            percentile(values, 99),
+            percentile([], 99),
+        ]
+        assert actual_result == [0.5, 0.99, 0.0], err_msg
+        err_msg = (
+            "❌ find_regressions: Finding the regressions against the baseline failed"
+        )
+        run = dict(run_type="print", hosts_sec=10, p99_ms=100)
+        baseline = dict(runs=[run])
+        report = dict(runs=[dict(run, hosts_sec=8.5, p99_ms=130)])
+        actual_result = find_regressions(report, baseline, 20)
+        assert len(actual_result) == 1 and "p99" in actual_result[0], err_msg
+        assert find_regressions(report, dict(runs=[]), 20) == [], err_msg
+
+    # 1b. Testing the pre and post test are run against all the simulated hosts and the diffs of both are timed
+    def test_run_bench(self):
+        err_msg = "❌ run_bench: Benchmarking the simulated hosts failed"
+        report = run_bench(2, ["pre_test", "post_test"], dict(latency=0, change=0.5))
+        actual_result = [
+            (x["run_type"], x["hosts"], x["failed"]) for x in report["runs"]
+        ]
+        desired_result = [("pre_test", 2, 0), ("post_test", 2, 0), ("diff", 2, 0)]
+        assert actual_result == desired_result, err_msg
+        # Pre-test runs the config, print, vital and detail commands once each
+        assert report["runs"][0]["cmds"] == 2 * 7, err_msg
+        assert report["runs"][1]["p99_ms"] >= report["runs"][1]["p50_ms"] > 0, err_msg
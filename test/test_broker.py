@@ -0,0 +1,172 @@
+import pytest
+import os
+import json
+import socket
+import tempfile
+import threading
+from nornir import InitNornir
+from main import NornirCommands
+import nornir_broker
+from nornir_broker import BrokerClient, BrokerSessions, check_socket_dir, start_server
+from nornir_sim import SimServer, build_inventory
+
+
+# ----------------------------------------------------------------------------
+# Fixture to start the connection broker on a temporary socket
+# ----------------------------------------------------------------------------
+@pytest.fixture(scope="class")
+def load_broker():
+    global client, sessions
+    tmp_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(tmp_dir, "broker.sock")
+    server = start_server(socket_path)
+    sessions = BrokerSessions(idle_timeout=1, keepalive=1)
+    server.sessions = sessions
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = BrokerClient(socket_path)
+    yield client
+    server.shutdown()
+    server.server_close()
+    os.remove(socket_path)
+    os.rmdir(tmp_dir)
+
+
+# ----------------------------------------------------------------------------
+# 1. BROKER: Testing of the connection broker requests and sessions
+# ----------------------------------------------------------------------------
+@pytest.mark.usefixtures("load_broker")
+class TestConnBroker:
+
+    # 1a. Testing sessions are only shared by hosts with the same address, user, platform and password
+    def test_get_session(self):
+        err_msg = "❌ get_session: Sharing of a session between requests failed"
+        host = dict(
+            hostname="10.10.20.1",
+            port=22,
+            username="u1",
+            password="pw",
+            platform="cisco_ios",
+        )
+        session = sessions.get_session(host)
+        assert sessions.get_session(dict(host, extras={})) is session, err_msg
+        err_msg = "❌ get_session: Separate session for a different user failed"
+        assert sessions.get_session(dict(host, username="u2")) is not session, err_msg
+        err_msg = "❌ get_session: A wrong password must not reuse the session"
+        other = sessions.get_session(dict(host, password="wrong"))
+        assert other is not session, err_msg
+        assert "pw" not in str(list(sessions.sessions)), err_msg
+        with sessions.lock:
+            del sessions.sessions[sessions.session_key(dict(host, password="wrong"))]
+
+    # 1b. Testing status request returns the sessions held by the broker
+    def test_status(self):
+        err_msg = "❌ status: Getting the status of the broker sessions failed"
+        actual_result = client.request(dict(action="status"))["status"]
+        desired_result = ["u1", "u2"]
+        assert sorted(x["username"] for x in actual_result) == desired_result, err_msg
+
+    # 1c. Testing idle sessions with no open connection are removed by the keepalive
+    def test_keepalive_sessions(self):
+        err_msg = (
+            "❌ keepalive_sessions: Removal of sessions without a connection failed"
+        )
+        sessions.keepalive_sessions()
+        assert client.request(dict(action="status"))["status"] == [], err_msg
+
+    # 1d. Testing a session replaced while the keepalive checked it isn't removed
+    def test_keepalive_replaced(self):
+        err_msg = "❌ keepalive_sessions: A replaced session must not be removed"
+        host = dict(hostname="10.10.20.2", username="u1", platform="cisco_ios")
+        key = sessions.session_key(host)
+        old_session = sessions.get_session(host)
+        lock = old_session["lock"]
+
+        # Another request replaces the session after the keepalive listed the sessions
+        class ReplacingLock:
+            def acquire(self, blocking=True):
+                with sessions.lock:
+                    del sessions.sessions[key]
+                sessions.get_session(host)["last_used"] = 0
+                return lock.acquire(blocking)
+
+            def release(self):
+                lock.release()
+
+        old_session["lock"] = ReplacingLock()
+        sessions.keepalive_sessions()
+        assert sessions.sessions.get(key) not in [None, old_session], err_msg
+        sessions.keepalive_sessions()
+        assert sessions.sessions == {}, err_msg
+
+    # 1e. Testing errors from the broker are raised by the client, a malformed request gets an error reply rather than the connection being dropped
+    def test_request_error(self):
+        with pytest.raises(ConnectionError, match="KeyError"):
+            client.request(dict(cmds=["show clock"]))
+        err_msg = "❌ handle: A malformed request must get an error reply"
+        for each_request in [b"not json\n", b"\n"]:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(client.socket_path)
+                sock.sendall(each_request)
+                actual_result = json.loads(sock.makefile("rb").readline())
+            assert actual_result["error"].startswith("JSONDecodeError"), err_msg
+
+    # 1f. Testing a hosts commands are run by the broker when NornirCommands is given its socket, reusing the session for the next run
+    def test_nornir_run_cmds(self, tmp_path):
+        err_msg = "❌ run_cmds: Running the commands through the broker failed"
+        server = SimServer(dict(SIM0000="ios"), dict(latency=0, lines=3), 0)
+        inv_files = build_inventory(str(tmp_path), dict(SIM0000="ios"), server.start())
+        nr_inv = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {"host_file": inv_files[0], "group_file": inv_files[1]},
+            }
+        )
+        nr_inv.inventory.defaults.username = "u1"
+        nr_inv.inventory.defaults.password = "pw"
+        plan = dict(print=["show version"], vital=["show ip arp", "show version"])
+        data = dict(broker=client.socket_path)
+
+        def run_cmds(task):
+            return NornirCommands(task).run_cmds(plan, data)
+
+        try:
+            results = [nr_inv.run(task=run_cmds)["SIM0000"] for x in range(2)]
+            session = list(sessions.sessions.values())[0]
+            assert len(sessions.sessions) == 1, err_msg
+            assert session["conn"] != None and session["conn"].is_alive(), err_msg
+        finally:
+            sessions.close()
+            server.stop()
+        for result in results:
+            assert result.failed == False, err_msg
+            outputs = result[0].result
+            assert list(outputs) == ["show version", "show ip arp"], err_msg
+            assert len(outputs["show ip arp"].splitlines()) == 3, err_msg
+            # Each command is added to nornir as a subtask
+            assert [x.name for x in result[1:]] == list(outputs), err_msg
+
+    # 1g. Testing the socket is only created in a folder only the user can write to and can only be connected to by the user
+    def test_socket_access(self, tmp_path, monkeypatch):
+        err_msg = "❌ check_socket_dir: The default socket folder must only be accessible by the user"
+        default_dir = str(tmp_path / "nornir_checks")
+        monkeypatch.setattr(nornir_broker, "socket_directory", default_dir)
+        assert check_socket_dir(os.path.join(default_dir, "b.sock")) == None, err_msg
+        assert os.stat(default_dir).st_mode & 0o777 == 0o700, err_msg
+        err_msg = "❌ check_socket_dir: A folder others can write to must be refused"
+        shared_dir = tmp_path / "shared"
+        shared_dir.mkdir()
+        shared_dir.chmod(0o1777)
+        actual_result = check_socket_dir(str(shared_dir / "b.sock"))
+        assert "only writable by you" in actual_result, err_msg
+        err_msg = "❌ start_server: The socket must only be accessible by the user"
+        socket_path = os.path.join(default_dir, "b.sock")
+        for each_start in range(2):
+            server = start_server(socket_path)
+            server.server_close()
+        assert os.stat(socket_path).st_mode & 0o077 == 0, err_msg
+        err_msg = "❌ start_server: A file that isn't a socket must not be removed"
+        os.remove(socket_path)
+        open(socket_path, "w").close()
+        with pytest.raises(FileExistsError):
+            start_server(socket_path)
+        assert os.path.isfile(socket_path), err_msg
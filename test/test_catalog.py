@@ -0,0 +1,103 @@
+import pytest
+import os
+import shutil
+import tempfile
+from nornir_catalog import SnapshotCatalog
+
+
+# ----------------------------------------------------------------------------
+# Fixture to create the catalog in a temporary output folder with files saved by 3 runs
+# ----------------------------------------------------------------------------
+@pytest.fixture(scope="class")
+def load_catalog():
+    global output_fldr, files
+    output_fldr = tempfile.mkdtemp()
+    files = {}
+    for each_run in ["run1", "run2", "run3"]:
+        catalog = SnapshotCatalog(output_fldr, each_run)
+        file_name = f"R1_vital_{each_run}.txt"
+        files[each_run] = os.path.join(output_fldr, file_name)
+        open(files[each_run], "w").close()
+        catalog.add("R1", "vital", file_name, files[each_run])
+    yield
+    shutil.rmtree(output_fldr)
+
+
+# ----------------------------------------------------------------------------
+# 1. CATALOG: Testing of finding the files to compare from the catalog
+# ----------------------------------------------------------------------------
+@pytest.mark.usefixtures("load_catalog")
+class TestSnapshotCatalog:
+
+    # 1a. Testing the latest 2 files are got newest first, and no files for unknown hosts
+    def test_latest_files(self):
+        err_msg = "❌ cmp_files: Getting the latest 2 files from the catalog failed"
+        catalog = SnapshotCatalog(output_fldr)
+        actual_result = catalog.cmp_files("R1", "vital")
+        assert actual_result == [files["run3"], files["run2"]], err_msg
+        assert catalog.cmp_files("R2", "vital") == [], err_msg
+
+    # 1b. Testing the files of 2 run IDs, or a run ID and the latest, are got
+    def test_run_files(self):
+        err_msg = (
+            "❌ cmp_files: Getting the files of the run IDs from the catalog failed"
+        )
+        catalog = SnapshotCatalog(output_fldr)
+        actual_result = catalog.cmp_files("R1", "vital", ["run1", "run2"])
+        assert actual_result == [files["run2"], files["run1"]], err_msg
+        # The run IDs can be given in any order
+        actual_result = catalog.cmp_files("R1", "vital", ["run2", "run1"])
+        assert actual_result == [files["run2"], files["run1"]], err_msg
+        actual_result = catalog.cmp_files("R1", "vital", ["run3", "run1"])
+        assert actual_result == [files["run3"], files["run1"]], err_msg
+        actual_result = catalog.cmp_files("R1", "vital", ["run1"])
+        assert actual_result == [files["run3"], files["run1"]], err_msg
+
+    # 1c. Testing overwritten files are only in the catalog once and deleted files are skipped
+    def test_changed_files(self):
+        err_msg = "❌ add: Overwritten or deleted files not handled by the catalog"
+        SnapshotCatalog(output_fldr, "run4").add(
+            "R1", "vital", "R1_vital_run2.txt", files["run2"]
+        )
+        os.remove(files["run3"])
+        actual_result = SnapshotCatalog(output_fldr).cmp_files("R1", "vital")
+        assert actual_result == [files["run2"], files["run1"]], err_msg
+        err_msg = "❌ runs: Listing the runs in the catalog failed"
+        actual_result = [x["run_id"] for x in SnapshotCatalog(output_fldr).runs()]
+        assert actual_result == ["run1", "run3", "run4"], err_msg
+
+    # 1d. Testing the baseline is the file of the run ID (else the latest) with its hashes, None if there is no file
+    def test_baseline(self):
+        err_msg = "❌ baseline: Getting the baseline file from the catalog failed"
+        catalog = SnapshotCatalog(output_fldr, "run5")
+        path = os.path.join(output_fldr, "R2_vital_run5.txt")
+        open(path, "w").close()
+        catalog.add_sections(
+            catalog.add("R2", "vital", "R2_vital_run5.txt", path), dict(cmd1="abc")
+        )
+        actual_result = catalog.baseline("R2", "vital")
+        desired_result = dict(path=path, output=dict(cmd1="abc"), fingerprint={})
+        assert actual_result == desired_result, err_msg
+        actual_result = catalog.baseline("R1", "vital", "run1")["path"]
+        assert actual_result == files["run1"], err_msg
+        assert catalog.baseline("R1", "vital", "run9") == None, err_msg
+        assert catalog.baseline("R3", "vital") == None, err_msg
+
+    # 1e. Testing the schema is only created by the first connection to the catalog, even from other catalog objects
+    def test_schema(self, tmp_path, monkeypatch):
+        err_msg = "❌ connect: The schema must only be created once per catalog"
+        create_schema = SnapshotCatalog.create_schema
+        created = []
+
+        def count_schema(self, conn):
+            created.append(self.path)
+            create_schema(self, conn)
+
+        monkeypatch.setattr(SnapshotCatalog, "create_schema", count_schema)
+        catalog = SnapshotCatalog(str(tmp_path))
+        catalog.cmp_files("R1", "vital")
+        catalog.history("R1", "vital", 3)
+        SnapshotCatalog(str(tmp_path), "run1").add("R1", "vital", "f1", "f1")
+        assert created == [os.path.join(str(tmp_path), "catalog.db")], err_msg
+        SnapshotCatalog(output_fldr).cmp_files("R1", "vital")
+        assert len(created) == 1, err_msg
@@ -0,0 +1,102 @@
+import os
+import time
+import nornir_diff
+from nornir_diff import split_sections, diff_opcodes, diff_files, section_rows
+from nornir_diff import make_html, write_assets
+from nornir_store import format_cmd
+
+test_directory = os.path.dirname(__file__)
+working_dir = os.path.join(test_directory, "test_files")
+
+
+# ----------------------------------------------------------------------------
+# 1. DIFF: Testing of the section aware diff engine
+# ----------------------------------------------------------------------------
+class TestNornirDiff:
+
+    # 1a. Testing saved files are split into a section per command
+    def test_split_sections(self):
+        err_msg = "❌ split_sections: Splitting file into command sections failed"
+        lines = (format_cmd("show vrf", "vrf") + format_cmd("show arp", "arp")).split(
+            "\n"
+        )
+        sections = split_sections([x + "\n" for x in lines])
+        actual_result = [(x["cmd"], x["start"]) for x in sections]
+        assert actual_result == [("show vrf", 0), ("show arp", 4)], err_msg
+
+    # 1b. Testing the Myers line diff opcodes rebuild the post lines
+    def test_diff_opcodes(self):
+        err_msg = "❌ diff_opcodes: Line diff opcodes are incorrect"
+        pre = ["a", "b", "c", "a", "b", "b", "a"]
+        post = ["c", "b", "a", "b", "a", "c"]
+        opcodes = diff_opcodes(pre, post)
+        actual_result = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            actual_result.extend(pre[i1:i2] if tag == "equal" else post[j1:j2])
+        equal = sum(i2 - i1 for tag, i1, i2, j1, j2 in opcodes if tag == "equal")
+        # Longest common subsequence of the 2 lists is 4 lines
+        assert actual_result == post and equal == 4, err_msg
+        # A large section that changed completely is a replace rather than searched line by line
+        err_msg = "❌ diff_opcodes: A completely changed large section must be quick"
+        pre = [f"route {x} via 10.0.0.1" for x in range(10000)]
+        post = [f"route {x} via 10.0.0.2" for x in range(10000)]
+        begin = time.perf_counter()
+        opcodes = diff_opcodes(["header"] + pre, ["header"] + post)
+        assert time.perf_counter() - begin < 5, err_msg
+        desired_result = [("equal", 0, 1, 0, 1), ("replace", 1, 10001, 1, 10001)]
+        assert opcodes == desired_result, err_msg
+
+    # 1c. Testing only sections that changed are diffed
+    def test_diff_files(self):
+        err_msg = "❌ diff_files: Detecting changed command sections failed"
+        pre = open(os.path.join(working_dir, "R1_vital-comp1.txt")).readlines()
+        post = open(os.path.join(working_dir, "R1_vital-comp2.txt")).readlines()
+        actual_result = [x["status"] for x in diff_files(pre, post)]
+        assert actual_result == ["changed", "identical", "changed"], err_msg
+
+    # 1d. Testing large changed sections diffed in the process pool are the same as diffed in process
+    def test_diff_pool(self):
+        err_msg = "❌ diff_files: Diffing sections in the process pool failed"
+        pre = format_cmd("show route", "\n".join(f"route {x}" for x in range(3000)))
+        post = pre.replace("route 1500\n", "route 1500 changed\n")
+        pre, post = (pre.splitlines(True), post.splitlines(True))
+        desired_result = diff_files(pre, post)
+        nornir_diff.start_pool(2)
+        try:
+            actual_result = diff_files(pre, post)
+        finally:
+            nornir_diff.close_pool()
+        assert actual_result == desired_result, err_msg
+
+    # 1e. Testing compact reports only have the changes and context lines and link to the shared assets
+    def test_compact_html(self, tmp_path):
+        err_msg = "❌ section_rows: Compact rows of only the changes and context failed"
+        pre = format_cmd("show route", "\n".join(f"route {x}" for x in range(3000)))
+        post = pre.replace("route 1500\n", "route 1500 changed\n")
+        diffs = diff_files(pre.splitlines(True), post.splitlines(True))
+        rows = section_rows(diffs[0], 3)
+        folds = [x for x in rows if 'class="diff_fold"' in x]
+        # Fold, 3 context lines, changed line, 3 context lines, fold
+        assert len(rows) == 9 and len(folds) == 2, err_msg
+        err_msg = "❌ make_html: Compact report not linked to the shared assets"
+        write_assets(str(tmp_path))
+        actual_result = make_html(diffs, "pre.txt", "post.txt", 3)
+        assert f'href="{nornir_diff.css_asset}"' in actual_result, err_msg
+        assert "<style" not in actual_result, err_msg
+        err_msg = "❌ write_assets: Writing the shared CSS and JS files failed"
+        assert sorted(os.listdir(tmp_path)) == [
+            "diff_report.css",
+            "diff_report.js",
+        ], err_msg
+
+    # 1f. Testing the commands whose sections changed are returned with the diff file
+    def test_diff_changes(self, tmp_path):
+        err_msg = "❌ create_diff_file: Getting the changed commands failed"
+        changes = []
+        nornir_diff.create_diff_file(
+            os.path.join(working_dir, "R1_vital-comp1.txt"),
+            os.path.join(working_dir, "R1_vital-comp2.txt"),
+            str(tmp_path),
+            changes=changes,
+        )
+        assert changes == ["show ip int brief", "show ip route summary"], err_msg
@@ -0,0 +1,110 @@
+import os
+import yaml
+import nornir_incremental
+from nornir_catalog import SnapshotCatalog, output_hash
+from nornir_incremental import IncrementalCmds, read_outputs
+from nornir_store import SnapshotStore, StoreFile, format_cmd
+
+
+# ----------------------------------------------------------------------------
+# Saves a vital file (text or store) and adds it to the catalog with its output and fingerprint hashes
+# ----------------------------------------------------------------------------
+def save_vital(output_fldr, run_id, outputs, fingerprint, store=None):
+    catalog = SnapshotCatalog(output_fldr, run_id)
+    file_name = f"R1_vital_{run_id}.txt"
+    if store != None:
+        path = store.manifest_path(file_name)
+        store_file = StoreFile(store, file_name)
+        for each_cmd, output in outputs.items():
+            store_file.write_cmd(each_cmd, output)
+        store_file.close()
+    else:
+        path = os.path.join(output_fldr, file_name)
+        with open(path, "w") as vital_file:
+            for each_cmd, output in outputs.items():
+                vital_file.write(format_cmd(each_cmd, output))
+    snapshot_id = catalog.add("R1", "vital", file_name, path)
+    catalog.add_sections(snapshot_id, {x: output_hash(y) for x, y in outputs.items()})
+    fp_hashes = {x: output_hash(y) for x, y in fingerprint.items()}
+    catalog.add_sections(snapshot_id, fp_hashes, "fingerprint")
+    return fp_hashes
+
+
+# ----------------------------------------------------------------------------
+# 1. INCREMENTAL: Testing of deciding which vital commands can reuse their saved output
+# ----------------------------------------------------------------------------
+class TestNornirIncremental:
+
+    # 1a. Testing outputs are read back from text and store files as they were saved
+    def test_read_outputs(self, tmp_path):
+        err_msg = "❌ read_outputs: Reading saved outputs failed"
+        outputs = {"show version": "ver 1\nuptime 2", "show ip int brief": "Gi0/1 up\n"}
+        save_vital(str(tmp_path), "run1", outputs, {})
+        actual_result = read_outputs(os.path.join(tmp_path, "R1_vital_run1.txt"))
+        assert actual_result == outputs, err_msg
+        store = SnapshotStore(str(tmp_path))
+        save_vital(str(tmp_path), "run2", outputs, {}, store)
+        actual_result = read_outputs(store.manifest_path("R1_vital_run2.txt"))
+        assert actual_result == outputs, err_msg
+
+    # 1b. Testing commands are only stable if unchanged in the latest files (or static) and the fingerprint is the same
+    def test_stable_cmds(self, tmp_path, monkeypatch):
+        err_msg = "❌ stable_cmds: Learning the stable commands failed"
+        monkeypatch.setattr(nornir_incremental, "stable_runs", 2)
+        fingerprint = {"show checksum": "abc"}
+        for each_run, num in [("run1", "1"), ("run2", "2")]:
+            outputs = {"show version": "ver 1", "show ip route": num, "show clock": num}
+            fp_hashes = save_vital(str(tmp_path), each_run, outputs, fingerprint)
+        catalog = SnapshotCatalog(str(tmp_path))
+        inc_cfg = dict(static=["show clock"])
+        inc_cmds = IncrementalCmds(catalog, "R1", "cisco_ios", inc_cfg)
+        actual_result = inc_cmds.stable_cmds(
+            ["show version", "show ip route", "show clock"]
+        )
+        assert actual_result == ["show version", "show clock"], err_msg
+        actual_result = inc_cmds.reuse_outputs(actual_result)
+        assert actual_result == {"show version": "ver 1", "show clock": "2"}, err_msg
+        err_msg = "❌ unchanged: Comparing the fingerprint failed"
+        assert inc_cmds.unchanged(fp_hashes) == True, err_msg
+        assert (
+            inc_cmds.unchanged({"show checksum": output_hash("xyz")}) == False
+        ), err_msg
+        assert (
+            inc_cmds.fingerprint_cmds()
+            == nornir_incremental.fingerprint_cmds["cisco_ios"]
+        ), err_msg
+        # Hosts without any saved vital files have nothing stable
+        inc_cmds = IncrementalCmds(catalog, "R2", "cisco_ios", inc_cfg)
+        assert inc_cmds.stable_cmds(["show clock"]) == [], err_msg
+        assert inc_cmds.unchanged(fp_hashes) == False, err_msg
+
+    # 1c. Testing the platforms of the inventory groups (such as cisco_nxos_ssh) get their fingerprint commands
+    def test_fingerprint_platforms(self, tmp_path):
+        err_msg = "❌ fingerprint_cmds: The inventory platforms must have fingerprint commands"
+        groups_file = os.path.join(
+            os.path.dirname(__file__), "..", "inventory", "groups.yml"
+        )
+        with open(groups_file) as inv_file:
+            groups = yaml.load(inv_file, Loader=yaml.FullLoader)
+        catalog = SnapshotCatalog(str(tmp_path))
+        for each_grp in ["ios", "iosxe", "nxos", "asa"]:
+            platform = groups[each_grp]["connection_options"]["netmiko"]["platform"]
+            inc_cmds = IncrementalCmds(catalog, "R1", platform)
+            assert len(inc_cmds.fingerprint_cmds()) != 0, f"{err_msg} ({platform})"
+        actual_result = IncrementalCmds(catalog, "R1", "cisco_iosxe").fingerprint_cmds()
+        assert actual_result == nornir_incremental.fingerprint_cmds["cisco_xe"], err_msg
+        assert IncrementalCmds(catalog, "R1", None).fingerprint_cmds() == [], err_msg
+
+    # 1d. Testing the vital file of the run itself (already saved by a resumed run) isn't used as history
+    def test_resumed_history(self, tmp_path):
+        err_msg = "❌ IncrementalCmds: The files of the run must not be its history"
+        save_vital(str(tmp_path), "run1", {"show version": "ver 1"}, {})
+        save_vital(str(tmp_path), "run2", {}, {})
+        catalog = SnapshotCatalog(str(tmp_path), "run2")
+        inc_cmds = IncrementalCmds(catalog, "R1", "cisco_ios")
+        actual_result = [os.path.basename(x["path"]) for x in inc_cmds.history]
+        assert actual_result == ["R1_vital_run1.txt"], err_msg
+        actual_result = IncrementalCmds(
+            SnapshotCatalog(str(tmp_path)), "R1", "cisco_ios"
+        )
+        assert len(actual_result.history) == 2, err_msg
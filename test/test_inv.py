@@ -0,0 +1,74 @@
+import os
+import shutil
+import yaml
+from nornir.plugins.inventory.simple import SimpleInventory
+from nornir_inv import BuildInventory, CachedInventory
+
+test_directory = os.path.dirname(__file__)
+test_inventory = os.path.join(test_directory, "test_inventory")
+
+
+# ----------------------------------------------------------------------------
+# 1. INV_CACHE: Testing of loading the inventory from the cached snapshot
+# ----------------------------------------------------------------------------
+class TestCachedInventory:
+
+    # 1a. Testing the cached inventory is the same as SimpleInventory and is used until the files change
+    def test_load(self, tmp_path, monkeypatch):
+        err_msg = "❌ CachedInventory: Loading the inventory from the cache failed"
+        monkeypatch.setenv("CACHE_DIRECTORY", str(tmp_path / "cache"))
+        for each_file in ["hosts.yml", "groups.yml"]:
+            shutil.copy(os.path.join(test_inventory, each_file), tmp_path)
+        inv_files = [str(tmp_path / "hosts.yml"), str(tmp_path / "groups.yml")]
+        nr_inv = BuildInventory().load_inventory(inv_files[0], inv_files[1])
+        desired_result = SimpleInventory(inv_files[0], inv_files[1]).load()
+        assert nr_inv.inventory.dict() == desired_result.dict(), err_msg
+        assert os.path.exists(CachedInventory(*inv_files).path), err_msg
+        # Unchanged files (even if the modified time changed) are not parsed again
+        os.utime(inv_files[0])
+        with monkeypatch.context() as m:
+            m.setattr(SimpleInventory, "load", None)
+            cached_inv = CachedInventory(*inv_files).load()
+        assert cached_inv.dict() == desired_result.dict(), err_msg
+        err_msg = "❌ CachedInventory: Changed inventory files not loaded again"
+        with open(inv_files[0], "a") as hosts_file:
+            hosts_file.write("R9:\n  hostname: 10.10.20.9\n")
+        assert "R9" in CachedInventory(*inv_files).load().hosts, err_msg
+
+    # 1b. Testing the indexed filters match the same hosts as nornir F filters, with no limit on the number of hostname terms
+    def test_filter_inventory(self, tmp_path, monkeypatch):
+        err_msg = "❌ filter_inventory: Filtering the inventory by index failed"
+        monkeypatch.setenv("CACHE_DIRECTORY", str(tmp_path / "cache"))
+        shutil.copy(os.path.join(test_inventory, "groups.yml"), tmp_path)
+        hosts = {}
+        for num in range(12):
+            hosts[f"SW{num:02d}"] = dict(
+                hostname=f"10.10.20.{num}",
+                groups=["ios"] if num % 2 == 0 else ["nxos"],
+                data=dict(
+                    Infra_Location="DC1" if num < 6 else "DC2",
+                    type="switch",
+                    IOSVersion=f"17.{num % 3}.1",
+                ),
+            )
+        with open(tmp_path / "hosts.yml", "w") as hosts_file:
+            yaml.dump(hosts, hosts_file)
+        build_inv = BuildInventory()
+        nr_inv = build_inv.load_inventory(
+            str(tmp_path / "hosts.yml"), str(tmp_path / "groups.yml")
+        )
+        args = dict(
+            hostname=" ".join(f"SW{x:02d}" for x in range(12)),
+            group=["ios"],
+            location=["DC2", "DC3"],
+            version="17.0",
+        )
+        actual_result = list(build_inv.filter_inventory(args, nr_inv).inventory.hosts)
+        assert actual_result == ["SW06"], err_msg
+        # Cached index gives the same result
+        actual_result = build_inv.filter_inventory(args, nr_inv).inventory.hosts
+        assert list(actual_result) == ["SW06"], err_msg
+        actual_result = build_inv.filter_inventory(dict(hostname="W1 x"), nr_inv)
+        assert list(actual_result.inventory.hosts) == ["SW10", "SW11"], err_msg
+        actual_result = build_inv.filter_inventory(dict(type=["router"]), nr_inv)
+        assert list(actual_result.inventory.hosts) == [], err_msg
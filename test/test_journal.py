@@ -0,0 +1,63 @@
+import os
+from nornir_journal import RunJournal, latest_journal, prune_journals
+from main import OutputFiles
+
+
+# ----------------------------------------------------------------------------
+# 1. JOURNAL: Testing of recording the units a run saved and resuming from them
+# ----------------------------------------------------------------------------
+class TestRunJournal:
+
+    # 1a. Testing saved outputs are journalled, reused if unchanged and a resumed run saves to the same file
+    def test_saved_outputs(self, tmp_path):
+        err_msg = "❌ RunJournal: Journalling the saved command outputs failed"
+        plan = dict(vital=["show arp", "show vrf", "show clock"])
+        journal = RunJournal(str(tmp_path), "vital", "run1")
+        save_files = OutputFiles("R1", str(tmp_path), plan, journal=journal)
+        save_files.write("show arp", "arp_output")
+        save_files.write("show vrf", "vrf_output")
+        save_files.close()
+        # A line cut short by the run being killed is ignored
+        with open(journal.path, "a") as journal_file:
+            journal_file.write('{"host": "R1", "file": "vit')
+        loaded = RunJournal.load(journal.path)
+        assert loaded.run_id == "run1" and loaded.complete == False, err_msg
+        actual_result = loaded.saved_outputs("R1")
+        desired_result = {"show arp": "arp_output", "show vrf": "vrf_output"}
+        assert actual_result == desired_result, err_msg
+        # Outputs changed since they were journalled are run again
+        err_msg = "❌ RunJournal: A changed output must not be reused"
+        vital_path = save_files.files["vital"]["path"]
+        content = open(vital_path).read().replace("vrf_output", "vrf_changed")
+        with open(vital_path, "w") as vital_file:
+            vital_file.write(content)
+        assert list(loaded.saved_outputs("R1")) == ["show arp"], err_msg
+        err_msg = "❌ OutputFiles: A resumed run must save to the file of the run"
+        resumed_files = OutputFiles("R1", str(tmp_path), plan, journal=loaded)
+        assert resumed_files.files["vital"]["path"] == vital_path, err_msg
+
+    # 1b. Testing a run is only complete if all hosts are done and only the latest journals are kept
+    def test_finish(self, tmp_path):
+        err_msg = "❌ RunJournal: Marking the run complete failed"
+        journal = RunJournal(str(tmp_path), "pre_test", "20240101-1000")
+        journal.host_done("R1")
+        journal.finish(["R1", "R2"])
+        assert RunJournal.load(journal.path).complete == False, err_msg
+        journal.host_done("R2")
+        journal.finish(["R1", "R2"])
+        loaded = RunJournal.load(journal.path)
+        assert loaded.complete == True and loaded.is_done("R2"), err_msg
+        err_msg = "❌ latest_journal: Getting the latest journal of the run type failed"
+        RunJournal(str(tmp_path), "pre_test", "20240102-1000").host_done("R1")
+        RunJournal(str(tmp_path), "post_test", "20240103-1000").host_done("R1")
+        actual_result = os.path.basename(latest_journal(str(tmp_path), "pre_test"))
+        assert actual_result == "journal_pre_test_20240102-1000.jsonl", err_msg
+        assert latest_journal(str(tmp_path), "vital") == None, err_msg
+        err_msg = "❌ prune_journals: Deleting the oldest journals failed"
+        prune_journals(str(tmp_path), 2)
+        actual_result = sorted(os.listdir(tmp_path))
+        desired_result = [
+            "journal_post_test_20240103-1000.jsonl",
+            "journal_pre_test_20240102-1000.jsonl",
+        ]
+        assert actual_result == desired_result, err_msg
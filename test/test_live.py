@@ -0,0 +1,88 @@
+import logging
+from types import SimpleNamespace
+from nornir.core.task import MultiResult, Result
+from nornir_live import DiffStage, LiveRenderer
+
+
+# ----------------------------------------------------------------------------
+# Result of a hosts nornir task (a MultiResult), is all the diff stage uses of it
+# ----------------------------------------------------------------------------
+def host_result(result, exception=None):
+    multi_result = MultiResult("cmd_engine")
+    multi_result.append(
+        Result(host=None, result=result, failed=exception != None, exception=exception)
+    )
+    return multi_result
+
+
+# ----------------------------------------------------------------------------
+# 1. DIFF_STAGE: Testing of diffing hosts as they finish collecting and printing their verdicts
+# ----------------------------------------------------------------------------
+class TestDiffStage:
+
+    # 1a. Testing the diff messages are added to the hosts result and a verdict printed as each host is diffed
+    def test_submit(self, capsys):
+        err_msg = "❌ DiffStage: Diffing the hosts in the diff stage failed"
+        stage = DiffStage()
+        results = [Result(host=None, result=f"✅ Saved R{x}") for x in range(3)]
+        jobs = [
+            lambda: (["✅ Created diff R0"], dict(vital=[], config=[])),
+            lambda: (["✅ Created diff R1"], dict(vital=["show vrf"])),
+            lambda: (["❌ Only 1 file"], dict(vital=None)),
+        ]
+        for num, each_job in enumerate(jobs):
+            stage.submit(f"R{num}", each_job, results[num])
+        stage.wait()
+        assert results[1].result == "✅ Saved R1\n✅ Created diff R1", err_msg
+        desired_result = {
+            "R0": "vital unchanged, config unchanged",
+            "R1": "vital changed (show vrf)",
+            "R2": "vital not compared",
+        }
+        assert stage.verdicts == desired_result, err_msg
+        assert "R1  vital changed (show vrf)" in capsys.readouterr().out, err_msg
+        # A diff that errors fails the host rather than the run
+        err_msg = "❌ DiffStage: A failed diff must only fail that host"
+        stage = DiffStage()
+        result = Result(host=None, result="✅ Saved R3")
+        stage.submit("R3", lambda: 1 / 0, result)
+        stage.wait()
+        assert result.failed == True and "ZeroDivisionError" in result.result, err_msg
+
+    # 1b. Testing a host that failed collecting has its verdict printed when its task completes
+    def test_failed_host(self, capsys):
+        err_msg = "❌ DiffStage: Printing the verdict of a failed host failed"
+        stage = DiffStage()
+        host = SimpleNamespace(name="R4")
+        stage.task_instance_completed(None, host, host_result("ok"))
+        assert stage.verdicts == {}, err_msg
+        result = host_result("Traceback", OSError("Socket is closed"))
+        stage.task_instance_completed(None, host, result)
+        assert stage.verdicts["R4"] == "failed collecting (OSError)", err_msg
+        assert "R4  failed collecting (OSError)" in capsys.readouterr().out, err_msg
+
+
+# ----------------------------------------------------------------------------
+# 2. LIVE: Testing of printing each host as it completes
+# ----------------------------------------------------------------------------
+class TestLiveRenderer:
+
+    # 2a. Testing each host is printed whole as it completes (only print commands) and its outputs then released
+    def test_render(self, capsys):
+        err_msg = "❌ LiveRenderer: Printing the host as it completes failed"
+        live = LiveRenderer()
+        result = host_result(None)
+        for each_cmd, sev_level in [
+            ("show clock", logging.INFO),
+            ("show vrf", logging.DEBUG),
+        ]:
+            cmd_result = Result(host=None, result=f"{each_cmd} output", name=each_cmd)
+            cmd_result.severity_level = sev_level
+            result.append(cmd_result)
+        live.task_instance_completed(None, SimpleNamespace(name="R1"), result)
+        actual_result = capsys.readouterr().out
+        assert "R1 | cmd_engine" in actual_result, err_msg
+        assert "show clock output" in actual_result, err_msg
+        assert "show vrf output" not in actual_result, err_msg
+        err_msg = "❌ LiveRenderer: Command outputs must be released once printed"
+        assert len(result) == 1 and live.rendered == ["R1"], err_msg
@@ -1,12 +1,20 @@
 import pytest
 import os
+import logging
+import sys
 import yaml
+import subprocess
 import shutil
 import nornir_inv
 from unittest.mock import patch
 from nornir import InitNornir
 from main import InputValidate
 from main import NornirCommands
+from main import OutputFiles
+from main import SessionLimits
+from main import StartupTimer
+from nornir_catalog import output_hash
+from nornir_sim import build_inventory
 
 
 # ----------------------------------------------------------------------------
@@ -127,6 +135,14 @@ class TestInputValidate:
         except SystemExit:
             pass
         assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+        # Test for input file with parse that is not a dictionary
+        err_msg = "❌ val_input_file: Test raising error if parse is not a dictionary"
+        desired_result = f"❌ {input_file} parse must be a dictionary of commands"
+        try:
+            input_val.val_input_file("pos", input_file, {"all": {}, "parse": []})
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
 
     # 1d. Testing method for adding extra arguments to argparser
     def test_add_arg_parser(self):
@@ -135,22 +151,42 @@ class TestInputValidate:
         tmp_args = input_val.add_arg_parser(build_inv)
         actual_result = vars(tmp_args.parse_args(["--print", "TEST"]))
         desired_result = {
+            "batch": False,
+            "broker": None,
+            "compact": None,
             "compare": None,
+            "conn_rate": None,
             "detail_save": None,
+            "diff_workers": None,
+            "engine": None,
             "username": None,
             "group": None,
+            "group_sessions": None,
             "hostname": None,
+            "incremental": False,
+            "list_runs": None,
             "location": None,
             "logical": None,
+            "low_memory": False,
             "post_test": None,
             "pre_test": None,
             "print": "TEST",
+            "report": None,
+            "restore": None,
+            "resume": False,
+            "run_ids": None,
             "show": False,
             "show_detail": False,
+            "spans": None,
+            "startup_time": False,
+            "store": False,
+            "structured": False,
             "type": None,
             # "validate": None,
             "version": None,
             "vital_save": None,
+            "watch": None,
+            "workers": None,
         }
         assert actual_result == desired_result, err_msg
 
@@ -213,6 +249,126 @@ class TestInputValidate:
         actual_result = input_val.val_noncompare_arg("pre", "test_files")
         assert actual_result == desired_result, err_msg
 
+    # 1h. Testing method for getting the run options from the args and environment variables
+    def test_get_run_opts(self, capsys):
+        # Test the group sessions are converted into a dict and that args take precedence over env vars
+        err_msg = "❌ get_run_opts: Creating the run options from args failed"
+        os.environ["NUM_WORKERS"] = "5"
+        os.environ["CONN_RATE"] = "2"
+        args = dict(workers=10, group_sessions=["wlc=2", "asa=5"])
+        actual_result = input_val.get_run_opts(args)
+        del os.environ["NUM_WORKERS"], os.environ["CONN_RATE"]
+        desired_result = dict(
+            batch=False,
+            broker=None,
+            engine=None,
+            store=False,
+            workers=10,
+            group_sessions=dict(wlc=2, asa=5),
+            conn_rate=2.0,
+            diff_workers=None,
+            compact=None,
+            structured=False,
+            run_ids=None,
+            incremental=False,
+            report=None,
+            spans=None,
+            resume=False,
+            low_memory=False,
+            watch=None,
+        )
+        assert actual_result == desired_result, err_msg
+        # Test 0 is used (not ignored for the env var) and diff workers of 0 is allowed
+        err_msg = "❌ get_run_opts: Numeric options of 0 must not be ignored"
+        os.environ["DIFF_WORKERS"] = "4"
+        actual_result = input_val.get_run_opts(dict(diff_workers=0))
+        del os.environ["DIFF_WORKERS"]
+        assert actual_result["diff_workers"] == 0, err_msg
+        # Test compact without a number of context lines is the diffs default
+        err_msg = "❌ get_run_opts: Compact must default to the diffs context lines"
+        actual_result = input_val.get_run_opts(dict(compact=...))["compact"]
+        assert actual_result == 3, err_msg
+        # Test errors if a numeric option from the args or env vars isn't a number more than 0
+        err_msg = "❌ get_run_opts: Test raising error on incorrect numeric options"
+        for args, env_var, desired_result in [
+            (
+                dict(workers=0),
+                {},
+                "workers (or NUM_WORKERS) must be a whole number more than 0",
+            ),
+            (
+                dict(conn_rate=-1.0),
+                {},
+                "conn_rate (or CONN_RATE) must be a number more than 0",
+            ),
+            (
+                dict(diff_workers=-1),
+                {},
+                "diff_workers (or DIFF_WORKERS) must be a whole number 0 or more",
+            ),
+            (
+                {},
+                dict(NUM_WORKERS="abc"),
+                "workers (or NUM_WORKERS) must be a whole number more than 0",
+            ),
+            (
+                {},
+                dict(CONN_RATE="fast"),
+                "conn_rate (or CONN_RATE) must be a number more than 0",
+            ),
+            (
+                {},
+                dict(DIFF_WORKERS="1.5"),
+                "diff_workers (or DIFF_WORKERS) must be a whole number 0 or more",
+            ),
+        ]:
+            with patch.dict(os.environ, env_var):
+                with pytest.raises(SystemExit):
+                    input_val.get_run_opts(args)
+            actual_result = capsys.readouterr().out.replace("\n", "")
+            assert actual_result == f"❌ {desired_result}", err_msg
+        # Test errors if group sessions are not in the correct format
+        err_msg = "❌ get_run_opts: Test raising error on incorrect group sessions"
+        desired_result = f"❌ Group sessions 'wlc:2' must be in the format group=num"
+        try:
+            input_val.get_run_opts(dict(group_sessions=["wlc:2"]))
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+        # Test errors if more than 2 run IDs
+        err_msg = "❌ get_run_opts: Test raising error on more than 2 run IDs"
+        desired_result = f"❌ Only 1 or 2 run IDs can be compared, not 3"
+        try:
+            input_val.get_run_opts(dict(run_ids=["run1", "run2", "run3"]))
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+        # Test errors if incremental is used with the async engine
+        err_msg = "❌ get_run_opts: Test raising error on incremental with async engine"
+        desired_result = f"❌ incremental can't be used with the async engine"
+        try:
+            input_val.get_run_opts(dict(incremental=True, engine="async"))
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+        # Test errors if watch isn't a post-test or is used with the async engine
+        err_msg = "❌ get_run_opts: Test raising error on watch not a post-test"
+        desired_result = (
+            f"❌ watch must be a post-test (-pos) polled every more than 0 secs"
+        )
+        try:
+            input_val.get_run_opts(dict(watch=30, pre_test="TEST"))
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+        err_msg = "❌ get_run_opts: Test raising error on watch with async engine"
+        desired_result = f"❌ watch can't be used with the async engine or resume"
+        try:
+            input_val.get_run_opts(dict(watch=30, post_test="TEST", engine="async"))
+        except SystemExit:
+            pass
+        assert capsys.readouterr().out.replace("\n", "") == desired_result, err_msg
+
 
 # ----------------------------------------------------------------------------
 # 2. NR_CMDs: Testing of Nornir interactions
@@ -250,6 +406,11 @@ class TestNornirCommands:
         desired_result = ["show history", "show run", "show boot"]
         self.meth_test_organise_cmds("detail", actual_result, desired_result)
         self.meth_test_organise_cmds("run_cfg", actual_result, ["show running-config"])
+        # Test the plans compiled at the start of the run are used rather than the input file
+        err_msg = f"❌ host_cmds: The hosts compiled plan must be used"
+        plan = dict(print=["show clock"])
+        actual_result = NornirCommands(nr_cmd.task, dict(R1=plan)).host_cmds({})
+        assert actual_result == plan, err_msg
 
     # 2c. Test creating difference between files
     def test_create_diff(self):
@@ -282,3 +443,140 @@ class TestNornirCommands:
         actual_result = nr_cmd.pos_create_diff("vital", bad_output_fldr)
         desired_result = f"❌ Only 0 file matched the filter '{os.path.join(bad_output_fldr, 'R1_vital*')}' for files to be compared"
         assert actual_result == desired_result, err_msg
+
+    # 2e. Test merging the command types needed by each run type into a plan of unique commands
+    def test_plan_cmds(self):
+        cmds = nr_cmd.organise_cmds(input_data)
+        data = dict(output_fldr=output_fldr)
+        # Test print only has the print commands (and config as run_cfg is set)
+        err_msg = f"❌ plan_cmds: Creating the command plan for 'print' failed"
+        actual_result = nr_cmd.plan_cmds("print", data, cmds)
+        desired_result = dict(config=["show running-config"], print=cmds["print"])
+        assert actual_result == desired_result, err_msg
+        # Test pre_test has all command types with shared commands in multiple types
+        err_msg = f"❌ plan_cmds: Creating the command plan for 'pre_test' failed"
+        actual_result = nr_cmd.plan_cmds("pre_test", data, cmds)
+        desired_result = dict(
+            config=["show running-config"],
+            print=cmds["print"],
+            vital=cmds["vital"],
+            detail=cmds["detail"],
+        )
+        assert actual_result == desired_result, err_msg
+
+    # 2f. Test streaming command outputs to the files of each type in the order of the types commands
+    def test_output_files(self):
+        err_msg = f"❌ OutputFiles: Writing command outputs to file in order failed"
+        plan = dict(print=["show arp"], vital=["show arp", "show vrf"])
+        save_files = OutputFiles("R1", output_fldr, plan)
+        save_files.write("show vrf", "vrf_output")
+        save_files.write("show arp", "arp_output")
+        save_files.close()
+        desired_result = (
+            "==== show arp " + "=" * 71 + "\narp_output\n\n\n"
+            "==== show vrf " + "=" * 71 + "\nvrf_output\n\n\n"
+        )
+        actual_result = open(save_files.files["vital"]["path"]).read()
+        assert actual_result == desired_result, err_msg
+        # Test the result message of created files and file types with no commands
+        err_msg = f"❌ OutputFiles: Creating the saved file result messages failed"
+        actual_result = [save_files.saved_msg("vital"), save_files.saved_msg("detail")]
+        desired_result = [
+            f"✅ Created command output file '{save_files.files['vital']['path']}'",
+            "empty",
+        ]
+        assert actual_result == desired_result, err_msg
+        # Test a file saved in the same minute as an earlier file doesn't overwrite it
+        err_msg = f"❌ OutputFiles: A file of an earlier run in the same minute was overwritten"
+        next_files = OutputFiles("R1", output_fldr, plan)
+        actual_result = next_files.files["vital"]["path"]
+        assert actual_result != save_files.files["vital"]["path"], err_msg
+
+    # 2g. Test getting the group session limits and spacing of new connections by the connection rate
+    def test_session_limits(self, tmp_path):
+        err_msg = f"❌ get_group_sessions: Getting the group session limits failed"
+        actual_result = SessionLimits.get_group_sessions(nr_inv, dict(ios=2))
+        assert actual_result == dict(ios=2), err_msg
+        err_msg = f"❌ conn_wait: Spacing new connections by the connection rate failed"
+        limits = SessionLimits({}, 10)
+        actual_result = [limits.conn_wait(), round(limits.conn_wait(), 1)]
+        assert actual_result == [0, 0.1], err_msg
+        err_msg = f"❌ spread_hosts: Spreading the limited groups hosts through the run failed"
+        assert SessionLimits({}, None).spread_hosts(nr_inv) is nr_inv, err_msg
+        # The limited groups (ios) hosts are bunched at the start of the inventory
+        hosts = dict(SIM0000="ios", SIM0001="ios", SIM0002="nxos", SIM0003="nxos")
+        hosts.update(SIM0004="nxos", SIM0005="nxos")
+        inv_files = build_inventory(str(tmp_path), hosts, {x: 22 for x in hosts})
+        sim_nr = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {"host_file": inv_files[0], "group_file": inv_files[1]},
+            }
+        )
+        limits = SessionLimits(dict(ios=1), None)
+        actual_result = list(limits.spread_hosts(sim_nr).inventory.hosts)
+        desired_result = ["SIM0000", "SIM0002", "SIM0003", "SIM0001", "SIM0004"]
+        assert actual_result == desired_result + ["SIM0005"], err_msg
+        assert list(sim_nr.inventory.hosts) == list(hosts), err_msg
+
+    # 2h. Test the main script doesn't import nornir or netmiko (slow imports) and the startup stages are reported once
+    def test_startup(self, capsys):
+        err_msg = f"❌ imports: Importing main must not import nornir, netmiko, yaml or the nornir_* modules"
+        code = "import sys, main; print(sorted({x.split('.')[0] for x in sys.modules}))"
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(test_directory),
+            capture_output=True,
+            text=True,
+        )
+        actual_result = proc.stdout
+        assert proc.returncode == 0, err_msg
+        for each_mod in ["nornir", "nornir_netmiko", "netmiko", "paramiko", "yaml"]:
+            assert f"'{each_mod}'" not in actual_result, err_msg
+        for each_mod in ["async", "broker", "catalog", "diff", "store", "watch"]:
+            assert f"'nornir_{each_mod}'" not in actual_result, err_msg
+        err_msg = f"❌ StartupTimer: Reporting the startup stages failed"
+        startup = StartupTimer(input_val.rc)
+        startup.mark("args")
+        startup.report("inventory")
+        startup.report("run")
+        actual_result = capsys.readouterr().out
+        assert actual_result.count("Startup took") == 1, err_msg
+        assert "inventory" in actual_result and "run" not in actual_result, err_msg
+
+    # 2i. Test low memory mode only keeps the files, bytes and hash in the results of saved commands that aren't displayed
+    def test_low_memory(self, tmp_path):
+        from nornir.core.task import MultiResult, Result
+
+        err_msg = f"❌ save_output: Low memory mode kept the saved command output"
+        plan = dict(print=["show clock"], vital=["show clock", "show vrf"])
+        save_files = OutputFiles("R1", str(tmp_path), plan)
+        cmd_results, outputs = ({}, {})
+        for each_cmd, sev_level in [
+            ("show clock", logging.INFO),
+            ("show vrf", logging.DEBUG),
+        ]:
+            cmd_results[each_cmd] = MultiResult(each_cmd)
+            cmd_results[each_cmd].append(Result(host=None, result=f"{each_cmd} output"))
+            cmd_results[each_cmd][0].severity_level = sev_level
+            nr_cmd.save_output(
+                cmd_results[each_cmd],
+                each_cmd,
+                dict(low_memory=True),
+                save_files,
+                outputs,
+            )
+        save_files.close()
+        actual_result = cmd_results["show vrf"].result
+        desired_result = dict(
+            paths=[save_files.files["vital"]["path"]],
+            bytes=len("show vrf output"),
+            sha256=output_hash("show vrf output"),
+        )
+        assert actual_result == desired_result and outputs == {}, err_msg
+        # Print commands are displayed so keep their output
+        err_msg = f"❌ save_output: Low memory mode must keep displayed output"
+        assert cmd_results["show clock"].result == "show clock output", err_msg
+        err_msg = f"❌ save_output: Low memory mode must still save the output"
+        actual_result = open(save_files.files["vital"]["path"]).read()
+        assert "show vrf output" in actual_result, err_msg
@@ -0,0 +1,56 @@
+import os
+import nornir_parse
+from nornir_parse import SectionParser, compare_records
+from nornir_diff import diff_files
+
+test_directory = os.path.dirname(__file__)
+working_dir = os.path.join(test_directory, "test_files")
+
+
+# ----------------------------------------------------------------------------
+# 1. PARSE: Testing of the structured (parsed) compare
+# ----------------------------------------------------------------------------
+class TestNornirParse:
+
+    # 1a. Testing records are matched by key and ignored fields are not compared
+    def test_compare_records(self):
+        err_msg = "❌ compare_records: Comparing parsed records by key failed"
+        pre = [
+            dict(bgp_neighbor="10.0.0.2", state="5", up_down="01:02:03"),
+            dict(bgp_neighbor="10.0.0.3", state="Idle", up_down="never"),
+        ]
+        post = [
+            dict(bgp_neighbor="10.0.0.2", state="5", up_down="02:03:04"),
+            dict(bgp_neighbor="10.0.0.4", state="7", up_down="00:00:10"),
+        ]
+        actual_result = compare_records(pre, post, ignore=["up_down"])
+        assert actual_result["key"] == ["bgp_neighbor"], err_msg
+        assert actual_result["changed"] == [], err_msg
+        assert [x["bgp_neighbor"] for x in actual_result["removed"]] == [
+            "10.0.0.3"
+        ], err_msg
+        assert [x["bgp_neighbor"] for x in actual_result["added"]] == [
+            "10.0.0.4"
+        ], err_msg
+
+    # 1b. Testing sections are compared by record and the parsed output is cached
+    def test_section_parser(self, tmp_path, monkeypatch):
+        err_msg = "❌ SectionParser: Structured compare of the sections failed"
+        pre = open(os.path.join(working_dir, "R1_vital-comp1.txt")).readlines()
+        post = open(os.path.join(working_dir, "R1_vital-comp2.txt")).readlines()
+        parser = SectionParser("cisco_ios", str(tmp_path))
+        diffs = diff_files(pre, post, parser)
+        desired_result = [
+            {"status": ("up", "down")},
+            None,
+            {"subnets": ("4", "3")},
+        ]
+        actual_result = [
+            x["parsed"]["changed"][0][1] if x["parsed"] != None else None for x in diffs
+        ]
+        assert actual_result == desired_result, err_msg
+        # Second compare of the same content must not parse again
+        err_msg = "❌ cached_parse: Parsed outputs not read from the cache"
+        monkeypatch.setattr(nornir_parse, "parse_output", None)
+        cached_diffs = diff_files(pre, post, SectionParser("cisco_ios", str(tmp_path)))
+        assert cached_diffs == diffs, err_msg
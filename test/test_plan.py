@@ -0,0 +1,73 @@
+import os
+import yaml
+from nornir import InitNornir
+import nornir_plan
+from nornir_plan import PlanIndex, PlanCache, get_plans
+
+test_directory = os.path.dirname(__file__)
+test_inventory = os.path.join(test_directory, "test_inventory")
+input_file = os.path.join(test_directory, "test_files", "input_cmd.yml")
+inv_files = [
+    os.path.join(test_inventory, "hosts.yml"),
+    os.path.join(test_inventory, "groups.yml"),
+]
+
+
+# ----------------------------------------------------------------------------
+# 1. PLAN: Testing of the compiled per-host command plans
+# ----------------------------------------------------------------------------
+class TestNornirPlan:
+
+    # 1a. Testing host entries match name or hostname (any case) and entries are added in input file order
+    def test_host_cmds(self):
+        err_msg = "❌ host_cmds: Getting a hosts commands from the index failed"
+        input_data = dict(
+            all=dict(cmd_print=["show version"]),
+            groups=dict(
+                nxos=dict(cmd_print=["show vpc"]), ios=dict(cmd_vital=["show vrf"])
+            ),
+            hosts={
+                "10.10.20.1": dict(cmd_vital=["show arp"]),
+                "r1": dict(cmd_vital=["show ip route"], run_cfg=True),
+            },
+        )
+        actual_result = PlanIndex(input_data).host_cmds("R1", "10.10.20.1", ["ios"])
+        desired_result = dict(
+            print=["show version"],
+            vital=["show vrf", "show arp", "show ip route"],
+            detail=[],
+            run_cfg=["show running-config"],
+        )
+        assert actual_result == desired_result, err_msg
+        actual_result = PlanIndex(input_data).host_cmds("R2", None, ["nxos", "ios"])
+        desired_result = dict(
+            print=["show version", "show vpc"],
+            vital=["show vrf"],
+            detail=[],
+            run_cfg=False,
+        )
+        assert actual_result == desired_result, err_msg
+
+    # 1b. Testing plans are compiled for all hosts then got from the cache until the input file changes
+    def test_get_plans(self, tmp_path, monkeypatch):
+        err_msg = "❌ get_plans: Compiling or caching the host plans failed"
+        monkeypatch.setenv("CACHE_DIRECTORY", str(tmp_path))
+        with open(input_file) as file_content:
+            input_data = yaml.load(file_content, Loader=yaml.FullLoader)
+        nr_inv = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {"host_file": inv_files[0], "group_file": inv_files[1]},
+            }
+        )
+        plans = get_plans(input_file, inv_files, input_data, nr_inv.inventory.hosts)
+        assert plans["R1"]["vital"] == ["show flash", "show vrf", "show arp"], err_msg
+        assert os.path.exists(PlanCache(input_file, inv_files).path), err_msg
+        # Cached plans are used rather than compiling again
+        monkeypatch.setattr(nornir_plan, "compile_plans", None)
+        cached_plans = get_plans(input_file, inv_files, input_data, {})
+        assert cached_plans == plans, err_msg
+        err_msg = "❌ PlanCache: A changed input file must not use the cached plans"
+        changed_file = tmp_path / "input_cmd.yml"
+        changed_file.write_text(open(input_file).read() + "\n# changed\n")
+        assert PlanCache(str(changed_file), inv_files).load() == None, err_msg
@@ -0,0 +1,82 @@
+import pytest
+from netmiko import ConnectHandler
+from netmiko.exceptions import NetmikoAuthenticationException
+from nornir.plugins.inventory.simple import SimpleInventory
+from nornir_sim import SimServer, build_inventory, sim_groups, sim_hosts
+
+
+# ----------------------------------------------------------------------------
+# Fixture to start the simulated hosts on free ports
+# ----------------------------------------------------------------------------
+@pytest.fixture(scope="class")
+def load_sim():
+    global hosts, ports
+    hosts = sim_hosts(3)
+    server = SimServer(hosts, dict(latency=0, lines=4), 0)
+    ports = server.start()
+    yield ports
+    server.stop()
+
+
+# ----------------------------------------------------------------------------
+# Connects to a simulated host with netmiko using the platform of its group
+# ----------------------------------------------------------------------------
+def connect(port, group):
+    return ConnectHandler(
+        host="127.0.0.1",
+        port=port,
+        username="u1",
+        password="pw",
+        device_type=sim_groups[group],
+    )
+
+
+# ----------------------------------------------------------------------------
+# 1. SIM: Testing of the simulated devices and the inventory of them
+# ----------------------------------------------------------------------------
+@pytest.mark.usefixtures("load_sim")
+class TestDeviceSim:
+
+    # 1a. Testing each platform is answered at the hosts prompt with the same output every session
+    def test_sessions(self):
+        err_msg = "❌ SimServer: Running commands on a simulated host failed"
+        for name, group in hosts.items():
+            conn = connect(ports[name], group)
+            assert conn.find_prompt() == name + "#", err_msg
+            actual_result = conn.send_command("show version")
+            assert ("NX-OS" in actual_result) == (group == "nxos"), err_msg
+            actual_result = conn.send_command("show ip arp").splitlines()
+            assert len(actual_result) == 4 and name in actual_result[0], err_msg
+            conn.disconnect()
+            conn = connect(ports[name], group)
+            assert (
+                conn.send_command("show ip arp").splitlines() == actual_result
+            ), err_msg
+            conn.disconnect()
+
+    # 1b. Testing logins fail and outputs change by chance when set
+    def test_failures(self):
+        err_msg = "❌ SimServer: Simulating failed logins failed"
+        server = SimServer(dict(SIM9999="ios"), dict(auth_fail=1), 0)
+        port = server.start()["SIM9999"]
+        with pytest.raises(NetmikoAuthenticationException):
+            connect(port, "ios")
+        server.stop()
+        err_msg = "❌ SimServer: Simulating changed outputs failed"
+        server = SimServer(dict(SIM9999="ios"), dict(latency=0, change=1), 0)
+        conn = connect(server.start()["SIM9999"], "ios")
+        outputs = [conn.send_command("show ip route") for x in range(2)]
+        assert outputs[0] != outputs[1], err_msg
+        conn.disconnect()
+        server.stop()
+
+    # 1c. Testing the inventory of the simulated hosts is loaded with the hosts port and platform
+    def test_build_inventory(self, tmp_path):
+        err_msg = "❌ build_inventory: Creating the simulated hosts inventory failed"
+        inv_files = build_inventory(str(tmp_path), hosts, ports)
+        inv = SimpleInventory(*inv_files).load()
+        assert list(inv.hosts) == list(hosts), err_msg
+        host = inv.hosts["SIM0002"]
+        assert host.port == ports["SIM0002"], err_msg
+        params = host.get_connection_parameters("netmiko")
+        assert params.platform == "cisco_nxos_ssh", err_msg
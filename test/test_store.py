@@ -0,0 +1,63 @@
+import pytest
+import os
+import json
+import shutil
+import tempfile
+from nornir_store import SnapshotStore, StoreFile, format_cmd
+
+
+# ----------------------------------------------------------------------------
+# Fixture to create the snapshot store in a temporary output folder
+# ----------------------------------------------------------------------------
+@pytest.fixture(scope="class")
+def load_store():
+    global store, output_fldr
+    output_fldr = tempfile.mkdtemp()
+    store = SnapshotStore(output_fldr)
+    yield store
+    shutil.rmtree(output_fldr)
+
+
+# ----------------------------------------------------------------------------
+# 1. STORE: Testing of saving and restoring command outputs in the snapshot store
+# ----------------------------------------------------------------------------
+@pytest.mark.usefixtures("load_store")
+class TestSnapshotStore:
+
+    # 1a. Testing the same output is only stored once and can be read back
+    def test_put_get_blob(self):
+        err_msg = "❌ put_blob: Deduplication of the same command output failed"
+        sha1 = store.put_blob("show clock output")
+        sha2 = store.put_blob("show clock output")
+        objects = [x for x in os.walk(store.object_dir) if len(x[2]) != 0]
+        assert sha1 == sha2 and len(objects) == 1, err_msg
+        err_msg = "❌ get_blob: Reading back the command output failed"
+        assert store.get_blob(sha1) == "show clock output", err_msg
+
+    # 1b. Testing the restored text file is the same as the text file that would have been saved
+    def test_restore(self):
+        err_msg = "❌ restore: Recreating text file from the store failed"
+        store_file = StoreFile(store, "R1_vital_20240906-0703.txt")
+        store_file.write_cmd("show vrf", "vrf_output")
+        store_file.write_cmd("show arp", "arp_output")
+        store_file.close()
+        restore_file = store.restore("R1_vital_20240906-0703.txt", output_fldr)
+        desired_result = format_cmd("show vrf", "vrf_output") + format_cmd(
+            "show arp", "arp_output"
+        )
+        assert open(restore_file).read() == desired_result, err_msg
+        err_msg = "❌ list_files: Listing the text files of the store failed"
+        assert store.list_files() == ["R1_vital_20240906-0703.txt"], err_msg
+
+    # 1c. Testing the manifest is only saved on close with the bytes of each output
+    def test_store_file(self):
+        err_msg = "❌ StoreFile: The manifest must only be saved when closed"
+        store_file = StoreFile(store, "R2_vital_20240906-0703.txt")
+        store_file.write_cmd("show interface description", "Gi0/1  Uplink – core")
+        manifest_path = store.manifest_path("R2_vital_20240906-0703.txt")
+        assert not os.path.exists(manifest_path), err_msg
+        store_file.close()
+        with open(manifest_path) as manifest_file:
+            actual_result = json.load(manifest_file)["sections"][0]["bytes"]
+        err_msg = "❌ StoreFile: The bytes of an output must be its encoded size"
+        assert actual_result == len("Gi0/1  Uplink – core") + 2, err_msg
@@ -0,0 +1,50 @@
+import json
+import nornir_timeout
+from nornir_timeout import CmdHistory
+
+
+# ----------------------------------------------------------------------------
+# 1. TIMEOUT: Testing of the read timeouts learnt from the command history
+# ----------------------------------------------------------------------------
+class TestCmdHistory:
+
+    # 1a. Testing the timeout is the default until run, then is learnt from the slowest recent run or biggest output
+    def test_read_timeout(self, tmp_path, monkeypatch):
+        err_msg = "❌ read_timeout: Learning the command read timeout failed"
+        monkeypatch.setattr(nornir_timeout, "history_runs", 2)
+        history = CmdHistory(str(tmp_path))
+        assert history.read_timeout("cisco_ios", "show clock", 60) == 60, err_msg
+        for secs in [8, 5, 4]:
+            history.record("cisco_ios", "show ip route", secs, 1000)
+        # Only the latest runs are used and the timeout is never less than the min
+        assert history.read_timeout("cisco_ios", "show ip route") == 15, err_msg
+        history.record("cisco_ios", "show clock", 0.1, 50)
+        assert history.read_timeout("cisco_ios", "show clock", 60) == 10, err_msg
+        assert history.read_timeout("cisco_nxos", "show clock", 60) == 60, err_msg
+        history.record("cisco_ios", "show tech", 1, 4000000)
+        assert history.read_timeout("cisco_ios", "show tech") == 200, err_msg
+        # A command that timed out is given longer the next time
+        err_msg = "❌ read_timeout: A timed out command must get a longer timeout"
+        history.record("cisco_ios", "show bgp all", 60, 0, timed_out=True)
+        assert history.read_timeout("cisco_ios", "show bgp all") == 180, err_msg
+        monkeypatch.setattr(nornir_timeout, "max_timeout", 100)
+        assert history.read_timeout("cisco_ios", "show bgp all") == 100, err_msg
+
+    # 1b. Testing the commands run are merged into the history saved by other runs
+    def test_save(self, tmp_path):
+        err_msg = "❌ CmdHistory: Saving the command history failed"
+        first, second = (CmdHistory(str(tmp_path)), CmdHistory(str(tmp_path)))
+        first.record("cisco_ios", "show version", 2, 500)
+        second.record("cisco_nxos", "show version", 3, 800)
+        first.save()
+        second.save()
+        with open(tmp_path / nornir_timeout.history_file) as hist_file:
+            actual_result = json.load(hist_file)
+        assert sorted(actual_result) == ["cisco_ios", "cisco_nxos"], err_msg
+        actual_result = CmdHistory(str(tmp_path)).read_timeout(
+            "cisco_nxos", "show version"
+        )
+        assert actual_result == 10, err_msg
+        # A corrupt history is ignored rather than failing the run
+        (tmp_path / nornir_timeout.history_file).write_text("{")
+        assert CmdHistory(str(tmp_path)).history == {}, err_msg
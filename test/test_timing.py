@@ -0,0 +1,107 @@
+import os
+import csv
+import json
+import yaml
+import pytest
+from nornir import InitNornir
+from nornir.core.task import Result
+from nornir_timing import RunTimer, save_report
+
+test_directory = os.path.dirname(__file__)
+test_inventory = os.path.join(test_directory, "test_inventory")
+
+
+# ----------------------------------------------------------------------------
+# Nornir task with a command sub-task (fails for R2) and a timed write phase
+# ----------------------------------------------------------------------------
+def show_cmd(task):
+    if task.host.name == "R2":
+        raise ConnectionError("Session closed by the device")
+    return Result(host=task.host, result="Gi0/1 up\n")
+
+
+def host_task(task, timer):
+    with timer.phase(task.host.name, "write", "show ip int brief") as timing:
+        timing["num_bytes"] = 9
+    task.run(name="show ip int brief", task=show_cmd)
+    return Result(host=task.host, result="done")
+
+
+# ----------------------------------------------------------------------------
+# 1. TIMING: Testing of the run timings, report and spans
+# ----------------------------------------------------------------------------
+class TestRunTimer:
+
+    # 1a. Testing the host tasks and commands are timed by the processor and failures recorded
+    def test_processor(self, tmp_path):
+        err_msg = "❌ RunTimer: Timing the hosts and commands failed"
+        timer = RunTimer("run1", "print")
+        hosts = {
+            x: dict(hostname=f"10.10.20.{x[1]}", groups=["ios"]) for x in ["R1", "R2"]
+        }
+        with open(tmp_path / "hosts.yml", "w") as hosts_file:
+            yaml.dump(hosts, hosts_file)
+        nr = InitNornir(
+            inventory={
+                "plugin": "SimpleInventory",
+                "options": {
+                    "host_file": str(tmp_path / "hosts.yml"),
+                    "group_file": os.path.join(test_inventory, "groups.yml"),
+                },
+            },
+            logging={"enabled": False},
+        )
+        nr.with_processors([timer]).run(task=host_task, timer=timer)
+        hosts = timer.host_summary()
+        assert sorted(hosts) == ["R1", "R2"], err_msg
+        assert hosts["R1"]["cmds"] == 1 and hosts["R1"]["bytes"] == 9, err_msg
+        assert hosts["R1"]["failed"] == False and hosts["R2"]["failed"] == True, err_msg
+        cmd = [x for x in timer.records if x["phase"] == "command"]
+        errors = {x["host"]: x["error"] for x in cmd}
+        assert errors == dict(R1=None, R2="ConnectionError"), err_msg
+        # An error in a phase is recorded and raised
+        with pytest.raises(OSError):
+            with timer.phase("R1", "connect"):
+                raise OSError("No route to host")
+        assert timer.records[-1]["error"] == "OSError", err_msg
+
+    # 1b. Testing the JSON and CSV reports and OTLP spans are saved with a span per host under the run span
+    def test_save_report(self, tmp_path):
+        err_msg = "❌ save_report: Saving the run report failed"
+        timer = RunTimer("run1", "pre_test")
+        timer.add("R1", "host", 100.0, 2.0)
+        timer.add("R1", "connect", 100.0, 0.5)
+        timer.add("R1", "command", 100.5, 1.5, "show arp", 300)
+        timer.add("R1", "write", 102.0, 0.01, "show arp", 300)
+        timer.add("R2", "command", 100.0, 0.2, "show arp", 100, 1)
+        span_file = str(tmp_path / "spans.json")
+        msgs = save_report(timer, str(tmp_path), "json", span_file)
+        assert len(msgs) == 2, err_msg
+        report = json.load(open(tmp_path / "run_report_run1.json"))
+        desired_result = dict(
+            secs=2.0,
+            connect_secs=0.5,
+            cmds=1,
+            cmd_secs=1.5,
+            bytes=300,
+            retries=0,
+            failed=False,
+        )
+        assert report["hosts"]["R1"] == desired_result, err_msg
+        assert report["slowest_cmds"][0]["host"] == "R1", err_msg
+        assert report["hosts"]["R2"]["retries"] == 1, err_msg
+        save_report(timer, str(tmp_path), "csv")
+        rows = list(csv.DictReader(open(tmp_path / "run_report_run1.csv")))
+        assert len(rows) == 5 and rows[0]["host"] == "R1", err_msg
+        err_msg = "❌ write_spans: Saving the OTLP spans failed"
+        spans = json.load(open(span_file))["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        span_ids = {x["name"]: x["spanId"] for x in spans}
+        assert len(spans) == 6 and "parentSpanId" not in spans[0], err_msg
+        host_attr = dict(key="host", value=dict(stringValue="R1"))
+        cmd_span = [
+            x
+            for x in spans
+            if x["name"] == "command show arp" and host_attr in x["attributes"]
+        ][0]
+        assert cmd_span["parentSpanId"] == span_ids["R1"], err_msg
+        assert cmd_span["endTimeUnixNano"] == str(int(102.0 * 1e9)), err_msg
@@ -0,0 +1,72 @@
+import os
+import nornir_watch
+from nornir_catalog import SnapshotCatalog, output_hash
+from nornir_store import format_cmd
+from nornir_watch import VitalWatch, output_delta
+
+
+# ----------------------------------------------------------------------------
+# Saves the baseline vital file of R1 and adds it to the catalog with its output hashes
+# ----------------------------------------------------------------------------
+def save_baseline(output_fldr, run_id, outputs):
+    catalog = SnapshotCatalog(output_fldr, run_id)
+    file_name = f"R1_vital_{run_id}.txt"
+    path = os.path.join(output_fldr, file_name)
+    with open(path, "w") as vital_file:
+        for each_cmd, output in outputs.items():
+            vital_file.write(format_cmd(each_cmd, output))
+    snapshot_id = catalog.add("R1", "vital", file_name, path)
+    catalog.add_sections(snapshot_id, {x: output_hash(y) for x, y in outputs.items()})
+
+
+# ----------------------------------------------------------------------------
+# 1. WATCH: Testing of comparing each poll of the vital commands to the baseline
+# ----------------------------------------------------------------------------
+class TestVitalWatch:
+
+    # 1a. Testing the delta is the lines removed and added from the baseline
+    def test_output_delta(self):
+        err_msg = "❌ output_delta: Getting the delta from the baseline failed"
+        before = "Gi0/1 up\nGi0/2 up\nGi0/3 up"
+        after = "Gi0/1 up\nGi0/2 down\nGi0/3 up\nGi0/4 up"
+        actual_result = output_delta(before, after)
+        assert actual_result == (["Gi0/2 up"], ["Gi0/2 down", "Gi0/4 up"]), err_msg
+
+    # 1b. Testing only commands whose hash changed since the last poll are compared and printed, as is going back to the baseline
+    def test_check(self, tmp_path, capsys, monkeypatch):
+        err_msg = "❌ check: Comparing the poll to the baseline failed"
+        monkeypatch.setattr(nornir_watch, "delta_lines", 2)
+        baseline = {"show bgp sum": "peer1 up", "show ip route": "r1\nr2"}
+        save_baseline(str(tmp_path), "run1", baseline)
+        save_baseline(str(tmp_path), "run2", dict(baseline, **{"show bgp sum": "x"}))
+        watch = VitalWatch(str(tmp_path), "run1")
+        watch.start_poll()
+        assert watch.check("R1", dict(baseline, **{"show clock": "1"})) == [
+            "⚠️  show clock: not in the baseline"
+        ], err_msg
+        watch.start_poll()
+        actual_result = watch.check(
+            "R1", {"show bgp sum": "peer1 down", "show clock": "2"}
+        )
+        desired_result = [
+            "⚠️  show bgp sum: -1 +1 lines from the baseline",
+            "     - peer1 up",
+            "     + peer1 down",
+        ]
+        assert actual_result == desired_result, err_msg
+        assert watch.changed == 2 and watch.differ["R1"] == {"show bgp sum"}, err_msg
+        # An unchanged poll isn't compared again
+        assert watch.check("R1", {"show bgp sum": "peer1 down"}) == [], err_msg
+        actual_result = watch.check("R1", {"show ip route": "r3\nr4"})[-1]
+        assert actual_result == "     ... 2 more lines", err_msg
+        actual_result = watch.check("R1", {"show bgp sum": "peer1 up"})
+        assert actual_result == ["✅ show bgp sum: back to the baseline"], err_msg
+        watch.end_poll(1.5)
+        actual_result = capsys.readouterr().out.replace("\n", "")
+        assert "Poll 2 took 1.5s, 4 commands changed" in actual_result, err_msg
+        assert "1 differ from the baseline on 1 hosts" in actual_result, err_msg
+        # A host with no baseline is only reported once
+        err_msg = "❌ check: A host with no baseline must be reported once"
+        desired_result = ["❌ No baseline vital file to compare against"]
+        assert watch.check("R2", baseline) == desired_result, err_msg
+        assert watch.check("R2", baseline) == [], err_msg